@@ -0,0 +1 @@
+"""Productivity calculations shared by the Streamlit app and batch jobs."""
@@ -0,0 +1,5 @@
+import sys
+
+from productivity.cli import main
+
+sys.exit(main())
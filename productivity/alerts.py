@@ -0,0 +1,556 @@
+"""Threshold and anomaly alerting over productivity results.
+
+A :class:`Monitor` watches one series per calculator type and entity (a
+machine, a site, an app session) and raises an :class:`Alert` when
+
+* a result crosses one of the calculator's configured :class:`Thresholds`
+  (and again when it returns inside them), or
+* a streaming detector finds the result anomalous for its series:
+
+  - ``ewma``: z-score against an exponentially weighted mean and variance;
+  - ``robust``: z-score against an exponentially weighted median and
+    median absolute deviation, each tracked by sign steps, so single
+    outliers barely move them.
+
+A series' state is a handful of numbers kept in struct-of-arrays columns
+(about 40 bytes, plus the key), so one process can watch tens of
+thousands of series; beyond ``MAX_SERIES``, the series observed least
+recently are forgotten. Single results (:meth:`Monitor.observe`) and batches
+(:meth:`Monitor.observe_batch`, e.g. a chunk of a bulk file or a second of
+a live feed) go through the same vectorized update; within a batch, each
+series still sees its values in order.
+
+Alerts are logged as JSON on the ``productivity.alerts`` logger (appended
+to ``PRODUCTIVITY_ALERTS_LOG`` if set), kept in a bounded list of recent
+alerts, and POSTed to a webhook if one is configured. ``python -m
+productivity.alerts serve`` is a local stand-in webhook receiver, and
+``python -m productivity.alerts check FILE`` runs a file through a monitor.
+
+Thresholds and detectors come from the JSON file named by
+``PRODUCTIVITY_ALERTS_CONFIG``::
+
+    {
+      "thresholds": {"total": {"critical_low": 0.5, "warning_low": 1.0},
+                     "labour": {"warning_low": 4.0, "critical_high": 50, "hold": 3}},
+      "detector": {"kind": "robust", "alpha": 0.05, "z": 4.0, "warmup": 20},
+      "detectors": {"eoq": {"kind": "ewma"}},
+      "webhook": "http://127.0.0.1:8700/alerts"
+    }
+
+Calculators may be given by short name or label. ``hold`` (default 1)
+debounces noisy series: a series only changes level, and alerts, after
+that many consecutive results at the new level. Without a file, Total
+Productivity keeps the gauge's bands (critical below 0.5, warning below
+1.0) and every calculator gets the default EWMA detector.
+"""
+import argparse
+import json
+import logging
+import math
+import os
+import queue
+import sys
+import threading
+import time
+import urllib.request
+from collections import deque, namedtuple
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+from productivity import engine
+
+logger = logging.getLogger("productivity.alerts")
+
+ENV_CONFIG = "PRODUCTIVITY_ALERTS_CONFIG"
+ENV_LOG = "PRODUCTIVITY_ALERTS_LOG"
+ENV_WEBHOOK = "PRODUCTIVITY_ALERTS_WEBHOOK"
+DEFAULT_WEBHOOK_PORT = 8700
+RECENT = 1000
+MAX_SERIES = 100_000
+
+SEVERITIES = ("ok", "warning", "critical")
+LOG_LEVELS = (logging.INFO, logging.WARNING, logging.CRITICAL)
+
+# ``hold``: consecutive results needed at a new level before a series changes level (and alerts)
+Thresholds = namedtuple("Thresholds", "critical_low warning_low warning_high critical_high hold",
+                        defaults=(None,) * 4 + (1,))
+DetectorSpec = namedtuple("DetectorSpec", "kind alpha z warmup", defaults=("ewma", 0.05, 4.0, 20))
+Alert = namedtuple("Alert", "ts calc_type entity value kind severity score message")
+Config = namedtuple("Config", "thresholds detectors detector webhook")
+
+# The bands the Total Productivity gauge has always shown
+DEFAULT_THRESHOLDS = {"Total Productivity": Thresholds(critical_low=0.5, warning_low=1.0)}
+DETECTOR_KINDS = ("ewma", "robust")
+
+
+def _label(calc_type):
+    label = engine.SHORT_NAMES.get(calc_type, calc_type)
+    if label not in engine.CALCULATORS:
+        raise ValueError(f"unknown calculator {calc_type!r}")
+    return label
+
+
+def _detector(spec, base=DetectorSpec()):
+    spec = base._replace(**spec)
+    if spec.kind not in DETECTOR_KINDS:
+        raise ValueError(f"detector kind must be one of {DETECTOR_KINDS}, got {spec.kind!r}")
+    if not 0 < spec.alpha <= 1:
+        raise ValueError("detector alpha must be in (0, 1]")
+    return spec
+
+
+def _thresholds(bounds):
+    thresholds = Thresholds(**bounds)
+    if not (isinstance(thresholds.hold, int) and thresholds.hold >= 1):
+        raise ValueError(f"threshold hold must be a whole number of results >= 1, got {thresholds.hold!r}")
+    return thresholds
+
+
+def parse_config(raw):
+    """:class:`Config` from a decoded JSON config (see the module docstring)."""
+    thresholds = dict(DEFAULT_THRESHOLDS)
+    for calc_type, bounds in raw.get("thresholds", {}).items():
+        thresholds[_label(calc_type)] = _thresholds(bounds)
+    detector = _detector(raw.get("detector", {}))
+    detectors = {_label(calc_type): _detector(spec, detector) for calc_type, spec in raw.get("detectors", {}).items()}
+    return Config(thresholds, detectors, detector, raw.get("webhook"))
+
+
+@lru_cache(maxsize=None)
+def get_config():
+    """Process-wide config from ``$PRODUCTIVITY_ALERTS_CONFIG`` (defaults without one), read once."""
+    path = os.environ.get(ENV_CONFIG)
+    raw = {}
+    if path:
+        with open(path, encoding="utf-8") as f:
+            raw = json.load(f)
+    config = parse_config(raw)
+    return config._replace(webhook=os.environ.get(ENV_WEBHOOK) or config.webhook)
+
+
+def configure_log_file(path=None):
+    """Also append alerts as JSON lines to ``path`` (or ``$PRODUCTIVITY_ALERTS_LOG``)."""
+    path = path or os.environ.get(ENV_LOG)
+    if not path or any(getattr(h, "baseFilename", None) == os.path.abspath(path) for h in logger.handlers):
+        return
+    handler = logging.FileHandler(path)
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+
+
+def threshold_levels(thresholds, values):
+    """Severity index (0 ok, 1 warning, 2 critical) of each value under ``thresholds``; NaN counts as ok."""
+    levels = np.zeros(len(values), dtype=np.int8)
+    if thresholds is None:
+        return levels
+    for bound, level, below in ((thresholds.warning_low, 1, True), (thresholds.warning_high, 1, False),
+                                (thresholds.critical_low, 2, True), (thresholds.critical_high, 2, False)):
+        if bound is not None:
+            levels[(values < bound) if below else (values > bound)] = level
+    return levels
+
+
+# Detector updates. ``_step`` works on arrays (one value per series) and
+# ``_step_scalar`` on floats, for long runs of a single series; the two
+# must agree. Both score ``x`` against the state before the update. During
+# warm-up the step is 1/count (a plain running mean), afterwards alpha.
+_MAD_TO_SIGMA = 1.4826
+
+
+def _step(kind, alpha, warmup, count, center, scale, x):
+    count = count + 1
+    d = x - center
+    warm = count <= warmup
+    eta = np.where(warm, 1.0 / count, alpha)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        if kind == "ewma":
+            score = np.where(scale > 0, d / np.sqrt(scale), np.where(d == 0, 0.0, np.inf))
+            center = center + eta * d
+            scale = (1 - eta) * (scale + eta * d * d)
+        else:
+            score = np.where(scale > 0, d / (_MAD_TO_SIGMA * scale), np.where(d == 0, 0.0, np.inf))
+            spread = np.abs(d)
+            # The first value only places the center: its distance from 0 is no spread
+            center = np.where(count == 1, x, np.where(warm, center + eta * d,
+                              center + alpha * _MAD_TO_SIGMA * scale * np.sign(d)))
+            scale = np.where(count == 1, 0.0, np.where(warm, scale + eta * (spread - scale),
+                             scale * np.where(spread > scale, 1 + alpha, 1 / (1 + alpha))))
+    score = np.where(count > 1, score, 0.0)
+    return count, center, scale, score
+
+
+def _step_scalar(kind, alpha, warmup, count, center, scale, x):
+    count += 1
+    d = x - center
+    warm = count <= warmup
+    eta = 1.0 / count if warm else alpha
+    if kind == "ewma":
+        score = d / math.sqrt(scale) if scale > 0 else (0.0 if d == 0 else math.inf)
+        center += eta * d
+        scale = (1 - eta) * (scale + eta * d * d)
+    else:
+        score = d / (_MAD_TO_SIGMA * scale) if scale > 0 else (0.0 if d == 0 else math.inf)
+        spread = abs(d)
+        if count == 1:
+            center, scale = x, 0.0
+        elif warm:
+            center += eta * d
+            scale += eta * (spread - scale)
+        else:
+            center += alpha * _MAD_TO_SIGMA * scale * ((d > 0) - (d < 0))
+            scale *= (1 + alpha) if spread > scale else 1 / (1 + alpha)
+    return count, center, scale, (score if count > 1 else 0.0)
+
+
+class Webhook:
+    """POSTs alerts as JSON (``{"alerts": [...]}``) from a background thread.
+
+    The queue is bounded: when the endpoint cannot keep up, further alerts
+    are dropped and counted rather than held in memory.
+    """
+
+    def __init__(self, url, timeout=2.0, max_queue=10_000, batch=100):
+        self.url = url
+        self.timeout = timeout
+        self.batch = batch
+        self.sent = 0
+        self.dropped = 0
+        self.failures = 0
+        self.last_error = None
+        self._queue = queue.Queue(max_queue)
+        self._thread = threading.Thread(target=self._run, name="alerts-webhook", daemon=True)
+        self._thread.start()
+
+    def send(self, alert):
+        try:
+            self._queue.put_nowait(alert)
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self):
+        while True:
+            alerts = [self._queue.get()]
+            while len(alerts) < self.batch and not self._queue.empty():
+                alerts.append(self._queue.get_nowait())
+            body = json.dumps({"alerts": [alert._asdict() for alert in alerts]}).encode()
+            request = urllib.request.Request(self.url, body, {"Content-Type": "application/json"})
+            try:
+                with urllib.request.urlopen(request, timeout=self.timeout):
+                    pass
+                self.sent += len(alerts)
+            except OSError as exc:
+                self.failures += 1
+                self.dropped += len(alerts)
+                self.last_error = str(exc)
+            finally:
+                for _ in alerts:
+                    self._queue.task_done()
+
+    def flush(self, timeout=10.0):
+        """Wait (up to ``timeout`` seconds) until every queued alert has been posted or dropped."""
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.05)
+        return not self._queue.unfinished_tasks
+
+    def stats(self):
+        return {"url": self.url, "sent": self.sent, "dropped": self.dropped, "failures": self.failures,
+                "queued": self._queue.qsize(), "last_error": self.last_error}
+
+
+class Monitor:
+    """Thresholds and anomaly detectors for every (calculator, entity) series, with O(1) state per series."""
+
+    _STATE = ("_count", "_center", "_scale", "_level", "_pending", "_run", "_anomalous", "_seen")
+
+    def __init__(self, config=None, webhook=None, recent=RECENT, max_series=MAX_SERIES):
+        self.config = config or parse_config({})
+        self.webhook = webhook
+        self.max_series = max_series
+        self._recent = deque(maxlen=recent)
+        self._index = {}
+        self._size = 0
+        self._count = np.zeros(1024, dtype=np.int64)
+        self._center = np.zeros(1024)
+        self._scale = np.zeros(1024)
+        self._level = np.zeros(1024, dtype=np.int8)
+        self._pending = np.zeros(1024, dtype=np.int8)
+        self._run = np.zeros(1024, dtype=np.int32)
+        self._anomalous = np.zeros(1024, dtype=bool)
+        self._seen = np.zeros(1024)
+        self._lock = threading.Lock()
+        self.observed = 0
+        self.evicted = 0
+        self.raised = dict.fromkeys(("threshold", "anomaly"), 0)
+
+    def thresholds_for(self, calc_type):
+        return self.config.thresholds.get(calc_type)
+
+    def detector_for(self, calc_type):
+        return self.config.detectors.get(calc_type, self.config.detector)
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def nbytes(self):
+        return sum(getattr(self, name).nbytes for name in self._STATE)
+
+    def _evict(self, n):
+        """Forget the ``n`` series observed least recently, compacting the state columns."""
+        size = self._size
+        keep = np.sort(np.argsort(self._seen[:size], kind="stable")[min(n, size):])
+        for name in self._STATE:
+            array = getattr(self, name)
+            array[:len(keep)] = array[keep]
+            array[len(keep):size] = 0
+        moved = np.full(size, -1, dtype=np.int64)
+        moved[keep] = np.arange(len(keep))
+        self._index = {key: int(moved[row]) for key, row in self._index.items() if moved[row] >= 0}
+        self._size = len(keep)
+        self.evicted += size - len(keep)
+
+    def _rows(self, calc_type, entities):
+        new = {entity for entity in entities if (calc_type, entity) not in self._index}
+        if self._size + len(new) > self.max_series:
+            # A tenth more than needed, so a stream of new series does not compact on every batch
+            self._evict(self._size + len(new) - self.max_series + self.max_series // 10)
+        index = self._index
+        rows = np.empty(len(entities), dtype=np.int64)
+        for i, entity in enumerate(entities):
+            row = index.get((calc_type, entity))
+            if row is None:
+                row = index[(calc_type, entity)] = self._size
+                self._size += 1
+            rows[i] = row
+        if self._size > len(self._count):
+            capacity = max(self._size, 2 * len(self._count))
+            for name in self._STATE:
+                array = getattr(self, name)
+                grown = np.zeros(capacity, dtype=array.dtype)
+                grown[:len(array)] = array
+                setattr(self, name, grown)
+        self._seen[rows] = time.monotonic()
+        return rows
+
+    def observe(self, calc_type, value, entity="", ts=None):
+        """Check one result; returns the alerts it raised."""
+        return self.observe_batch(calc_type, [value], [entity], ts)
+
+    def observe_batch(self, calc_type, values, entities=None, ts=None):
+        """Check results in order; ``entities`` is one entity for all or one per value (default: ``""``).
+
+        ``ts`` (epoch seconds, one or one per value) defaults to now. Returns the alerts raised.
+        """
+        values = np.asarray(values, dtype=np.float64)
+        n = len(values)
+        if not n:
+            return []
+        if entities is None or isinstance(entities, str):
+            entities = [entities or ""] * n
+        ts = np.broadcast_to(np.asarray(time.time() if ts is None else ts, dtype=np.float64), (n,))
+        spec = self.detector_for(calc_type)
+        with self._lock:
+            rows = self._rows(calc_type, list(entities))
+            thresholds = self.thresholds_for(calc_type)
+            hold = thresholds.hold if thresholds is not None else 1
+            levels = threshold_levels(thresholds, values)
+            previous_level = np.empty(n, dtype=np.int8)
+            scores = np.empty(n)
+            previous_anomalous = np.empty(n, dtype=bool)
+            for indices in self._rounds(rows):
+                self._advance(spec, hold, rows, values, levels, indices, previous_level, previous_anomalous, scores)
+            self.observed += n
+        anomalous = (np.abs(scores) > spec.z) & ~np.isnan(values)
+        crossed = np.flatnonzero(levels != previous_level)
+        started = np.flatnonzero(anomalous & ~previous_anomalous)
+        alerts = [self._alert(calc_type, entities[i], values[i], ts[i], "threshold", int(levels[i]), scores[i])
+                  for i in crossed]
+        alerts += [self._alert(calc_type, entities[i], values[i], ts[i], "anomaly",
+                               2 if abs(scores[i]) > 2 * spec.z else 1, scores[i]) for i in started]
+        alerts.sort(key=lambda alert: alert.ts)
+        for alert in alerts:
+            self._emit(alert)
+        return alerts
+
+    @staticmethod
+    def _rounds(rows):
+        """Split positions into rounds holding at most one value per series, keeping each series' order."""
+        n = len(rows)
+        order = np.argsort(rows, kind="stable")
+        sorted_rows = rows[order]
+        starts = np.flatnonzero(np.r_[True, sorted_rows[1:] != sorted_rows[:-1]])
+        rank = np.empty(n, dtype=np.int64)
+        rank[order] = np.arange(n) - np.repeat(starts, np.diff(np.r_[starts, n]))
+        rounds = int(rank.max()) + 1
+        if rounds == 1:
+            return [np.arange(n)]
+        by_round = np.lexsort((np.arange(n), rank))
+        return np.split(by_round, np.flatnonzero(np.diff(rank[by_round])) + 1)
+
+    def _advance(self, spec, hold, rows, values, levels, indices, previous_level, previous_anomalous, scores):
+        if len(indices) == 1:
+            # Long single-series runs come through here value by value: plain floats are much cheaper
+            i = int(indices[0])
+            row = rows[i]
+            count, center, scale, score = _step_scalar(
+                spec.kind, spec.alpha, spec.warmup, int(self._count[row]), float(self._center[row]),
+                float(self._scale[row]), float(values[i]))
+            if not math.isnan(values[i]):
+                self._count[row], self._center[row], self._scale[row] = count, center, scale
+            scores[i] = score if count > spec.warmup else 0.0
+        else:
+            r = rows[indices]
+            x = values[indices]
+            count, center, scale, score = _step(spec.kind, spec.alpha, spec.warmup,
+                                                self._count[r], self._center[r], self._scale[r], x)
+            valid = ~np.isnan(x)
+            self._count[r[valid]], self._center[r[valid]], self._scale[r[valid]] = count[valid], center[valid], scale[valid]
+            scores[indices] = np.where(count > spec.warmup, score, 0.0)
+        # Threshold level: ``levels`` comes in as each value's own level and
+        # leaves as the series' level after it, which only moves after ``hold``
+        # in a row; a NaN (no result) leaves the series as it was, excursion included
+        r = rows[indices]
+        current = self._level[r]
+        raw = levels[indices]
+        missing = np.isnan(values[indices])
+        run = np.where(raw == self._pending[r], self._run[r] + 1, 1)
+        self._pending[r] = np.where(missing, self._pending[r], raw)
+        self._run[r] = np.where(missing, self._run[r], np.minimum(run, hold))
+        levels[indices] = np.where(missing | (run < hold), current, raw)
+        previous_level[indices] = current
+        self._level[r] = levels[indices]
+        previous_anomalous[indices] = self._anomalous[r]
+        self._anomalous[r] = np.where(missing, self._anomalous[r], np.abs(scores[indices]) > spec.z)
+
+    @staticmethod
+    def _alert(calc_type, entity, value, ts, kind, level, score):
+        value, score = float(value), float(score)
+        where = f" for {entity}" if entity != "" else ""
+        if kind == "threshold":
+            message = (f"{calc_type}{where} is {value:.6g}, back within thresholds" if level == 0
+                       else f"{calc_type}{where} is {value:.6g}, outside its {SEVERITIES[level]} threshold")
+        else:
+            message = f"{calc_type}{where} is {value:.6g}, anomalous for this series (z = {score:+.1f})"
+        return Alert(float(ts), calc_type, entity, value, kind, SEVERITIES[level], score if math.isfinite(score) else None, message)
+
+    def _emit(self, alert):
+        self.raised[alert.kind] += 1
+        self._recent.append(alert)
+        logger.log(LOG_LEVELS[SEVERITIES.index(alert.severity)], json.dumps(alert._asdict()))
+        if self.webhook is not None:
+            self.webhook.send(alert)
+
+    def recent(self, n=50, calc_type=None):
+        """The newest ``n`` alerts, newest first."""
+        alerts = [alert for alert in reversed(self._recent) if calc_type is None or alert.calc_type == calc_type]
+        return alerts[:n]
+
+    def stats(self):
+        return {
+            "series": self._size,
+            "evicted": self.evicted,
+            "observed": self.observed,
+            "threshold_alerts": self.raised["threshold"],
+            "anomaly_alerts": self.raised["anomaly"],
+            "state_bytes": self.nbytes,
+            **({"webhook": self.webhook.stats()} if self.webhook is not None else {}),
+        }
+
+
+_monitor = None
+_monitor_lock = threading.Lock()
+
+
+def get_monitor():
+    """Process-wide monitor from :func:`get_config`, shared by every session and feed."""
+    global _monitor
+    with _monitor_lock:
+        if _monitor is None:
+            config = get_config()
+            configure_log_file()
+            _monitor = Monitor(config, Webhook(config.webhook) if config.webhook else None)
+        return _monitor
+
+
+# Stand-in webhook receiver and file check
+class _Receiver(BaseHTTPRequestHandler):
+    out = sys.stdout
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        try:
+            alerts = json.loads(body)["alerts"]
+        except (json.JSONDecodeError, KeyError, TypeError):
+            self.send_error(400, "expected {\"alerts\": [...]}")
+            return
+        for alert in alerts:
+            self.out.write(json.dumps(alert) + "\n")
+        self.out.flush()
+        self.send_response(204)
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(host="127.0.0.1", port=DEFAULT_WEBHOOK_PORT, out=sys.stdout):
+    handler = type("Receiver", (_Receiver,), {"out": out})
+    server = ThreadingHTTPServer((host, port), handler)
+    sys.stderr.write(f"receiving alerts on http://{host}:{server.server_port}/ (POST)\n")
+    server.serve_forever()
+
+
+def check_file(source, calc_type, columns=None, entity_column=None, monitor=None, chunk_size=None):
+    """Score a CSV/Parquet file chunk by chunk and run the results through ``monitor``; yields alerts."""
+    from productivity import ingest
+
+    monitor = Monitor(get_config()) if monitor is None else monitor
+    columns = columns or {}
+    for chunk, result, _ in ingest.score_file(source, calc_type, columns, chunk_size or ingest.DEFAULT_CHUNK_SIZE,
+                                              extra=[entity_column] if entity_column else None):
+        entities = chunk[entity_column].astype(str).tolist() if entity_column else None
+        yield from monitor.observe_batch(calc_type, result, entities)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m productivity.alerts",
+                                     description="Productivity alerting tools.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    receive = commands.add_parser("serve", help="local stand-in webhook: print received alerts as JSON lines")
+    receive.add_argument("--host", default="127.0.0.1")
+    receive.add_argument("--port", type=int, default=DEFAULT_WEBHOOK_PORT)
+    check = commands.add_parser("check", help="score a CSV/Parquet file and print the alerts it raises")
+    check.add_argument("file", metavar="FILE")
+    check.add_argument("--type", required=True, choices=list(engine.SHORT_NAMES), help="calculator")
+    check.add_argument("--entity", help="column naming the entity (machine, site...) of each row")
+    check.add_argument("--map", action="append", default=[], metavar="INPUT=COLUMN", help="read INPUT from COLUMN")
+    args = parser.parse_args(argv)
+    try:
+        if args.command == "serve":
+            serve(args.host, args.port)
+            return 0
+        calc_type = engine.SHORT_NAMES[args.type]
+        columns = dict(pair.split("=", 1) for pair in args.map)
+        logger.addHandler(logging.NullHandler())  # alerts go to stdout, not also to stderr
+        config = get_config()
+        monitor = Monitor(config, Webhook(config.webhook) if config.webhook else None)
+        raised = 0
+        for alert in check_file(args.file, calc_type, columns, args.entity, monitor):
+            sys.stdout.write(json.dumps(alert._asdict()) + "\n")
+            raised += 1
+        sys.stderr.write(f"{raised} alerts\n")
+        if monitor.webhook is not None and (not monitor.webhook.flush() or monitor.webhook.dropped):
+            sys.stderr.write(f"webhook: {monitor.webhook.stats()}\n")
+    except KeyboardInterrupt:
+        pass
+    except (OSError, ValueError, KeyError) as exc:
+        parser.exit(1, f"alerts: error: {exc}\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,336 @@
+"""Asyncio HTTP/JSON API for the calculators, with micro-batching.
+
+Run ``python -m productivity.api`` (stdlib only, plus NumPy). Endpoints::
+
+    GET  /calculators           calculator short names, labels and inputs
+    POST /calculate/<short>     {"output": 1000, "labour_input": 200} -> {"result": 5.0}
+    POST /batch/<short>         {"rows": [{...}, ...]} or {"<input>": [...], ...}
+                                -> {"results": [...]}
+    GET  /stats                 queue depth, batch sizes, request latency
+    GET  /health
+
+Single calculations are not computed one by one: each calculator has a
+:class:`MicroBatcher` that collects concurrent requests and evaluates them
+as one vectorized kernel call, either once ``max_batch`` requests are
+waiting or when the oldest has waited ``max_delay`` seconds, whichever
+comes first. The latency budget therefore bounds the added wait, while
+under load batches grow and the per-request cost shrinks.
+"""
+import argparse
+import asyncio
+import json
+import math
+import sys
+import time
+import traceback
+from collections import deque
+from http import HTTPStatus
+
+import numpy as np
+
+from productivity import engine
+
+DEFAULT_PORT = 8600
+DEFAULT_MAX_BATCH = 512
+DEFAULT_MAX_DELAY = 0.002
+LATENCY_WINDOW = 10_000
+MAX_BODY = 64 * 1024 * 1024
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def _finite(value):
+    value = float(value)
+    return value if math.isfinite(value) else None
+
+
+class MicroBatcher:
+    """Groups single calculations for one calculator into vectorized calls."""
+
+    def __init__(self, calc_type, max_batch=DEFAULT_MAX_BATCH, max_delay=DEFAULT_MAX_DELAY):
+        self.func, self.inputs = engine.CALCULATORS[calc_type]
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self._pending = []
+        self._timer = None
+        self.batches = 0
+        self.items = 0
+        self.last_batch = 0
+        self.largest_batch = 0
+
+    @property
+    def depth(self):
+        return len(self._pending)
+
+    def submit(self, values):
+        """Queue one row of input values; returns a future for its result."""
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((values, future))
+        if len(self._pending) >= self.max_batch:
+            self.flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.max_delay, self.flush)
+        return future
+
+    def flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        pending, self._pending = self._pending, []
+        if not pending:
+            return
+        try:
+            rows = np.array([values for values, _ in pending], dtype=np.float64)
+            results = self.func(*rows.T).tolist()
+        except Exception as exc:  # runs in a loop callback: fail the batch's requests, never leave them waiting
+            error = HTTPError(HTTPStatus.INTERNAL_SERVER_ERROR, f"calculation failed: {exc}")
+            for _, future in pending:
+                if not future.done():
+                    future.set_exception(error)
+            return
+        for (_, future), result in zip(pending, results):
+            if not future.done():
+                future.set_result(result)
+        self.batches += 1
+        self.items += len(pending)
+        self.last_batch = len(pending)
+        self.largest_batch = max(self.largest_batch, len(pending))
+
+    def stats(self):
+        return {
+            "queue_depth": self.depth,
+            "batches": self.batches,
+            "requests": self.items,
+            "mean_batch_size": self.items / self.batches if self.batches else 0.0,
+            "last_batch_size": self.last_batch,
+            "largest_batch_size": self.largest_batch,
+        }
+
+
+class CalculatorAPI:
+    """Request routing and bookkeeping; transport-independent."""
+
+    def __init__(self, max_batch=DEFAULT_MAX_BATCH, max_delay=DEFAULT_MAX_DELAY):
+        self.batchers = {
+            short: MicroBatcher(calc_type, max_batch, max_delay)
+            for short, calc_type in engine.SHORT_NAMES.items()
+        }
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.started = time.time()
+        self.requests = 0
+        self.errors = 0
+        self.bulk_rows = 0
+        self.connections = 0
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+
+    async def handle(self, method, path, body):
+        """Return ``(status, payload)`` for one request."""
+        parts = path.split("?", 1)[0].strip("/").split("/")
+        route = parts[0]
+        if route in ("calculate", "batch") and len(parts) == 2:
+            if method != "POST":
+                raise HTTPError(HTTPStatus.METHOD_NOT_ALLOWED, "use POST")
+            if parts[1] not in self.batchers:
+                raise HTTPError(HTTPStatus.NOT_FOUND, f"unknown calculator {parts[1]!r}")
+            payload = _json(body)
+            if route == "calculate":
+                return HTTPStatus.OK, await self.calculate(parts[1], payload)
+            return HTTPStatus.OK, self.batch(parts[1], payload)
+        if method != "GET" or len(parts) != 1:
+            raise HTTPError(HTTPStatus.NOT_FOUND, f"no route for {method} {path}")
+        if route == "calculators":
+            return HTTPStatus.OK, {
+                short: {"name": calc_type, "inputs": list(engine.CALCULATORS[calc_type][1])}
+                for short, calc_type in engine.SHORT_NAMES.items()
+            }
+        if route == "stats":
+            return HTTPStatus.OK, self.stats()
+        if route == "health":
+            return HTTPStatus.OK, {"status": "ok"}
+        raise HTTPError(HTTPStatus.NOT_FOUND, f"no route for {method} {path}")
+
+    async def calculate(self, short, payload):
+        batcher = self.batchers[short]
+        if not isinstance(payload, dict):
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "expected a JSON object of inputs")
+        values = [_number(payload, name) for name in batcher.inputs]
+        return {"result": _finite(await batcher.submit(values))}
+
+    def batch(self, short, payload):
+        func, inputs = self.batchers[short].func, self.batchers[short].inputs
+        if isinstance(payload, dict) and "rows" in payload:
+            rows = payload["rows"]
+            if not isinstance(rows, list) or not all(isinstance(row, dict) for row in rows):
+                raise HTTPError(HTTPStatus.BAD_REQUEST, '"rows" must be a list of objects')
+            columns = [[_number(row, name) for row in rows] for name in inputs]
+        elif isinstance(payload, dict):
+            missing = [name for name in inputs if name not in payload]
+            if missing:
+                raise HTTPError(HTTPStatus.BAD_REQUEST, f"missing inputs {missing}")
+            columns = [payload[name] for name in inputs]
+        else:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, 'expected {"rows": [...]} or one array per input')
+        try:
+            arrays = [np.asarray(column, dtype=np.float64) for column in columns]
+            if any(array.ndim > 1 for array in arrays):
+                raise HTTPError(HTTPStatus.BAD_REQUEST, "each input must be a number or a flat array of numbers")
+            results = func(*arrays)
+        except (TypeError, ValueError, OverflowError) as exc:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, f"bad input arrays: {exc}") from None
+        self.bulk_rows += results.size
+        return {"results": [value if math.isfinite(value) else None for value in np.atleast_1d(results).tolist()]}
+
+    def stats(self):
+        latencies = np.array(self.latencies) * 1000 if self.latencies else np.zeros(1)
+        uptime = time.time() - self.started
+        return {
+            "uptime_s": uptime,
+            "requests": self.requests,
+            "errors": self.errors,
+            "requests_per_s": self.requests / uptime if uptime else 0.0,
+            "bulk_rows": self.bulk_rows,
+            "open_connections": self.connections,
+            "queue_depth": sum(b.depth for b in self.batchers.values()),
+            "latency_ms": {
+                "window": len(self.latencies),
+                "p50": float(np.percentile(latencies, 50)),
+                "p99": float(np.percentile(latencies, 99)),
+                "max": float(latencies.max()),
+            },
+            "batching": {"max_batch": self.max_batch, "max_delay_ms": self.max_delay * 1000},
+            "calculators": {short: b.stats() for short, b in self.batchers.items()},
+        }
+
+
+def _json(body):
+    try:
+        return json.loads(body or b"null")
+    except (UnicodeDecodeError, json.JSONDecodeError) as exc:
+        raise HTTPError(HTTPStatus.BAD_REQUEST, f"invalid JSON: {exc}") from None
+
+
+def _number(row, name):
+    value = row.get(name)
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise HTTPError(HTTPStatus.BAD_REQUEST, f"input {name!r} must be a number")
+    try:
+        value = float(value)
+    except OverflowError:
+        raise HTTPError(HTTPStatus.BAD_REQUEST, f"input {name!r} is too large") from None
+    if not math.isfinite(value):
+        raise HTTPError(HTTPStatus.BAD_REQUEST, f"input {name!r} must be finite")
+    return value
+
+
+async def _read_request(reader):
+    """Parse one HTTP/1.1 request; ``None`` when the client closed the connection."""
+    try:
+        head = await reader.readuntil(b"\r\n\r\n")
+    except asyncio.IncompleteReadError:
+        return None
+    lines = head.decode("latin-1").split("\r\n")
+    try:
+        method, path, version = lines[0].split(" ", 2)
+    except ValueError:
+        raise HTTPError(HTTPStatus.BAD_REQUEST, "malformed request line") from None
+    headers = {}
+    for line in lines[1:]:
+        name, _, value = line.partition(":")
+        if name:
+            headers[name.strip().lower()] = value.strip()
+    length = int(headers.get("content-length") or 0)
+    if length > MAX_BODY:
+        raise HTTPError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, "request body too large")
+    body = await reader.readexactly(length) if length else b""
+    keep_alive = headers.get("connection", "").lower() != "close" and version == "HTTP/1.1"
+    return method, path, body, keep_alive
+
+
+def _response(status, payload, keep_alive):
+    body = json.dumps(payload).encode()
+    head = (
+        f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+        f"Content-Type: application/json\r\n"
+        f"Content-Length: {len(body)}\r\n"
+        f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+    )
+    return head.encode("latin-1") + body
+
+
+async def serve_connection(api, reader, writer):
+    api.connections += 1
+    try:
+        while True:
+            keep_alive = False
+            try:
+                request = await _read_request(reader)
+                if request is None:
+                    break
+                method, path, body, keep_alive = request
+                started = time.perf_counter()
+                status, payload = await api.handle(method, path, body)
+            except HTTPError as exc:
+                api.errors += 1
+                status, payload = exc.status, {"error": str(exc)}
+                started = None
+            except (asyncio.LimitOverrunError, ValueError) as exc:
+                api.errors += 1
+                status, payload, started = HTTPStatus.BAD_REQUEST, {"error": str(exc)}, None
+            except (ConnectionError, asyncio.IncompleteReadError):
+                raise
+            except Exception:  # a bug must fail one request with a reply, not drop the connection
+                traceback.print_exc()
+                api.errors += 1
+                status, payload, started = HTTPStatus.INTERNAL_SERVER_ERROR, {"error": "internal error"}, None
+            writer.write(_response(status, payload, keep_alive))
+            await writer.drain()
+            api.requests += 1
+            if started is not None:
+                api.latencies.append(time.perf_counter() - started)
+            if not keep_alive:
+                break
+    except (ConnectionError, asyncio.IncompleteReadError):
+        pass
+    finally:
+        api.connections -= 1
+        writer.close()
+
+
+async def serve(host="127.0.0.1", port=DEFAULT_PORT, max_batch=DEFAULT_MAX_BATCH,
+                max_delay=DEFAULT_MAX_DELAY, ready=None):
+    api = CalculatorAPI(max_batch, max_delay)
+    server = await asyncio.start_server(lambda r, w: serve_connection(api, r, w), host, port, backlog=1024)
+    if ready:
+        ready(server, api)
+    async with server:
+        await server.serve_forever()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m productivity.api", description=__doc__.split("\n\n")[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--max-batch", type=int, default=DEFAULT_MAX_BATCH,
+                        help="flush a calculator's queue at this many requests (default: %(default)s)")
+    parser.add_argument("--max-delay-ms", type=float, default=DEFAULT_MAX_DELAY * 1000,
+                        help="latency budget: longest a request waits for its batch (default: %(default)s)")
+    args = parser.parse_args(argv)
+
+    def ready(server, api):
+        address = server.sockets[0].getsockname()
+        sys.stderr.write(f"productivity API listening on http://{address[0]}:{address[1]}\n")
+
+    try:
+        asyncio.run(serve(args.host, args.port, args.max_batch, args.max_delay_ms / 1000, ready))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,45 @@
+"""Static assets (the app stylesheet) served once instead of on every rerun.
+
+With ``server.enableStaticServing`` on (see ``.streamlit/config.toml``),
+Streamlit serves the ``static/`` directory next to the app script at
+``app/static/``. Each rerun then only sends a ``<link>`` tag; the browser
+fetches the stylesheet once and revalidates it from its ETag. The URL
+carries a content hash, so an edited stylesheet is picked up on the next
+page load. Without static serving the stylesheet is inlined, as before,
+and so it is on Streamlit releases before 1.56: they serve ``.css`` files
+from ``app/static/`` as ``text/plain`` with ``nosniff``, which browsers
+refuse to apply.
+"""
+import hashlib
+import os
+from functools import lru_cache
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "static")
+STYLESHEET = "app.css"
+CSS_SERVING_VERSION = (1, 56)
+
+
+def serves_stylesheets(streamlit_version):
+    """Whether this Streamlit release serves ``app/static/*.css`` as ``text/css``."""
+    return tuple(int(part) for part in streamlit_version.split(".")[:2]) >= CSS_SERVING_VERSION
+
+
+@lru_cache(maxsize=None)
+def _load(path, mtime):
+    with open(path, encoding="utf-8") as f:
+        text = f.read()
+    return text, hashlib.sha256(text.encode("utf-8")).hexdigest()[:12]
+
+
+def read(name, static_dir=STATIC_DIR):
+    """``(text, version)`` of a static file; re-read only when it changes on disk."""
+    path = os.path.join(static_dir, name)
+    return _load(path, os.path.getmtime(path))
+
+
+def stylesheet_tag(static_serving, name=STYLESHEET, static_dir=STATIC_DIR):
+    """HTML that applies the stylesheet: a versioned ``<link>``, or inline ``<style>``."""
+    text, version = read(name, static_dir)
+    if static_serving:
+        return f'<link rel="stylesheet" href="app/static/{name}?v={version}">'
+    return f"<style>\n{text}</style>"
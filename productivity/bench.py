@@ -0,0 +1,255 @@
+"""Benchmark harness for the calculators, batch paths and chart builders.
+
+Run ``python -m productivity.bench`` to time every case over synthetic data
+of increasing size and print a JSON report (throughput, p50/p99 latency,
+peak traced memory per case). Save a report with ``-o`` and pass it to a
+later run with ``--compare`` to flag cases that got slower; the command
+exits with status 1 when any regression exceeds ``--threshold``.
+"""
+import argparse
+import fnmatch
+import json
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+import numpy as np
+
+from productivity import calculators, engine, eoq, eoqgrid, montecarlo, trends
+
+DEFAULT_SIZES = (1_000, 10_000, 100_000, 1_000_000)
+DEFAULT_REPEAT = 20
+
+
+def _rng():
+    return np.random.default_rng(12345)
+
+
+def _columns(calc_type, size):
+    _, inputs = engine.CALCULATORS[calc_type]
+    rng = _rng()
+    return {name: rng.uniform(1.0, 1000.0, size) for name in inputs}
+
+
+def scalar_case(calc_type, size):
+    func = getattr(calculators, engine.CALCULATORS[calc_type][0].__name__)
+    rows = list(zip(*_columns(calc_type, size).values()))
+
+    def run():
+        for row in rows:
+            func(*row)
+    return run
+
+
+def batch_case(calc_type, size):
+    data = _columns(calc_type, size)
+    return lambda: engine.compute(calc_type, data)
+
+
+def compute_all_case(size):
+    rng = _rng()
+    names = {name for _, inputs in engine.CALCULATORS.values() for name in inputs}
+    data = {name: rng.uniform(1.0, 1000.0, size) for name in names}
+    return lambda: engine.compute_all(data)
+
+
+def multi_item_eoq_case(size):
+    rng = _rng()
+    demand = rng.uniform(100, 10_000, size)
+    ordering = rng.uniform(10, 100, size)
+    holding = rng.uniform(1, 5, size)
+    unit_cost = rng.uniform(1, 50, size)
+    free = eoq.solve_multi_item(demand, ordering, holding, unit_cost=unit_cost)
+    return lambda: eoq.solve_multi_item(
+        demand, ordering, holding, capacity=free.space_used * 0.5,
+        unit_cost=unit_cost, budget=free.budget_used * 0.4,
+    )
+
+
+def eoq_grid_case(size):
+    rng = _rng()
+    grid = eoqgrid.get_grid()
+    demand = rng.uniform(100, 10_000, size)
+    ordering = rng.uniform(10, 100, size)
+    holding = rng.uniform(1, 5, size)
+    return lambda: grid.lookup(demand, ordering, holding)
+
+
+def trends_case(size):
+    rng = _rng()
+    calc_types = rng.choice(list(engine.CALCULATORS), size)
+    ts = 1_700_000_000_000_000 + np.arange(size, dtype=np.int64) * 60_000_000
+    values = rng.lognormal(0.0, 0.3, size)
+    return lambda: trends.TrendAggregator(3600).add_batch(calc_types, ts, values)
+
+
+def montecarlo_case(calc_type, size):
+    spec = {name: ("normal", 100.0, 10.0) for name in engine.CALCULATORS[calc_type][1]}
+    return lambda: montecarlo.simulate(calc_type, spec, draws=size)
+
+
+def chart_case(calc_type, size):
+    # ``size`` scales the inputs (e.g. annual demand for EOQ); the charts
+    # themselves should cost the same whatever the magnitude.
+    from productivity import charts
+
+    _, inputs = engine.CALCULATORS[calc_type]
+    values = tuple(float(size) if i == 0 else 10.0 + i for i in range(len(inputs)))
+    result = float(engine.CALCULATORS[calc_type][0](*values))
+
+    def run():
+        charts.build_figure(calc_type, values, result).to_json()
+    return run
+
+
+CHART_NAMES = {
+    "Total Productivity": "gauge",
+    "Labour Productivity": "bar",
+    "Material Productivity": "pie",
+    "Capital Productivity": "line",
+    "Machine Productivity": "scatter",
+    "Miscellaneous Productivity": "area",
+    "Multifactor Productivity": "factor_bar",
+    "Total Factor Productivity": "donut",
+    "Economic Order Quantity (EOQ)": "eoq_curve",
+}
+
+
+def cases(sizes):
+    """Yield ``(name, size, rows, factory)``.
+
+    ``factory()`` builds the timed callable, which processes ``rows`` items
+    per call (used for throughput).
+    """
+    for short, calc_type in engine.SHORT_NAMES.items():
+        for size in sizes:
+            if size <= 100_000:
+                yield f"scalar/{short}", size, size, lambda c=calc_type, n=size: scalar_case(c, n)
+            yield f"batch/{short}", size, size, lambda c=calc_type, n=size: batch_case(c, n)
+    for size in sizes:
+        yield "batch/all", size, size, lambda n=size: compute_all_case(n)
+        yield "eoq/multi_item", size, size, lambda n=size: multi_item_eoq_case(n)
+        yield "eoq/grid_lookup", size, size, lambda n=size: eoq_grid_case(n)
+        yield "trends/add_batch", size, size, lambda n=size: trends_case(n)
+        for short in ("eoq", "multifactor"):
+            yield f"montecarlo/{short}", size, size, lambda c=engine.SHORT_NAMES[short], n=size: montecarlo_case(c, n)
+    for calc_type, chart in CHART_NAMES.items():
+        for size in (10, 1_000, 1_000_000_000):
+            yield f"chart/{chart}", size, 1, lambda c=calc_type, n=size: chart_case(c, n)
+
+
+def measure(func, size, repeat, rows=None):
+    func()  # warm-up: imports, caches, first-call allocation
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - started)
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    samples = np.array(samples)
+    return {
+        "size": size,
+        "repeat": repeat,
+        "mean_s": float(samples.mean()),
+        "p50_s": float(np.percentile(samples, 50)),
+        "p99_s": float(np.percentile(samples, 99)),
+        "throughput_per_s": float((rows or size) / samples.mean()) if samples.mean() > 0 else None,
+        "peak_memory_bytes": int(peak),
+    }
+
+
+def _revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(sizes=DEFAULT_SIZES, repeat=DEFAULT_REPEAT, only=None, progress=None):
+    results = []
+    for name, size, rows, factory in cases(sizes):
+        if only and not any(fnmatch.fnmatch(name, pattern) for pattern in only):
+            continue
+        func = factory()
+        # Keep big cases affordable: fewer repeats once a call passes ~50 ms.
+        started = time.perf_counter()
+        func()
+        reps = repeat if time.perf_counter() - started < 0.05 else max(3, repeat // 5)
+        results.append({"name": name, **measure(func, size, reps, rows)})
+        if progress:
+            progress(results[-1])
+    return {
+        "revision": _revision(),
+        "created": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "results": results,
+    }
+
+
+def compare(report, baseline, threshold=0.10):
+    """Cases whose p50 latency grew by more than ``threshold`` versus ``baseline``."""
+    previous = {(r["name"], r["size"]): r for r in baseline["results"]}
+    regressions = []
+    for result in report["results"]:
+        old = previous.get((result["name"], result["size"]))
+        if old and old["p50_s"] > 0:
+            change = result["p50_s"] / old["p50_s"] - 1
+            if change > threshold:
+                regressions.append({
+                    "name": result["name"],
+                    "size": result["size"],
+                    "baseline_p50_s": old["p50_s"],
+                    "p50_s": result["p50_s"],
+                    "change": change,
+                })
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m productivity.bench", description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES))
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT)
+    parser.add_argument("--only", nargs="+", metavar="GLOB", help="run matching cases, e.g. 'chart/*'")
+    parser.add_argument("-o", "--out-file", help="write the JSON report here")
+    parser.add_argument("--compare", metavar="BASELINE", help="report regressions against a saved report")
+    parser.add_argument("--threshold", type=float, default=0.10, help="allowed p50 slowdown (default 10%%)")
+    args = parser.parse_args(argv)
+
+    def progress(result):
+        sys.stderr.write(
+            f"{result['name']:<24} {result['size']:>12,}  p50 {result['p50_s'] * 1e3:9.3f} ms  "
+            f"p99 {result['p99_s'] * 1e3:9.3f} ms  peak {result['peak_memory_bytes'] / 1e6:8.2f} MB\n"
+        )
+
+    report = run(args.sizes, args.repeat, args.only, progress)
+    if args.compare:
+        with open(args.compare) as f:
+            report["regressions"] = compare(report, json.load(f), args.threshold)
+    text = json.dumps(report, indent=2)
+    if args.out_file:
+        with open(args.out_file, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    for regression in report.get("regressions", []):
+        sys.stderr.write(
+            f"REGRESSION {regression['name']} @ {regression['size']:,}: "
+            f"{regression['change']:+.1%} p50\n"
+        )
+    return 1 if report.get("regressions") else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,152 @@
+"""Process-wide memoization of calculator results and chart figures.
+
+Streamlit reruns the whole script on every widget interaction, but imported
+modules survive between reruns and are shared by every session in the
+server process. The caches below live here so identical inputs - from the
+same user or another one - reuse the result and the built ``go.Figure``.
+
+In a multi-worker deployment each worker is its own process; figures and
+Monte Carlo simulations missing from a worker's caches are then looked up
+in the cross-process :mod:`productivity.sharedcache` before being built.
+"""
+import json
+import threading
+from collections import OrderedDict
+
+from productivity import engine, sharedcache
+
+
+class LRUCache:
+    """Thread-safe bounded mapping that evicts the least recently used entry."""
+
+    def __init__(self, maxsize=256):
+        if maxsize <= 0:
+            raise ValueError("maxsize must be positive")
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                value = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def get_or_compute(self, key, compute):
+        """Return the cached value for ``key``, calling ``compute()`` on a miss.
+
+        ``compute`` runs outside the lock, so two sessions missing on the same
+        key at once may both build it; the last one stored wins.
+        """
+        sentinel = _MISSING
+        value = self.get(key, sentinel)
+        if value is sentinel:
+            value = compute()
+            self.put(key, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+        }
+
+
+_MISSING = object()
+
+results = LRUCache(maxsize=4096)
+figures = LRUCache(maxsize=256)
+simulations = LRUCache(maxsize=64)
+
+
+def make_key(calc_type, inputs):
+    return (calc_type, tuple(float(value) for value in inputs))
+
+
+def _through_shared(key, compute, encode=None, decode=None):
+    """``compute()``, or the value another worker stored under ``key`` when a shared cache is configured."""
+    store = sharedcache.get_store()
+    if store is None:
+        return compute()
+    stored = store.get(key, _MISSING)
+    if stored is not _MISSING:
+        return decode(stored) if decode else stored
+    value = compute()
+    store.put(key, encode(value) if encode else value)
+    return value
+
+
+def _figure_from_spec(spec):
+    import plotly.graph_objects as go
+
+    # The spec comes from a figure that was validated when built; validating
+    # it again would cost more than building the figure from scratch
+    return go.Figure(json.loads(spec), _validate=False)
+
+
+def cached_result(calc_type, inputs):
+    """Scalar result of ``calc_type`` for the ordered ``inputs``, memoized."""
+    func, _ = engine.CALCULATORS[calc_type]
+    key = make_key(calc_type, inputs)
+    return results.get_or_compute(key, lambda: float(func(*key[1])))
+
+
+def cached_figure(calc_type, inputs, result=None):
+    """Chart for ``calc_type`` and ``inputs``, memoized.
+
+    The result is derived from the inputs, so it is not part of the key.
+    """
+    from productivity import charts  # Plotly is only needed once a chart is drawn
+
+    key = make_key(calc_type, inputs)
+    if result is None:
+        result = cached_result(calc_type, inputs)
+    return figures.get_or_compute(key, lambda: _through_shared(
+        ("figure", *key), lambda: charts.build_figure(calc_type, key[1], result),
+        encode=lambda figure: figure.to_json(), decode=_figure_from_spec,
+    ))
+
+
+def cached_simulation(calc_type, spec, draws, seed=0, progress=None):
+    """Monte Carlo simulation of ``calc_type`` over ``spec``, memoized (the same seed gives the same draws).
+
+    ``progress`` is only called when the simulation actually runs.
+    """
+    from productivity import montecarlo
+
+    key = ("simulation", calc_type, tuple(sorted((name, spec[name]) for name in spec)), int(draws), int(seed))
+    return simulations.get_or_compute(key, lambda: _through_shared(
+        key, lambda: montecarlo.simulate(calc_type, spec, int(draws), int(seed), progress=progress),
+    ))
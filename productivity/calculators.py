@@ -0,0 +1,34 @@
+"""Scalar productivity calculators.
+
+Importable without Streamlit or Plotly; each function is a thin wrapper
+over the vectorized kernel of the same name in :mod:`productivity.engine`.
+"""
+from productivity import engine
+
+
+def total_productivity(output, total_input):
+    return float(engine.total_productivity(output, total_input))
+
+def labour_productivity(output, labour_input):
+    return float(engine.labour_productivity(output, labour_input))
+
+def material_productivity(output, material_input):
+    return float(engine.material_productivity(output, material_input))
+
+def capital_productivity(output, capital_input):
+    return float(engine.capital_productivity(output, capital_input))
+
+def machine_productivity(output, machine_input):
+    return float(engine.machine_productivity(output, machine_input))
+
+def miscellaneous_productivity(output, misc_input):
+    return float(engine.miscellaneous_productivity(output, misc_input))
+
+def multifactor_productivity(output, human, material, capital, energy, misc):
+    return float(engine.multifactor_productivity(output, human, material, capital, energy, misc))
+
+def total_factor_productivity(net_output, worker_input, machine_input):
+    return float(engine.total_factor_productivity(net_output, worker_input, machine_input))
+
+def calculate_eoq(demand, ordering_cost, holding_cost):
+    return float(engine.calculate_eoq(demand, ordering_cost, holding_cost))
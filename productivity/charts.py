@@ -0,0 +1,554 @@
+"""Plotly figure builders for each calculator type.
+
+Each builder takes the calculator's inputs (in the order listed in
+:data:`productivity.engine.CALCULATORS`) followed by the computed result and
+returns a ``go.Figure``. Figures are pure functions of their arguments, so
+they can be memoized and shared between sessions.
+"""
+import plotly.graph_objects as go
+import numpy as np
+from plotly.colors import qualitative
+
+from productivity import alerts, eoq, rendering
+
+
+def gauge_steps(thresholds, top):
+    """Gauge bands from alert thresholds: red and yellow beyond the critical and warning bounds, green between."""
+    points, colors = [0.0], []
+    for bound, color in ((thresholds.critical_low, "#dc3545"), (thresholds.warning_low, "#ffc107")):
+        if bound is not None:
+            points.append(bound)
+            colors.append(color)
+    colors.append("#28a745")
+    for bound, color in ((thresholds.warning_high, "#ffc107"), (thresholds.critical_high, "#dc3545")):
+        if bound is not None:
+            points.append(bound)
+            colors.append(color)
+    points.append(top)
+    return [{'range': [low, high], 'color': color} for low, high, color in zip(points, points[1:], colors)]
+
+
+def total_productivity_chart(output, total_input, result):
+    # Bands follow the alert thresholds (see productivity.alerts), fixed per process
+    thresholds = alerts.get_config().thresholds.get("Total Productivity") or alerts.Thresholds()
+    target = thresholds.warning_low or thresholds.critical_low or 1.0
+    top = 1.25 * (thresholds.critical_high or thresholds.warning_high or 0.0) or 2 * target
+    fig = go.Figure()
+    fig.add_trace(go.Indicator(
+        mode="gauge+number+delta",
+        value=result,
+        domain={'x': [0, 1], 'y': [0, 1]},
+        title={'text': "Productivity Value", 'font': {'size': 20}},
+        delta={'reference': target},
+        gauge={
+            'axis': {'range': [None, top], 'tickwidth': 1, 'tickcolor': "#2c3e50"},
+            'bar': {'color': "#007bff"},
+            'bgcolor': "white",
+            'borderwidth': 2,
+            'bordercolor': "#2c3e50",
+            'steps': gauge_steps(thresholds, top),
+            'threshold': {
+                'line': {'color': "red", 'width': 4},
+                'thickness': 0.75,
+                'value': target
+            }
+        }
+    ))
+    fig.update_layout(
+        height=400,
+        paper_bgcolor='rgba(0,0,0,0)',
+        plot_bgcolor='rgba(0,0,0,0)',
+        font={'color': '#2c3e50'}
+    )
+    return fig
+
+
+def labour_productivity_chart(output, labour_input, result):
+    # One trace per bar, so each gets its own colour and legend entry
+    fig = go.Figure([
+        go.Bar(x=[metric], y=[value], name=metric, marker_color=color)
+        for metric, value, color in (('Output', output, '#007bff'), ('Labour Input', labour_input, '#6c757d'))
+    ])
+    fig.update_layout(
+        title="Output vs Labour Input",
+        xaxis_title="Metric",
+        yaxis_title="Value",
+        legend_title_text="Metric",
+        title_font_size=18,
+        title_font_color='#2c3e50',
+        paper_bgcolor='rgba(0,0,0,0)',
+        plot_bgcolor='rgba(0,0,0,0)',
+        font={'color': '#2c3e50'}
+    )
+    return fig
+
+
+def material_productivity_chart(output, material_input, result):
+    fig = go.Figure(data=[go.Pie(
+        labels=['Output', 'Material Input'],
+        values=[output, material_input],
+        hole=0.4,
+        marker_colors=['#007bff', '#6c757d'],
+        textinfo='label+percent',
+        textfont_size=14
+    )])
+    fig.update_layout(
+        title="Output vs Material Input Distribution",
+        title_font_size=18,
+        title_font_color='#2c3e50',
+        paper_bgcolor='rgba(0,0,0,0)',
+        plot_bgcolor='rgba(0,0,0,0)'
+    )
+    return fig
+
+
+def capital_productivity_chart(output, capital_input, result):
+    fig = go.Figure()
+    fig.add_trace(rendering.line_trace(
+        ['Capital Input', 'Output'],
+        [capital_input, output],
+        mode='lines+markers',
+        name='Productivity Flow',
+        line=dict(color='#007bff', width=3),
+        marker=dict(size=10, color='#6c757d')
+    ))
+    fig.update_layout(
+        title="Capital Input to Output Flow",
+        title_font_size=18,
+        title_font_color='#2c3e50',
+        paper_bgcolor='rgba(0,0,0,0)',
+        plot_bgcolor='rgba(0,0,0,0)',
+        font={'color': '#2c3e50'}
+    )
+    return fig
+
+
+def machine_productivity_chart(output, machine_input, result):
+    fig = go.Figure()
+    fig.add_trace(rendering.scatter_trace(
+        np.atleast_1d(machine_input),
+        np.atleast_1d(output),
+        name='Machines',
+        marker=dict(color='#007bff'),
+        showlegend=False
+    ))
+    fig.add_trace(go.Scatter(
+        x=[0, np.max(machine_input)*1.5],
+        y=[0, np.max(machine_input)*1.5*result],
+        mode='lines',
+        name='Efficiency Line',
+        line=dict(color='#6c757d', width=2, dash='dash')
+    ))
+    fig.update_layout(
+        title="Machine Input vs Output",
+        xaxis_title="Machine Input",
+        yaxis_title="Output",
+        title_font_size=18,
+        title_font_color='#2c3e50',
+        paper_bgcolor='rgba(0,0,0,0)',
+        plot_bgcolor='rgba(0,0,0,0)',
+        font={'color': '#2c3e50'}
+    )
+    return fig
+
+
+def miscellaneous_productivity_chart(output, misc_input, result):
+    fig = go.Figure()
+    fig.add_trace(go.Scatter(
+        x=['Misc Input', 'Output'],
+        y=[misc_input, output],
+        fill='tonexty',
+        name='Productivity Area',
+        fillcolor='rgba(0, 123, 255, 0.2)',
+        line=dict(color='#007bff', width=2)
+    ))
+    fig.update_layout(
+        title="Miscellaneous Input to Output",
+        title_font_size=18,
+        title_font_color='#2c3e50',
+        paper_bgcolor='rgba(0,0,0,0)',
+        plot_bgcolor='rgba(0,0,0,0)',
+        font={'color': '#2c3e50'}
+    )
+    return fig
+
+
+def multifactor_productivity_chart(output, human, material, capital, energy, misc, result):
+    factors = ['Human', 'Material', 'Capital', 'Energy', 'Misc']
+    values = [human, material, capital, energy, misc]
+
+    fig = go.Figure(data=[
+        go.Bar(
+            name='Input Factors',
+            x=factors,
+            y=values,
+            marker_color=['#007bff', '#6c757d', '#28a745', '#ffc107', '#dc3545']
+        )
+    ])
+    fig.update_layout(
+        title="Input Factors Breakdown",
+        title_font_size=18,
+        title_font_color='#2c3e50',
+        barmode='stack',
+        paper_bgcolor='rgba(0,0,0,0)',
+        plot_bgcolor='rgba(0,0,0,0)',
+        font={'color': '#2c3e50'}
+    )
+    return fig
+
+
+def total_factor_productivity_chart(net_output, worker_input, machine_input, result):
+    fig = go.Figure(data=[go.Pie(
+        labels=['Worker Input', 'Machine Input'],
+        values=[worker_input, machine_input],
+        hole=0.6,
+        marker_colors=['#007bff', '#6c757d'],
+        textinfo='label+percent',
+        textfont_size=14
+    )])
+    fig.update_layout(
+        title="Input Distribution",
+        title_font_size=18,
+        title_font_color='#2c3e50',
+        paper_bgcolor='rgba(0,0,0,0)',
+        plot_bgcolor='rgba(0,0,0,0)'
+    )
+    return fig
+
+
+def eoq_chart(demand, ordering_cost, holding_cost, result):
+    curve = eoq.cost_curve(demand, ordering_cost, holding_cost)
+
+    fig = go.Figure()
+    fig.add_trace(rendering.line_trace(
+        curve.quantity,
+        curve.total,
+        mode='lines',
+        name='Total Cost',
+        line=dict(color='#007bff', width=3)
+    ))
+    fig.add_trace(rendering.line_trace(
+        curve.quantity,
+        curve.ordering,
+        mode='lines',
+        name='Ordering Cost',
+        line=dict(color='#6c757d', width=2, dash='dash')
+    ))
+    fig.add_trace(rendering.line_trace(
+        curve.quantity,
+        curve.holding,
+        mode='lines',
+        name='Holding Cost',
+        line=dict(color='#28a745', width=2, dash='dot')
+    ))
+    fig.add_vline(
+        x=result,
+        line_dash="dash",
+        line_color="red",
+        annotation_text=f"EOQ = {result:,.2f}",
+        annotation_font_size=14
+    )
+    fig.update_layout(
+        title="Total Cost vs Order Quantity",
+        xaxis_title="Order Quantity",
+        yaxis_title="Total Cost",
+        title_font_size=18,
+        title_font_color='#2c3e50',
+        paper_bgcolor='rgba(0,0,0,0)',
+        plot_bgcolor='rgba(0,0,0,0)',
+        font={'color': '#2c3e50'}
+    )
+    return fig
+
+
+def eoq_surface_chart(surface, quantity="min_cost", point=None, three_d=False):
+    """EOQ or minimum total cost over two parameters (an ``eoqgrid.Surface``), as a contour or 3D surface.
+
+    ``point`` marks the current ``(x, y)`` values.
+    """
+    names = {"demand": "Annual Demand", "ordering_cost": "Ordering Cost", "holding_cost": "Holding Cost"}
+    z_title = "EOQ" if quantity == "eoq" else "Minimum Total Cost"
+    z = getattr(surface, quantity)
+    fig = go.Figure()
+    if three_d:
+        fig.add_trace(go.Surface(
+            x=surface.x_values,
+            y=surface.y_values,
+            z=z,
+            colorscale='Blues',
+            colorbar=dict(title=z_title),
+            name=z_title
+        ))
+        if point is not None:
+            marker_z = z[np.abs(surface.y_values - point[1]).argmin(), np.abs(surface.x_values - point[0]).argmin()]
+            fig.add_trace(go.Scatter3d(
+                x=[point[0]], y=[point[1]], z=[marker_z],
+                mode='markers',
+                marker=dict(size=6, color='#dc3545'),
+                name='Current'
+            ))
+        fig.update_layout(scene=dict(
+            xaxis=dict(title=names[surface.x], type='log'),
+            yaxis=dict(title=names[surface.y], type='log'),
+            zaxis=dict(title=z_title, type='log')
+        ))
+    else:
+        fig.add_trace(go.Contour(
+            x=surface.x_values,
+            y=surface.y_values,
+            z=np.log10(z),
+            colorscale='Blues',
+            colorbar=dict(title=f"log10 {z_title}"),
+            contours=dict(showlabels=True),
+            name=z_title
+        ))
+        if point is not None:
+            fig.add_trace(go.Scatter(
+                x=[point[0]], y=[point[1]],
+                mode='markers',
+                marker=dict(size=12, color='#dc3545', symbol='x'),
+                name='Current'
+            ))
+        fig.update_xaxes(type='log', title_text=names[surface.x])
+        fig.update_yaxes(type='log', title_text=names[surface.y])
+    fig.update_layout(
+        title=f"{z_title} vs {names[surface.x]} and {names[surface.y]}",
+        showlegend=False,
+        uirevision=f"{surface.x}-{surface.y}-{three_d}",
+        title_font_size=18,
+        title_font_color='#2c3e50',
+        paper_bgcolor='rgba(0,0,0,0)',
+        plot_bgcolor='rgba(0,0,0,0)',
+        font={'color': '#2c3e50'}
+    )
+    return fig
+
+
+def bulk_result_chart(rows, results, calc_type):
+    """Result by row number for a bulk-scored file (already downsampled or not)."""
+    fig = go.Figure()
+    fig.add_trace(rendering.line_trace(
+        rows,
+        results,
+        method='minmax',
+        mode='lines',
+        name=calc_type,
+        line=dict(color='#007bff', width=1)
+    ))
+    fig.update_layout(
+        title=f"{calc_type} by Row",
+        xaxis_title="Row",
+        yaxis_title="Result",
+        title_font_size=18,
+        title_font_color='#2c3e50',
+        paper_bgcolor='rgba(0,0,0,0)',
+        plot_bgcolor='rgba(0,0,0,0)',
+        font={'color': '#2c3e50'}
+    )
+    return fig
+
+
+def bulk_scatter_chart(x, y, x_label, y_label):
+    """Point cloud of one input against another for a bulk-scored file."""
+    fig = go.Figure()
+    fig.add_trace(rendering.scatter_trace(
+        x,
+        y,
+        name=f"{x_label} vs {y_label}",
+        marker=dict(size=4, color='#007bff', opacity=0.6)
+    ))
+    fig.update_layout(
+        title=f"{x_label} vs {y_label}",
+        xaxis_title=x_label,
+        yaxis_title=y_label,
+        title_font_size=18,
+        title_font_color='#2c3e50',
+        paper_bgcolor='rgba(0,0,0,0)',
+        plot_bgcolor='rgba(0,0,0,0)',
+        font={'color': '#2c3e50'}
+    )
+    return fig
+
+
+def trend_chart(rows, calc_type):
+    """Bucket means with rolling mean and p50-p90 band from trend summary rows."""
+    buckets = [row['bucket'] for row in rows]
+    fig = go.Figure()
+    fig.add_trace(go.Scatter(
+        x=buckets,
+        y=[row['p90'] for row in rows],
+        mode='lines',
+        name='p90',
+        line=dict(color='rgba(0, 123, 255, 0.3)', width=0)
+    ))
+    fig.add_trace(go.Scatter(
+        x=buckets,
+        y=[row['p50'] for row in rows],
+        mode='lines',
+        name='p50-p90',
+        fill='tonexty',
+        fillcolor='rgba(0, 123, 255, 0.15)',
+        line=dict(color='rgba(0, 123, 255, 0.3)', width=0)
+    ))
+    fig.add_trace(go.Scatter(
+        x=buckets,
+        y=[row['mean'] for row in rows],
+        mode='lines+markers',
+        name='Mean',
+        line=dict(color='#007bff', width=2),
+        marker=dict(size=4, color='#007bff')
+    ))
+    fig.add_trace(go.Scatter(
+        x=buckets,
+        y=[row['rolling_mean'] for row in rows],
+        mode='lines',
+        name='Rolling Mean',
+        line=dict(color='#6c757d', width=2, dash='dash')
+    ))
+    fig.update_layout(
+        title=f"{calc_type} Trend",
+        xaxis_title="Period",
+        yaxis_title="Result",
+        title_font_size=18,
+        title_font_color='#2c3e50',
+        paper_bgcolor='rgba(0,0,0,0)',
+        plot_bgcolor='rgba(0,0,0,0)',
+        font={'color': '#2c3e50'}
+    )
+    return fig
+
+
+def scenario_chart(sweep, max_lines=8):
+    """Site-mean result of a scenario sweep.
+
+    Grid sweeps plot the mean against the first varied input, one line per
+    value of the second (averaged over any others); sampled sweeps, whose
+    changes rarely repeat, show the distribution of scenario means instead.
+    """
+    names = sweep.factor_names
+    means = sweep.values.mean(axis=1)
+    x_values, x_codes = np.unique(sweep.scenarios[:, 0], return_inverse=True)
+    fig = go.Figure()
+    if len(x_values) > 50:
+        fig.add_trace(go.Histogram(x=means, nbinsx=60, marker_color='#007bff', name='Scenarios'))
+        x_title, y_title = f"Mean {sweep.calc_type}", "Scenarios"
+    else:
+        if len(names) > 1:
+            line_values, line_codes = np.unique(sweep.scenarios[:, 1], return_inverse=True)
+        else:
+            line_values, line_codes = np.zeros(1), np.zeros(len(means), dtype=np.int64)
+        colors = qualitative.Plotly
+        for i, line in enumerate(line_values[:max_lines]):
+            rows = line_codes == i
+            totals = np.bincount(x_codes[rows], weights=means[rows], minlength=len(x_values))
+            counts = np.bincount(x_codes[rows], minlength=len(x_values))
+            filled = counts > 0
+            fig.add_trace(go.Scatter(
+                x=x_values[filled] * 100,
+                y=totals[filled] / counts[filled],
+                mode='lines+markers',
+                name=f"{names[1]} {line * 100:+g}%" if len(names) > 1 else sweep.calc_type,
+                line=dict(color=colors[i % len(colors)], width=2)
+            ))
+        x_title, y_title = f"{names[0]} change (%)", f"Mean {sweep.calc_type}"
+    fig.update_layout(
+        title=f"{sweep.calc_type} Scenarios ({sweep.values.shape[1]:,} sites)",
+        xaxis_title=x_title,
+        yaxis_title=y_title,
+        title_font_size=18,
+        title_font_color='#2c3e50',
+        paper_bgcolor='rgba(0,0,0,0)',
+        plot_bgcolor='rgba(0,0,0,0)',
+        font={'color': '#2c3e50'}
+    )
+    return fig
+
+
+def montecarlo_chart(simulation, level=0.90):
+    """Histogram of simulated results with the mean and a central interval marked."""
+    counts, edges = simulation.histogram()
+    low, high = simulation.interval(level)
+    fig = go.Figure()
+    fig.add_trace(go.Bar(
+        x=(edges[:-1] + edges[1:]) / 2,
+        y=counts,
+        width=np.diff(edges),
+        marker_color='#007bff',
+        name='Draws'
+    ))
+    fig.add_vrect(x0=low, x1=high, fillcolor='rgba(0, 123, 255, 0.1)', line_width=0,
+                  annotation_text=f"{level:.0%} interval", annotation_position="top left")
+    fig.add_vline(x=simulation.mean, line_dash="dash", line_color="#dc3545",
+                  annotation_text=f"Mean = {simulation.mean:,.4f}", annotation_position="top right")
+    fig.update_layout(
+        title=f"{simulation.calc_type} Distribution ({simulation.count:,} draws)",
+        xaxis_title="Result",
+        yaxis_title="Draws",
+        bargap=0,
+        showlegend=False,
+        title_font_size=18,
+        title_font_color='#2c3e50',
+        paper_bgcolor='rgba(0,0,0,0)',
+        plot_bgcolor='rgba(0,0,0,0)',
+        font={'color': '#2c3e50'}
+    )
+    return fig
+
+
+def live_chart(snapshot, top=30):
+    """Windowed machine productivity from a live feed: the least productive machines, and the plant-wide trend."""
+    from plotly.subplots import make_subplots
+
+    machines = np.asarray(snapshot['machines'], dtype=object)
+    productivity = np.asarray(snapshot['productivity'])
+    active = snapshot['machine_input'] > 0
+    order = np.flatnonzero(active)[np.argsort(productivity[active], kind='stable')][:top]
+    trend = snapshot['trend']
+    fig = make_subplots(rows=1, cols=2, column_widths=[0.55, 0.45],
+                        subplot_titles=(f"Lowest {len(order)} of {int(active.sum()):,} Machines", "Plant"))
+    fig.add_trace(go.Bar(
+        x=productivity[order],
+        y=machines[order],
+        orientation='h',
+        marker_color='#007bff',
+        name='Machine'
+    ), row=1, col=1)
+    fig.add_trace(go.Scatter(
+        x=[np.datetime64(int(ts * 1000), 'ms') for ts, _ in trend],
+        y=[value for _, value in trend],
+        mode='lines',
+        name='Plant',
+        line=dict(color='#28a745', width=2)
+    ), row=1, col=2)
+    fig.update_yaxes(autorange='reversed', row=1, col=1)
+    fig.update_xaxes(title_text="Output / machine input", row=1, col=1)
+    fig.update_layout(
+        height=max(400, 18 * len(order) + 120),
+        showlegend=False,
+        uirevision='live',
+        title_font_size=18,
+        title_font_color='#2c3e50',
+        paper_bgcolor='rgba(0,0,0,0)',
+        plot_bgcolor='rgba(0,0,0,0)',
+        font={'color': '#2c3e50'}
+    )
+    return fig
+
+
+# Calculator type -> figure builder
+CHARTS = {
+    "Total Productivity": total_productivity_chart,
+    "Labour Productivity": labour_productivity_chart,
+    "Material Productivity": material_productivity_chart,
+    "Capital Productivity": capital_productivity_chart,
+    "Machine Productivity": machine_productivity_chart,
+    "Miscellaneous Productivity": miscellaneous_productivity_chart,
+    "Multifactor Productivity": multifactor_productivity_chart,
+    "Total Factor Productivity": total_factor_productivity_chart,
+    "Economic Order Quantity (EOQ)": eoq_chart,
+}
+
+
+def build_figure(calc_type, inputs, result):
+    """Build the chart for ``calc_type`` from its ordered ``inputs`` and ``result``."""
+    return CHARTS[calc_type](*inputs, result)
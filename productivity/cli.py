@@ -0,0 +1,324 @@
+"""Headless ``productivity`` command line interface.
+
+Scores a single set of inputs given as options, or streams CSV rows from
+files/stdin through the vectorized engine in chunks. Only NumPy and the
+standard library are loaded for CSV work; pandas/pyarrow are imported
+lazily for Parquet input.
+
+Examples::
+
+    python -m productivity labour --output 1000 --labour-input 200
+    python -m productivity eoq shifts.csv --map demand=annual_demand > eoq.csv
+    python -m productivity eoq-catalog skus.csv --capacity 5000 --budget 1e6
+    python -m productivity history-export history.parquet --type eoq
+    python -m productivity rollup readings.csv --level line
+    python -m productivity eoq-grid --demand 100:1e5 --points 129
+    cat shifts.csv | python -m productivity multifactor --format jsonl
+"""
+import argparse
+import csv
+import json
+import sys
+
+import numpy as np
+
+from productivity import engine, eoqgrid
+
+DEFAULT_CHUNK_SIZE = 50_000
+
+
+def _option(name):
+    return "--" + name.replace("_", "-")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="productivity",
+        description="Compute productivity metrics and EOQ without the Streamlit UI.",
+    )
+    subparsers = parser.add_subparsers(dest="calculator", metavar="CALCULATOR", required=True)
+    for short, calc_type in engine.SHORT_NAMES.items():
+        _, inputs = engine.CALCULATORS[calc_type]
+        sub = subparsers.add_parser(short, help=calc_type, description=f"{calc_type}.")
+        values = sub.add_argument_group("single calculation")
+        for name in inputs:
+            values.add_argument(_option(name), dest=name, type=float, metavar="X")
+        sub.add_argument(
+            "files", nargs="*", metavar="FILE",
+            help="CSV or Parquet files to score; '-' or none reads CSV from stdin",
+        )
+        sub.add_argument(
+            "--map", action="append", default=[], metavar="INPUT=COLUMN",
+            help="read INPUT from COLUMN (repeatable)",
+        )
+        sub.add_argument("-o", "--out-file", help="write results here instead of stdout")
+        sub.add_argument("--format", choices=("csv", "jsonl"), default="csv")
+        sub.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+
+    catalog = subparsers.add_parser(
+        "eoq-catalog", help="Multi-item EOQ under shared space/budget limits",
+        description="Jointly optimal order quantities for every item in a CSV/Parquet catalog.",
+    )
+    catalog.add_argument("file", metavar="FILE", help="catalog with demand, ordering_cost and holding_cost columns")
+    catalog.add_argument("--capacity", type=float, help="total storage space available")
+    catalog.add_argument("--budget", type=float, help="total inventory investment available")
+    catalog.add_argument("--space-column", default="unit_space", help="space per unit column (default: %(default)s, else 1)")
+    catalog.add_argument("--cost-column", default="unit_cost", help="purchase cost per unit column (default: %(default)s)")
+    catalog.add_argument("-o", "--out-file", help="write results here instead of stdout")
+
+    dump = subparsers.add_parser(
+        "history-export", help="Export the calculation history to Parquet/Arrow/CSV.gz",
+        description="Stream the calculation history into a columnar file, batch by batch.",
+    )
+    dump.add_argument("file", metavar="FILE", help="output file; .parquet, .arrow or .csv.gz picks the format")
+    dump.add_argument("--db", help="history database (default: $PRODUCTIVITY_HISTORY_DB or productivity_history.db)")
+    dump.add_argument("--type", choices=list(engine.SHORT_NAMES), help="only this calculator")
+    dump.add_argument("--session", help="only this app session")
+    dump.add_argument("--batch-size", type=int, default=65_536, help="rows per row group / record batch (default: %(default)s)")
+    dump.set_defaults(out_file=None)
+
+    roll = subparsers.add_parser(
+        "rollup", help="Ratio-of-sums productivity at every level of a site/line/cell/machine hierarchy",
+        description="Roll a CSV/Parquet file of machine-level readings up its hierarchy, in one pass.",
+    )
+    roll.add_argument("file", metavar="FILE")
+    roll.add_argument("--levels", default="site,line,cell,machine",
+                      help="hierarchy columns, top first, comma-separated (default: %(default)s)")
+    roll.add_argument("--level", help="only this level (default: all levels, with a 'level' column)")
+    roll.add_argument("-o", "--out-file", help="write results here instead of stdout")
+
+    grid = subparsers.add_parser(
+        "eoq-grid", help="Build the memory-mapped EOQ what-if grid ahead of time",
+        description="Precompute EOQ and minimum-cost surfaces over parameter ranges (LOW:HIGH) and print the grid file.",
+    )
+    for name in eoqgrid.PARAMETERS:
+        low, high = getattr(eoqgrid.DEFAULT_SPEC, name)
+        grid.add_argument(_option(name), dest=name, type=_range, default=(low, high), metavar="LOW:HIGH",
+                          help="default: %(default)s")
+    grid.add_argument("--points", type=int, default=eoqgrid.DEFAULT_SPEC.points, help="points per axis (default: %(default)s)")
+    grid.add_argument("--dir", help="grid directory (default: $PRODUCTIVITY_EOQ_GRID_DIR or a temporary directory)")
+    grid.set_defaults(out_file=None)
+    return parser
+
+
+def _range(text):
+    low, sep, high = text.partition(":")
+    if not sep:
+        raise argparse.ArgumentTypeError(f"expected LOW:HIGH, got {text!r}")
+    return float(low), float(high)
+
+
+def _parse_mapping(pairs, inputs):
+    columns = {}
+    for pair in pairs:
+        name, sep, column = pair.partition("=")
+        if not sep or name not in inputs:
+            raise ValueError(f"bad --map {pair!r}; expected one of {', '.join(inputs)}=COLUMN")
+        columns[name] = column
+    return columns
+
+
+def _score_csv_stream(stream, calc_type, columns, chunk_size, writer):
+    _, inputs = engine.CALCULATORS[calc_type]
+    reader = csv.reader(stream)
+    header = next(reader, None)
+    if header is None:
+        return
+    try:
+        positions = [header.index(columns.get(name, name)) for name in inputs]
+    except ValueError:
+        missing = [columns.get(n, n) for n in inputs if columns.get(n, n) not in header]
+        raise ValueError(f"missing columns {missing}") from None
+
+    writer.header(header)
+    rows = []
+    for row in reader:
+        if not row:
+            continue
+        if len(row) < len(header):
+            row += [""] * (len(header) - len(row))
+        rows.append(row)
+        if len(rows) >= chunk_size:
+            _flush(rows, positions, calc_type, writer)
+            rows = []
+    if rows:
+        _flush(rows, positions, calc_type, writer)
+
+
+def _flush(rows, positions, calc_type, writer):
+    func, _ = engine.CALCULATORS[calc_type]
+    # Blank cells (short rows were padded with them) are missing values
+    values = np.array([[row[i] or "nan" for i in positions] for row in rows], dtype=np.float64)
+    writer.rows(rows, func(*values.T))
+
+
+def _score_parquet(path, calc_type, columns, chunk_size, writer):
+    import pyarrow.parquet as pq
+
+    from productivity import ingest
+
+    _, inputs = engine.CALCULATORS[calc_type]
+    names = pq.read_schema(path).names
+    missing = [columns.get(n, n) for n in inputs if columns.get(n, n) not in names]
+    if missing:
+        raise ValueError(f"missing columns {missing}")
+    first = True
+    for chunk, result, _ in ingest.score_file(path, calc_type, columns, chunk_size):
+        if first:
+            writer.header(list(chunk.columns))
+            first = False
+        writer.rows(chunk.itertuples(index=False, name=None), result)
+
+
+class _CsvWriter:
+    def __init__(self, stream):
+        self._writer = csv.writer(stream, lineterminator="\n")
+        self._names = None
+
+    def header(self, names):
+        # One header for all files, so they must share their columns
+        if self._names is None:
+            self._writer.writerow([*names, "result"])
+            self._names = list(names)
+        elif list(names) != self._names:
+            raise ValueError(f"columns {list(names)} differ from the first file's {self._names}")
+
+    def rows(self, rows, results):
+        self._writer.writerows([*row, repr(float(r))] for row, r in zip(rows, results))
+
+
+class _JsonlWriter:
+    def __init__(self, stream):
+        self._stream = stream
+        self._names = None
+
+    def header(self, names):
+        self._names = names
+
+    def rows(self, rows, results):
+        for row, r in zip(rows, results):
+            record = dict(zip(self._names, row))
+            record["result"] = float(r)
+            self._stream.write(json.dumps(record) + "\n")
+
+
+def run_catalog(args, stdout):
+    import pandas as pd
+
+    from productivity import eoq
+
+    if args.file.lower().endswith((".parquet", ".pq")):
+        items = pd.read_parquet(args.file)
+    else:
+        items = pd.read_csv(args.file)
+    missing = [c for c in ("demand", "ordering_cost", "holding_cost") if c not in items]
+    if args.budget is not None and args.cost_column not in items:
+        missing.append(args.cost_column)
+    if missing:
+        raise ValueError(f"missing columns {missing}")
+
+    solution = eoq.solve_multi_item(
+        items["demand"], items["ordering_cost"], items["holding_cost"],
+        unit_space=items[args.space_column] if args.space_column in items else None,
+        capacity=args.capacity,
+        unit_cost=items[args.cost_column] if args.cost_column in items else None,
+        budget=args.budget,
+    )
+    items.assign(quantity=solution.quantity, cycles=solution.cycles).to_csv(stdout, index=False)
+    sys.stderr.write(
+        f"total cost {solution.total_cost:.2f}, space used {solution.space_used:.2f}, "
+        f"budget used {solution.budget_used:.2f}\n"
+    )
+
+
+def run_history_export(args):
+    from productivity import export, history
+
+    store = history.HistoryStore(args.db or history.DEFAULT_PATH)
+    try:
+        rows = export.export_history(
+            store, args.file, batch_size=args.batch_size, session=args.session,
+            calc_type=engine.SHORT_NAMES[args.type] if args.type else None,
+        )
+    finally:
+        store.close()
+    sys.stderr.write(f"{rows} rows written to {args.file}\n")
+
+
+def run_rollup(args, stdout):
+    from productivity import rollup
+
+    levels = tuple(name.strip() for name in args.levels.split(",") if name.strip())
+    if args.level and args.level not in levels:
+        raise ValueError(f"--level must be one of {list(levels)}")
+    result = rollup.Rollup.from_file(args.file, levels)
+    if args.level:
+        result.level(args.level).reset_index().to_csv(stdout, index=False)
+    else:
+        result.all_levels().to_csv(stdout, index=False)
+
+
+def run_eoq_grid(args, stdout):
+    spec = eoqgrid.GridSpec(args.demand, args.ordering_cost, args.holding_cost, args.points)
+    grid = eoqgrid.EOQGrid.open(spec, args.dir)
+    stdout.write(f"{grid.table.filename}\n")
+    sys.stderr.write(f"{spec.points}^3 grid, {grid.nbytes / 1e6:.1f} MB\n")
+
+
+def run(args, stdout):
+    if args.calculator == "eoq-grid":
+        return run_eoq_grid(args, stdout)
+    if args.calculator == "rollup":
+        return run_rollup(args, stdout)
+    if args.calculator == "eoq-catalog":
+        return run_catalog(args, stdout)
+    if args.calculator == "history-export":
+        return run_history_export(args)
+    calc_type = engine.SHORT_NAMES[args.calculator]
+    func, inputs = engine.CALCULATORS[calc_type]
+    given = {name: getattr(args, name) for name in inputs if getattr(args, name) is not None}
+
+    if given and not args.files:
+        missing = [_option(name) for name in inputs if name not in given]
+        if missing:
+            raise ValueError(f"missing {', '.join(missing)}")
+        result = float(func(*(given[name] for name in inputs)))
+        if args.format == "jsonl":
+            stdout.write(json.dumps({**given, "result": result}) + "\n")
+        else:
+            stdout.write(f"{result!r}\n")
+        return
+
+    columns = _parse_mapping(args.map, inputs)
+    writer = (_JsonlWriter if args.format == "jsonl" else _CsvWriter)(stdout)
+    for path in args.files or ["-"]:
+        try:
+            if path == "-":
+                _score_csv_stream(sys.stdin, calc_type, columns, args.chunk_size, writer)
+            elif path.lower().endswith((".parquet", ".pq")):
+                _score_parquet(path, calc_type, columns, args.chunk_size, writer)
+            else:
+                with open(path, newline="") as stream:
+                    _score_csv_stream(stream, calc_type, columns, args.chunk_size, writer)
+        except ValueError as exc:
+            raise ValueError(f"{'stdin' if path == '-' else path}: {exc}") from None
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    try:
+        if args.out_file:
+            with open(args.out_file, "w", newline="") as stdout:
+                run(args, stdout)
+        else:
+            run(args, sys.stdout)
+    except BrokenPipeError:
+        pass
+    except (OSError, ValueError) as exc:
+        parser.exit(1, f"productivity: error: {exc}\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
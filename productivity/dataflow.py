@@ -0,0 +1,149 @@
+"""Incremental recomputation of calculator results and charts.
+
+A :class:`Graph` declares named inputs and the nodes computed from them,
+together with the inputs each node actually reads. A :class:`Dataflow`
+holds one session's values on top of a graph: setting an input only bumps
+its version when the value changes, and asking for a node recomputes it
+(and anything it depends on) only if one of its dependencies changed
+since it was last computed. A recomputed node whose value comes out the
+same keeps its version, so nodes further down are not rebuilt either.
+
+For the manual calculators, :func:`calculator_graph` splits Multifactor
+and Total Factor Productivity into a ``total_input`` node and the ratio,
+and gives each chart the inputs it draws: editing one Multifactor factor
+updates the total, the result and the factor bar chart, while editing the
+output leaves the bar chart alone.
+"""
+from functools import lru_cache
+
+from productivity import cache, engine
+
+# Inputs (and "result") each chart builder in charts.py draws; the others are passed but unused
+CHART_READS = {
+    "Total Productivity": ("result",),
+    "Labour Productivity": ("output", "labour_input"),
+    "Material Productivity": ("output", "material_input"),
+    "Capital Productivity": ("output", "capital_input"),
+    "Miscellaneous Productivity": ("output", "misc_input"),
+    "Multifactor Productivity": ("human", "material", "capital", "energy", "misc"),
+    "Total Factor Productivity": ("worker_input", "machine_input"),
+}
+
+# Calculators that are ``output / (sum of factors)``: (output input, factor inputs)
+FACTOR_TOTALS = {
+    "Multifactor Productivity": ("output", ("human", "material", "capital", "energy", "misc")),
+    "Total Factor Productivity": ("net_output", ("worker_input", "machine_input")),
+}
+
+
+class Node:
+    __slots__ = ("name", "func", "args", "reads")
+
+    def __init__(self, name, func, args, reads):
+        self.name = name
+        self.func = func
+        self.args = args
+        self.reads = reads
+
+
+class Graph:
+    """Inputs and the nodes derived from them; shared by every session, never mutated once built."""
+
+    def __init__(self, inputs=()):
+        self.inputs = tuple(inputs)
+        self.nodes = {}
+
+    def define(self, name, func, args, reads=None):
+        """Add node ``name = func(*args)``.
+
+        ``reads`` narrows the dependencies to the arguments ``func`` really
+        uses; changes to the other arguments do not trigger a recompute.
+        """
+        if name in self.nodes or name in self.inputs:
+            raise ValueError(f"{name!r} is already defined")
+        unknown = [arg for arg in args if arg not in self.nodes and arg not in self.inputs]
+        if unknown:
+            raise ValueError(f"{name!r} depends on undefined {unknown}")
+        reads = tuple(args if reads is None else reads)
+        if not set(reads) <= set(args):
+            raise ValueError(f"{name!r} reads {sorted(set(reads) - set(args))}, which are not among its arguments")
+        self.nodes[name] = Node(name, func, tuple(args), reads)
+        return self
+
+
+def _same(old, new):
+    if old is new:
+        return True
+    return type(old) is type(new) and isinstance(new, (int, float, str, tuple)) and old == new
+
+
+class Dataflow:
+    """One session's values for a :class:`Graph`, recomputed lazily and only where inputs changed."""
+
+    def __init__(self, graph):
+        self.graph = graph
+        self.values = {}
+        self.versions = {}
+        self.computations = dict.fromkeys(graph.nodes, 0)
+        self.recomputed = []
+        self._seen = {}
+
+    def set(self, name, value):
+        if name not in self.graph.inputs:
+            raise KeyError(f"{name!r} is not an input")
+        if name not in self.values or not _same(self.values[name], value):
+            self.values[name] = value
+            self.versions[name] = self.versions.get(name, 0) + 1
+
+    def update(self, **values):
+        """Set several inputs at once and start a new round of ``recomputed`` bookkeeping."""
+        self.recomputed = []
+        for name, value in values.items():
+            self.set(name, value)
+
+    def get(self, name):
+        if name in self.graph.nodes:
+            self._refresh(name)
+        elif name not in self.values:
+            raise KeyError(f"input {name!r} has not been set")
+        return self.values[name]
+
+    def _refresh(self, name):
+        node = self.graph.nodes[name]
+        for arg in node.args:
+            if arg in self.graph.nodes:
+                self._refresh(arg)
+            elif arg not in self.values:
+                raise KeyError(f"input {arg!r} has not been set")
+        seen = tuple(self.versions[dep] for dep in node.reads)
+        if self._seen.get(name) == seen:
+            return
+        value = node.func(*(self.values[arg] for arg in node.args))
+        self._seen[name] = seen
+        self.computations[name] += 1
+        self.recomputed.append(name)
+        if name not in self.values or not _same(self.values[name], value):
+            self.values[name] = value
+            self.versions[name] = self.versions.get(name, 0) + 1
+
+
+def _total(*factors):
+    return float(sum(factors))
+
+
+@lru_cache(maxsize=None)
+def calculator_graph(calc_type):
+    """Graph with a ``result`` and a ``chart`` node (plus ``total_input`` where the calculator has one)."""
+    _, inputs = engine.CALCULATORS[calc_type]
+    graph = Graph(inputs)
+    if calc_type in FACTOR_TOTALS:
+        output, factors = FACTOR_TOTALS[calc_type]
+        graph.define("total_input", _total, factors)
+        graph.define("result", lambda output, total: float(engine.safe_ratio(output, total)), (output, "total_input"))
+    else:
+        graph.define("result", lambda *values: cache.cached_result(calc_type, values), inputs)
+    graph.define(
+        "chart", lambda *values: cache.cached_figure(calc_type, values[:-1], values[-1]),
+        (*inputs, "result"), reads=CHART_READS.get(calc_type),
+    )
+    return graph
@@ -0,0 +1,319 @@
+"""Multi-worker deployment: several app processes behind a local load balancer.
+
+A single Streamlit process runs every session's script in one interpreter,
+so one busy session holds the GIL for everyone. ``python -m
+productivity.deploy`` starts ``--workers`` app processes instead (default:
+one per CPU), each on its own port on 127.0.0.1, and a :class:`Balancer`
+in front of them on ``--port`` (8501, the usual app address)::
+
+    python -m productivity.deploy --workers 4
+    PRODUCTIVITY_WORKERS=4 ./run_app.sh
+
+A Streamlit session lives in the worker that holds its websocket, and so do
+the files it serves (downloads, uploads). The balancer therefore sends a
+browser's first connection to the worker with the fewest open connections
+and pins the browser there with a cookie; after the request head, bytes
+are relayed untouched, websockets included. Workers are health-checked on
+``/_stcore/health``: one that stops answering gets no new connections, and
+one that exits is restarted (its sessions reconnect elsewhere and start
+over). ``GET /_balancer/stats`` reports the workers as JSON.
+
+Workers share the calculation history (one SQLite file; each worker buffers
+its writes for up to two seconds) and a :mod:`productivity.sharedcache` of
+figures and simulations in ``PRODUCTIVITY_SHARED_CACHE`` (default: a file
+in a private directory made for this deployment and removed when it stops,
+so no figure outlives the code that drew it; a given file is emptied at
+start). Session state, the per-process caches, alert monitors and live
+feeds are per worker.
+"""
+import argparse
+import asyncio
+import json
+import os
+import re
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+from http import HTTPStatus
+
+from productivity import sharedcache
+
+DEFAULT_PORT = 8501
+APP = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "streamlit_app.py")
+COOKIE = "productivity_worker"
+HEAD_LIMIT = 64 * 1024
+HEAD_TIMEOUT = 30.0
+HEALTH_INTERVAL = 2.0
+HEALTH_TIMEOUT = 2.0
+STOP_TIMEOUT = 10.0
+BUFFER = 64 * 1024
+
+_PINNED = re.compile(rb"^cookie:[^\r\n]*\b" + COOKIE.encode() + rb"=(\d+)", re.IGNORECASE | re.MULTILINE)
+
+
+def default_cache_path():
+    """A cache file in a new directory only the current user can enter (the cache holds pickles)."""
+    return os.path.join(tempfile.mkdtemp(prefix="productivity-deploy-"), "shared-cache.db")
+
+
+class Worker:
+    """One app process, and the balancer's counters for it."""
+
+    def __init__(self, index, port, command, env):
+        self.index = index
+        self.port = port
+        self.command = command
+        self.env = env
+        self.process = None
+        self.healthy = False
+        self.active = 0
+        self.connections = 0
+        self.restarts = 0
+
+    def start(self):
+        self.healthy = False
+        self.process = subprocess.Popen(self.command, env=self.env, stdin=subprocess.DEVNULL)
+        return self
+
+    @property
+    def exited(self):
+        return self.process is not None and self.process.poll() is not None
+
+    def stop(self):
+        if self.process is None or self.process.poll() is not None:
+            return
+        self.process.terminate()
+        try:
+            self.process.wait(STOP_TIMEOUT)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            self.process.wait()
+
+    def stats(self):
+        return {
+            "index": self.index, "port": self.port, "pid": self.process.pid if self.process else None,
+            "healthy": self.healthy, "active": self.active, "connections": self.connections,
+            "restarts": self.restarts,
+        }
+
+
+def worker_command(port, app=APP, streamlit_args=()):
+    return [
+        sys.executable, "-m", "streamlit", "run", app,
+        "--server.address", "127.0.0.1", "--server.port", str(port), "--server.headless", "true",
+        "--server.fileWatcherType", "none", "--browser.gatherUsageStats", "false",
+        *streamlit_args,
+    ]
+
+
+def make_workers(count, first_port, shared_cache, app=APP, streamlit_args=()):
+    workers = []
+    for index in range(count):
+        env = dict(os.environ, PRODUCTIVITY_WORKER=str(index), PRODUCTIVITY_SHARED_CACHE=shared_cache)
+        port = first_port + index
+        workers.append(Worker(index, port, worker_command(port, app, streamlit_args), env))
+    return workers
+
+
+async def _relay(reader, writer, cookie=None):
+    """Copy ``reader`` to ``writer`` until EOF; ``cookie`` is a header line added to the first response."""
+    try:
+        if cookie:
+            status = await reader.readline()
+            writer.write(status + cookie if status.startswith(b"HTTP/") else status)
+        while data := await reader.read(BUFFER):
+            writer.write(data)
+            await writer.drain()
+        if writer.can_write_eof():
+            writer.write_eof()
+    except OSError:
+        writer.close()  # ends the other direction too
+
+
+def _response(status, body, content_type="text/plain"):
+    head = (
+        f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+        f"Content-Type: {content_type}\r\n"
+        f"Content-Length: {len(body)}\r\n"
+        f"Connection: close\r\n\r\n"
+    )
+    return head.encode("latin-1") + body
+
+
+class Balancer:
+    """Relays connections to workers: least connections for a new browser, a cookie to keep it there."""
+
+    def __init__(self, workers, host="127.0.0.1"):
+        self.workers = workers
+        self.host = host
+        self.rejected = 0
+
+    def choose(self, head):
+        """``(worker, pinned)`` for a request head; ``(None, False)`` when no worker is healthy."""
+        match = _PINNED.search(head)
+        if match:
+            index = int(match.group(1))
+            if index < len(self.workers) and self.workers[index].healthy:
+                return self.workers[index], True
+        ready = [worker for worker in self.workers if worker.healthy]
+        if not ready:
+            return None, False
+        return min(ready, key=lambda worker: (worker.active, worker.connections)), False
+
+    async def handle(self, reader, writer):
+        try:
+            head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), HEAD_TIMEOUT)
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, asyncio.TimeoutError, OSError):
+            writer.close()
+            return
+        if head.startswith(b"GET /_balancer/stats "):
+            writer.write(_response(HTTPStatus.OK, json.dumps(self.stats()).encode(), "application/json"))
+            writer.close()
+            return
+        worker, pinned = self.choose(head)
+        if worker is None:
+            self.rejected += 1
+            writer.write(_response(HTTPStatus.SERVICE_UNAVAILABLE, b"no app worker is ready, retry shortly\n"))
+            writer.close()
+            return
+        # Counted before connecting, so connections arriving together see each other
+        worker.active += 1
+        worker.connections += 1
+        try:
+            try:
+                upstream_reader, upstream_writer = await asyncio.open_connection(self.host, worker.port)
+            except OSError:
+                worker.healthy = False
+                writer.write(_response(HTTPStatus.BAD_GATEWAY, b"app worker unavailable, retry shortly\n"))
+                writer.close()
+                return
+            cookie = None if pinned else f"Set-Cookie: {COOKIE}={worker.index}; Path=/; HttpOnly; SameSite=Lax\r\n".encode()
+            try:
+                upstream_writer.write(head)
+                await asyncio.gather(_relay(reader, upstream_writer), _relay(upstream_reader, writer, cookie))
+            finally:
+                upstream_writer.close()
+                writer.close()
+        finally:
+            worker.active -= 1
+
+    async def check(self, worker):
+        """Mark ``worker`` healthy if its health endpoint answers 200 in time."""
+        healthy = False
+        try:
+            reader, writer = await asyncio.wait_for(asyncio.open_connection(self.host, worker.port), HEALTH_TIMEOUT)
+            try:
+                writer.write(f"GET /_stcore/health HTTP/1.1\r\nHost: {self.host}:{worker.port}\r\n"
+                             f"Connection: close\r\n\r\n".encode())
+                status = await asyncio.wait_for(reader.readline(), HEALTH_TIMEOUT)
+                healthy = status.split()[1:2] == [b"200"]
+            finally:
+                writer.close()
+        except (OSError, asyncio.TimeoutError):
+            pass
+        if healthy != worker.healthy:
+            sys.stderr.write(f"worker {worker.index} (port {worker.port}) is {'up' if healthy else 'down'}\n")
+        worker.healthy = healthy
+
+    async def supervise(self, stopping):
+        """Restart workers that exit and re-check every worker's health, until ``stopping`` is set."""
+        while not stopping.is_set():
+            for worker in self.workers:
+                if worker.exited:
+                    sys.stderr.write(f"worker {worker.index} exited with code {worker.process.returncode}; restarting\n")
+                    worker.restarts += 1
+                    worker.start()
+            await asyncio.gather(*(self.check(worker) for worker in self.workers))
+            try:
+                await asyncio.wait_for(stopping.wait(), HEALTH_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+
+    def stats(self):
+        return {"workers": [worker.stats() for worker in self.workers], "rejected": self.rejected}
+
+
+def _clear(path):
+    sharedcache.check_owner(path)
+    for suffix in ("", "-wal", "-shm"):
+        try:
+            os.remove(path + suffix)
+        except FileNotFoundError:
+            pass
+
+
+async def serve(workers, host="0.0.0.0", port=DEFAULT_PORT, ready=None):
+    """Balance ``host:port`` across ``workers`` until SIGINT/SIGTERM, then stop them.
+
+    ``ready(server, balancer)`` is called once the port is bound, before the workers start.
+    """
+    balancer = Balancer(workers)
+    server = await asyncio.start_server(balancer.handle, host, port, limit=HEAD_LIMIT, backlog=1024)
+    stopping = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, stopping.set)
+    if ready:
+        ready(server, balancer)
+    for worker in workers:
+        worker.start()
+    try:
+        async with server:
+            await balancer.supervise(stopping)
+    finally:
+        await asyncio.gather(*(asyncio.to_thread(worker.stop) for worker in workers))
+    return balancer
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m productivity.deploy", description=__doc__.split("\n\n")[0])
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="app processes to start (default: one per CPU, %(default)s here)")
+    parser.add_argument("--host", default="0.0.0.0", help="address the balancer listens on (default: %(default)s)")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--worker-port", type=int, help="port of the first worker, on 127.0.0.1 (default: --port + 1)")
+    parser.add_argument("--shared-cache", metavar="PATH",
+                        help="cross-process cache file (default: $PRODUCTIVITY_SHARED_CACHE or one in a private temp dir)")
+    parser.add_argument("--app", default=APP, help="Streamlit script (default: this repository's streamlit_app.py)")
+    parser.add_argument("streamlit_args", nargs=argparse.REMAINDER,
+                        help="after --: extra options for every `streamlit run`")
+    args = parser.parse_args(argv)
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+    shared_cache = args.shared_cache or os.environ.get("PRODUCTIVITY_SHARED_CACHE")
+    if shared_cache:
+        try:
+            sharedcache.check_owner(shared_cache)
+        except OSError as exc:
+            parser.exit(1, f"deploy: error: {exc}\n")
+        private = None
+    else:
+        shared_cache = default_cache_path()
+        private = os.path.dirname(shared_cache)
+    extra = args.streamlit_args[1:] if args.streamlit_args[:1] == ["--"] else args.streamlit_args
+    workers = make_workers(args.workers, args.worker_port or args.port + 1, shared_cache, args.app, extra)
+
+    def ready(server, balancer):
+        _clear(shared_cache)  # only now: if the port was taken, another deployment may be using the file
+        address = server.sockets[0].getsockname()
+        sys.stderr.write(
+            f"balancing http://{address[0]}:{address[1]} across {len(workers)} workers "
+            f"(ports {workers[0].port}-{workers[-1].port}); shared cache {shared_cache}\n"
+        )
+
+    try:
+        asyncio.run(serve(workers, args.host, args.port, ready))
+    except KeyboardInterrupt:
+        pass
+    except OSError as exc:
+        parser.exit(1, f"deploy: error: {exc}\n")
+    finally:
+        if private:
+            shutil.rmtree(private, ignore_errors=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,258 @@
+"""EOQ surfaces for what-if exploration, and an optional precomputed grid.
+
+Both quantities the explorer shows are power laws of the parameters
+(``EOQ = sqrt(2DS/H)``, ``min_cost = sqrt(2DSH)``), so :func:`lookup` and
+:func:`surface` evaluate them directly: a point in well under a
+microsecond, a surface over two log-spaced axes (:class:`GridSpec`) in one
+broadcast. That is what the app uses.
+
+An :class:`EOQGrid` holds the EOQ and the minimum total annual cost on a
+grid of demand x ordering cost x holding cost, each axis log-spaced over a
+configurable range (:class:`GridSpec`). The grid is built once, one demand
+plane at a time, into a ``.npy`` file and then memory-mapped, so every
+session and every worker process on the host shares the same pages.
+
+Both quantities are power laws of the parameters (``EOQ = sqrt(2DS/H)``,
+``min_cost = sqrt(2DSH)``), so the grid stores their logarithms: linear
+interpolation of a log on log-spaced axes is then exact, not an
+approximation. :meth:`EOQGrid.lookup` interpolates any point in the grid,
+and :meth:`EOQGrid.surface` gives either quantity over two parameters with
+the third held at any value, by blending two neighbouring planes. Both cost
+the same whatever the inputs; points outside the ranges fall back to the
+closed form. Being exact, the grid gives the same numbers as the closed
+form, only more slowly; it is built on request (``productivity eoq-grid``)
+for tools that want the table as a file, and the app does not use it.
+
+Grids are kept in ``PRODUCTIVITY_EOQ_GRID_DIR`` (default: a directory under
+the system temporary directory), named by their spec, and rebuilt only when
+missing. Building one deletes all but the ``MAX_GRID_FILES`` most recently
+opened, and a process keeps at most ``MAX_OPEN_GRIDS`` mapped.
+"""
+import glob
+import hashlib
+import math
+import os
+import tempfile
+import threading
+from collections import OrderedDict, namedtuple
+
+import numpy as np
+
+PARAMETERS = ("demand", "ordering_cost", "holding_cost")
+QUANTITIES = ("eoq", "min_cost")
+
+GridSpec = namedtuple("GridSpec", "demand ordering_cost holding_cost points")
+# (low, high) per parameter and the number of points on each axis
+DEFAULT_SPEC = GridSpec((10.0, 1e6), (1.0, 1e4), (0.01, 1e3), 97)
+MAX_INTERACTIVE_POINTS = 129  # points per axis of an explorer surface; more only slow the chart down
+MAX_GRID_FILES = 8
+MAX_OPEN_GRIDS = 4
+
+Surface = namedtuple("Surface", "x y x_values y_values eoq min_cost")
+
+
+def default_directory():
+    return os.environ.get("PRODUCTIVITY_EOQ_GRID_DIR") or os.path.join(tempfile.gettempdir(), "productivity-eoq-grid")
+
+
+def _check(spec):
+    for name in PARAMETERS:
+        low, high = getattr(spec, name)
+        if not 0 < low < high:
+            raise ValueError(f"{name} range must satisfy 0 < low < high, got ({low}, {high})")
+    if spec.points < 2:
+        raise ValueError("points must be at least 2")
+
+
+def _log_exact(demand, ordering_cost, holding_cost):
+    # log EOQ and log minimum cost, broadcast over the arguments
+    log_ds = np.log(2.0) + np.log(demand) + np.log(ordering_cost)
+    log_h = np.log(holding_cost)
+    return 0.5 * (log_ds - log_h), 0.5 * (log_ds + log_h)
+
+
+def lookup(demand, ordering_cost, holding_cost):
+    """``(eoq, min_cost)`` for scalar parameters; both 0 if any parameter is 0, as in :func:`productivity.engine.calculate_eoq`."""
+    if demand > 0 and ordering_cost > 0 and holding_cost > 0:
+        ds = 2.0 * demand * ordering_cost
+        return math.sqrt(ds / holding_cost), math.sqrt(ds * holding_cost)
+    return 0.0, 0.0
+
+
+def _third(x, y, fixed):
+    if x == y or {x, y} - set(PARAMETERS):
+        raise ValueError(f"x and y must be two different parameters of {PARAMETERS}")
+    (z,) = set(PARAMETERS) - {x, y}
+    if set(fixed) != {z}:
+        raise ValueError(f"give the value of {z!r} (and only that)")
+    return z, float(fixed[z])
+
+
+def surface(spec, x, y, **fixed):
+    """Both quantities over parameters ``x`` and ``y`` on ``spec``'s log-spaced axes, the third held at ``fixed``.
+
+    E.g. ``surface(DEFAULT_SPEC, "demand", "holding_cost", ordering_cost=50.0)``;
+    arrays are ``(y points, x points)``.
+    """
+    _check(spec)
+    z, value = _third(x, y, fixed)
+    x_values = np.geomspace(*getattr(spec, x), spec.points)
+    y_values = np.geomspace(*getattr(spec, y), spec.points)
+    args = {x: x_values[None, :], y: y_values[:, None], z: value}
+    ds = 2.0 * args["demand"] * args["ordering_cost"]
+    return Surface(x, y, x_values, y_values, np.sqrt(ds / args["holding_cost"]), np.sqrt(ds * args["holding_cost"]))
+
+
+def build(spec, path):
+    """Write the grid for ``spec`` to ``path`` (atomically; concurrent builders are harmless)."""
+    _check(spec)
+    n = spec.points
+    axes = [np.geomspace(*getattr(spec, name), n) for name in PARAMETERS]
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    table = np.lib.format.open_memmap(tmp, mode="w+", dtype=np.float64, shape=(2, n, n, n))
+    try:
+        for i, demand in enumerate(axes[0]):
+            table[0, i], table[1, i] = _log_exact(demand, axes[1][:, None], axes[2][None, :])
+        table.flush()
+    finally:
+        del table
+    os.replace(tmp, path)
+
+
+def prune(directory, keep=MAX_GRID_FILES):
+    """Delete all but the ``keep`` most recently opened grid files in ``directory``.
+
+    Processes that still map a deleted file keep reading it; the space is
+    freed once they let go.
+    """
+    paths = glob.glob(os.path.join(directory, "eoq-grid-*.npy"))
+    used = {}
+    for path in paths:
+        try:
+            used[path] = os.path.getmtime(path)
+        except OSError:
+            pass
+    for path in sorted(used, key=used.get, reverse=True)[keep:]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+class EOQGrid:
+    """EOQ and minimum-cost surfaces over a :class:`GridSpec`, interpolated in log space."""
+
+    def __init__(self, spec, table):
+        _check(spec)
+        if table.shape != (2,) + (spec.points,) * 3:
+            raise ValueError(f"grid table has shape {table.shape}, expected {(2,) + (spec.points,) * 3}")
+        self.spec = spec
+        self.table = table
+        self.axes = {name: np.geomspace(*getattr(spec, name), spec.points) for name in PARAMETERS}
+        self._log_low = {name: np.log(getattr(spec, name)[0]) for name in PARAMETERS}
+        self._log_step = {
+            name: (np.log(getattr(spec, name)[1]) - self._log_low[name]) / (spec.points - 1) for name in PARAMETERS
+        }
+
+    @classmethod
+    def open(cls, spec=DEFAULT_SPEC, directory=None):
+        """Memory-map the grid for ``spec``, building it first if it is not on disk yet."""
+        spec = GridSpec(*(tuple(map(float, getattr(spec, name))) for name in PARAMETERS), int(spec.points))
+        directory = directory or default_directory()
+        os.makedirs(directory, exist_ok=True)
+        key = hashlib.sha1(repr(tuple(spec)).encode()).hexdigest()[:16]
+        path = os.path.join(directory, f"eoq-grid-{key}.npy")
+        if os.path.exists(path):
+            os.utime(path)  # the modification time tracks use, for prune()
+        else:
+            build(spec, path)
+            prune(directory)
+        return cls(spec, np.load(path, mmap_mode="r"))
+
+    @property
+    def nbytes(self):
+        return self.table.nbytes
+
+    def contains(self, **values):
+        """Whether every given parameter lies inside its range."""
+        return all(
+            np.all((np.asarray(value) >= getattr(self.spec, name)[0]) & (np.asarray(value) <= getattr(self.spec, name)[1]))
+            for name, value in values.items()
+        )
+
+    def _locate(self, name, values):
+        """Lower grid index and weight of the upper neighbour for each of ``values`` (inside the range)."""
+        low, high = getattr(self.spec, name)
+        position = (np.log(np.clip(values, low, high)) - self._log_low[name]) / self._log_step[name]
+        index = np.clip(np.floor(position).astype(np.int64), 0, self.spec.points - 2)
+        return index, position - index
+
+    def lookup(self, demand, ordering_cost, holding_cost):
+        """``(eoq, min_cost)`` by trilinear interpolation: floats for scalar arguments, else arrays broadcast like them.
+
+        Zero or out-of-range parameters get the closed form instead (EOQ 0 if
+        any parameter is 0, as in :func:`productivity.engine.calculate_eoq`).
+        """
+        values = np.broadcast_arrays(*(np.asarray(v, dtype=np.float64) for v in (demand, ordering_cost, holding_cost)))
+        inside = np.ones(values[0].shape, dtype=bool)
+        for name, value in zip(PARAMETERS, values):
+            low, high = getattr(self.spec, name)
+            inside &= (value >= low) & (value <= high)
+        located = [self._locate(name, value) for name, value in zip(PARAMETERS, values)]
+        logs = np.zeros((2,) + values[0].shape)
+        (i, u), (j, v), (k, w) = located
+        for di, wi in ((0, 1 - u), (1, u)):
+            for dj, wj in ((0, 1 - v), (1, v)):
+                for dk, wk in ((0, 1 - w), (1, w)):
+                    logs += wi * wj * wk * self.table[:, i + di, j + dj, k + dk]
+        eoq, min_cost = np.exp(logs)
+        if not inside.all():
+            with np.errstate(divide="ignore", invalid="ignore"):
+                exact = np.exp(_log_exact(*values))
+            active = (values[0] > 0) & (values[1] > 0) & (values[2] > 0)
+            eoq = np.where(inside, eoq, np.where(active, exact[0], 0.0))
+            min_cost = np.where(inside, min_cost, np.where(active, exact[1], 0.0))
+        if eoq.ndim == 0:
+            return float(eoq), float(min_cost)
+        return eoq, min_cost
+
+    def surface(self, x, y, **fixed):
+        """Both quantities over parameters ``x`` and ``y`` at the grid's points, the third held at ``fixed``.
+
+        E.g. ``surface("demand", "holding_cost", ordering_cost=50.0)``. The
+        slice blends the two grid planes around the fixed value, so it costs
+        ``points ** 2`` whatever the value; outside the range it is computed
+        from the closed form on the same axes.
+        """
+        z, value = _third(x, y, fixed)
+        if not self.contains(**{z: value}):
+            return surface(self.spec, x, y, **fixed)
+        axis = PARAMETERS.index(z)
+        k, w = self._locate(z, value)
+        planes = np.take(self.table, [int(k), int(k) + 1], axis=axis + 1)
+        logs = (1 - w) * np.take(planes, 0, axis=axis + 1) + w * np.take(planes, 1, axis=axis + 1)
+        # logs is (2, first remaining parameter, second); plot arrays are (y, x)
+        remaining = [name for name in PARAMETERS if name != z]
+        if remaining.index(x) == 0:
+            logs = logs.transpose(0, 2, 1)
+        eoq, min_cost = np.exp(logs)
+        return Surface(x, y, self.axes[x], self.axes[y], eoq, min_cost)
+
+
+_grids = OrderedDict()
+_grids_lock = threading.Lock()
+
+
+def get_grid(spec=DEFAULT_SPEC):
+    """Process-wide grid for ``spec``, shared across sessions (and, via the file, across processes).
+
+    Only the ``MAX_OPEN_GRIDS`` most recently used stay here; an evicted grid
+    is unmapped once no session still holds it.
+    """
+    with _grids_lock:
+        if spec not in _grids:
+            _grids[spec] = EOQGrid.open(spec)
+            while len(_grids) > MAX_OPEN_GRIDS:
+                _grids.popitem(last=False)
+        _grids.move_to_end(spec)
+        return _grids[spec]
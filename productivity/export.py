@@ -0,0 +1,185 @@
+"""Streaming columnar export of results and history.
+
+Everything is written batch by batch as Arrow record batches, so a large
+export never exists in memory as a whole, let alone as Python dicts:
+
+* ``.parquet`` - one row group per batch (zstd), for the BI stack;
+* ``.arrow`` / ``.feather`` - an uncompressed Arrow IPC file, which readers
+  can memory-map and use without copying or decoding
+  (``pyarrow.ipc.open_file(pyarrow.memory_map(path))``);
+* ``.csv.gz`` - gzip-compressed CSV.
+
+NumPy columns become Arrow arrays without a copy; calculator types are
+dictionary-encoded.
+"""
+import gzip
+import os
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pq
+
+FORMATS = ("parquet", "arrow", "csv.gz")
+DEFAULT_BATCH_SIZE = 65_536
+CSV_GZIP_LEVEL = 6
+
+HISTORY_SCHEMA = pa.schema([
+    ("id", pa.int64()),
+    ("ts", pa.timestamp("us", tz="UTC")),
+    ("calc_type", pa.dictionary(pa.int32(), pa.string())),
+    ("result", pa.float64()),
+    ("session", pa.string()),
+])
+
+
+def format_for(path):
+    """Export format implied by a file name."""
+    name = os.fspath(path).lower()
+    if name.endswith((".parquet", ".pq")):
+        return "parquet"
+    if name.endswith((".arrow", ".feather", ".ipc")):
+        return "arrow"
+    if name.endswith((".csv.gz", ".gz")):
+        return "csv.gz"
+    raise ValueError(f"cannot tell the export format of {path!r}; use one of {', '.join(FORMATS)}")
+
+
+class BatchWriter:
+    """Write record batches to ``sink`` (a path or a writable Arrow stream) in ``fmt``.
+
+    The schema is taken from the first batch unless given. Use as a context
+    manager; nothing is created until the first batch arrives.
+    """
+
+    def __init__(self, sink, fmt=None, schema=None):
+        self.sink = sink
+        self.format = fmt or format_for(sink)
+        if self.format not in FORMATS:
+            raise ValueError(f"unknown export format {self.format!r}; use one of {', '.join(FORMATS)}")
+        self.schema = schema
+        self.rows = 0
+        self._writer = None
+        self._stream = None
+
+    def _open(self, schema):
+        if self.format == "parquet":
+            return pq.ParquetWriter(self.sink, schema, compression="zstd")
+        if self.format == "arrow":
+            return pa.ipc.new_file(self.sink, schema, options=pa.ipc.IpcWriteOptions(emit_dictionary_deltas=True))
+        # Python's gzip rather than Arrow's: Arrow always compresses at level 9, which is ~4x slower
+        if isinstance(self.sink, (str, os.PathLike)):
+            self._stream = gzip.GzipFile(self.sink, "wb", compresslevel=CSV_GZIP_LEVEL)
+        else:
+            self._stream = gzip.GzipFile(fileobj=self.sink, mode="wb", compresslevel=CSV_GZIP_LEVEL)
+        return pa_csv.CSVWriter(pa.PythonFile(self._stream, mode="w"), schema)
+
+    def write(self, batch):
+        if self._writer is None:
+            self.schema = self.schema or batch.schema
+            self._writer = self._open(self.schema)
+        if not batch.schema.equals(self.schema):
+            # Chunks of one file can infer different types (a blank cell turns
+            # an integer column into floats); every batch takes the first one's
+            batch = batch.cast(self.schema)
+        if self.format == "csv.gz" and any(pa.types.is_dictionary(f.type) for f in batch.schema):
+            batch = _decode_dictionaries(batch)
+        self._writer.write_batch(batch)
+        self.rows += batch.num_rows
+
+    def close(self):
+        if self._writer is None and self.schema is not None:
+            self._writer = self._open(self.schema)  # still write a valid, empty file
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        if self._stream is not None:
+            self._stream.close()
+            self._stream = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class BufferWriter(BatchWriter):
+    """:class:`BatchWriter` into memory (for downloads); :meth:`getvalue` once closed."""
+
+    def __init__(self, fmt, schema=None):
+        super().__init__(pa.BufferOutputStream(), fmt, schema)
+
+    def getvalue(self):
+        return memoryview(self.sink.getvalue())
+
+
+def _decode_dictionaries(batch):
+    columns = [c.dictionary_decode() if pa.types.is_dictionary(c.type) else c for c in batch.columns]
+    return pa.RecordBatch.from_arrays(columns, names=batch.schema.names)
+
+
+def write(batches, sink, fmt=None, schema=None):
+    """Write an iterable of record batches; returns the number of rows written."""
+    with BatchWriter(sink, fmt, schema) as writer:
+        for batch in batches:
+            writer.write(batch)
+    return writer.rows
+
+
+def history_batches(store, batch_size=DEFAULT_BATCH_SIZE, **filters):
+    """Record batches of history rows, oldest first (filters as for ``HistoryStore.page``)."""
+    for buffer in store.iter_records(batch_size, **filters):
+        yield buffer_batch(buffer)
+
+
+def buffer_batch(buffer):
+    """Record batch (``HISTORY_SCHEMA``) over a :class:`~productivity.records.RecordBuffer`.
+
+    Ids, timestamps and results are wrapped without copying. The buffer's
+    calculator types become the dictionary as is: its category table is only
+    ever appended to, which is what Arrow IPC files need, since they cannot
+    replace a dictionary between batches.
+    """
+    sessions = pa.DictionaryArray.from_arrays(
+        pa.array(buffer.session_codes, mask=buffer.session_codes < 0), pa.array(buffer.sessions, pa.string()),
+    )
+    return pa.RecordBatch.from_arrays([
+        pa.array(buffer.ids),
+        pa.array(buffer.ts).view(HISTORY_SCHEMA.field("ts").type),
+        pa.DictionaryArray.from_arrays(pa.array(buffer.type_codes.astype(np.int32)), pa.array(buffer.calc_types, pa.string())),
+        pa.array(buffer.results),
+        sessions.dictionary_decode(),
+    ], schema=HISTORY_SCHEMA)
+
+
+def result_batch(columns, result, calc_type=None):
+    """One record batch from input columns (name -> array) and their results.
+
+    Numeric NumPy columns are wrapped without copying.
+    """
+    names = list(columns) + ["result"]
+    arrays = [pa.array(np.asarray(values)) for values in columns.values()]
+    arrays.append(pa.array(np.asarray(result, dtype=np.float64)))
+    if calc_type is not None:
+        names.insert(0, "calc_type")
+        arrays.insert(0, pa.DictionaryArray.from_arrays(pa.array(np.zeros(len(result), dtype=np.int32)), [getattr(calc_type, "value", calc_type)]))
+    return pa.RecordBatch.from_arrays(arrays, names=names)
+
+
+def frame_batch(frame, result):
+    """Record batch for a scored DataFrame chunk plus its ``result`` column."""
+    return pa.RecordBatch.from_pandas(frame.assign(result=result), preserve_index=False)
+
+
+def export_history(store, sink, fmt=None, batch_size=DEFAULT_BATCH_SIZE, **filters):
+    """Stream (filtered) history into ``sink``; returns the number of rows written."""
+    return write(history_batches(store, batch_size, **filters), sink, fmt, HISTORY_SCHEMA)
+
+
+def to_bytes(batches, fmt, schema=None):
+    """Export into memory (for downloads): an Arrow buffer, exposed as a memoryview without copying."""
+    with BufferWriter(fmt, schema) as writer:
+        for batch in batches:
+            writer.write(batch)
+    return writer.getvalue()
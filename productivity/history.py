@@ -0,0 +1,226 @@
+"""Persistent calculation history backed by SQLite.
+
+Rows are ``(id, ts, calc_type, result, session)`` with ``ts`` in integer
+microseconds since the epoch (UTC), indexed by timestamp and by calculator
+type so range and per-type queries stay fast as history grows into the
+millions. Writes are buffered and committed in batches; reads are
+paginated newest-first with keyset pagination on ``(ts, id)``, so no query
+ever has to load or skip over the whole table. Rows come back as
+:class:`~productivity.records.Record` objects, or in bulk as
+:class:`~productivity.records.RecordBuffer` columns.
+"""
+import atexit
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+
+from productivity.records import Record, RecordBuffer
+
+DEFAULT_PATH = os.environ.get("PRODUCTIVITY_HISTORY_DB", "productivity_history.db")
+DEFAULT_BATCH_SIZE = 256
+DEFAULT_FLUSH_INTERVAL = 2.0
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS calculations (
+    id INTEGER PRIMARY KEY,
+    ts INTEGER NOT NULL,
+    calc_type TEXT NOT NULL,
+    result REAL NOT NULL,
+    session TEXT
+);
+CREATE INDEX IF NOT EXISTS calculations_ts ON calculations (ts, id);
+CREATE INDEX IF NOT EXISTS calculations_type_ts ON calculations (calc_type, ts, id);
+CREATE INDEX IF NOT EXISTS calculations_session ON calculations (session, ts, id);
+"""
+
+
+def to_micros(timestamp):
+    """Convert a ``datetime`` (naive = local time) or epoch seconds to epoch microseconds."""
+    if timestamp is None:
+        return time.time_ns() // 1000
+    if isinstance(timestamp, datetime):
+        return int(timestamp.timestamp() * 1_000_000)
+    return int(timestamp * 1_000_000)
+
+
+def from_micros(micros):
+    return datetime.fromtimestamp(micros / 1_000_000, tz=timezone.utc).astimezone()
+
+
+def _row(row):
+    return Record(*row)
+
+
+class HistoryStore:
+    """Append-mostly calculation history shared by every session in the process."""
+
+    def __init__(self, path=DEFAULT_PATH, batch_size=DEFAULT_BATCH_SIZE,
+                 flush_interval=DEFAULT_FLUSH_INTERVAL):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._lock = threading.RLock()
+        self._pending = RecordBuffer(batch_size)
+        self._last_flush = time.monotonic()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        if path != ":memory:":
+            self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+
+    # Writes
+    def append(self, calc_type, result, timestamp=None, session=None):
+        """Queue one calculation; it is committed with the next batch."""
+        with self._lock:
+            self._pending.append(to_micros(timestamp), calc_type, float(result), session)
+            if (len(self._pending) >= self.batch_size
+                    or time.monotonic() - self._last_flush >= self.flush_interval):
+                self.flush()
+
+    def extend(self, rows):
+        """Write many rows in one transaction: a :class:`RecordBuffer` or ``(timestamp, calc_type, result, session)`` tuples."""
+        if isinstance(rows, RecordBuffer):
+            rows = rows.rows()
+        else:
+            rows = ((to_micros(ts), getattr(t, "value", t), float(r), s) for ts, t, r, s in rows)
+        with self._lock:
+            self.flush()
+            with self._conn:
+                self._conn.executemany(
+                    "INSERT INTO calculations (ts, calc_type, result, session) VALUES (?, ?, ?, ?)", rows,
+                )
+
+    def flush(self):
+        with self._lock:
+            if len(self._pending):
+                with self._conn:
+                    self._conn.executemany(
+                        "INSERT INTO calculations (ts, calc_type, result, session) VALUES (?, ?, ?, ?)",
+                        self._pending.rows(),
+                    )
+                self._pending.clear()
+            self._last_flush = time.monotonic()
+
+    def close(self):
+        with self._lock:
+            self.flush()
+            self._conn.close()
+
+    # Reads
+    def _where(self, calc_type=None, start=None, end=None, session=None, before=None, after=None):
+        clauses, params = [], []
+        if calc_type is not None:
+            clauses.append("calc_type = ?")
+            params.append(getattr(calc_type, "value", calc_type))
+        if start is not None:
+            clauses.append("ts >= ?")
+            params.append(to_micros(start))
+        if end is not None:
+            clauses.append("ts < ?")
+            params.append(to_micros(end))
+        if session is not None:
+            clauses.append("session = ?")
+            params.append(session)
+        if before is not None:
+            clauses.append("(ts, id) < (?, ?)")
+            params.extend(before)
+        if after is not None:
+            clauses.append("(ts, id) > (?, ?)")
+            params.extend(after)
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    def page(self, limit=100, before=None, calc_type=None, start=None, end=None, session=None):
+        """Newest-first page of at most ``limit`` rows matching the filters.
+
+        Pass the last record's ``(record.ts, record.id)`` as ``before`` to fetch
+        the next page. ``start`` is inclusive and ``end`` exclusive.
+        """
+        with self._lock:
+            self.flush()
+            where, params = self._where(calc_type, start, end, session, before)
+            rows = self._conn.execute(
+                f"SELECT id, ts, calc_type, result, session FROM calculations{where} "
+                "ORDER BY ts DESC, id DESC LIMIT ?",
+                (*params, limit),
+            ).fetchall()
+        return [_row(row) for row in rows]
+
+    def recent(self, limit=5, session=None, calc_type=None):
+        """Latest ``limit`` records, oldest first, including writes not yet flushed."""
+        with self._lock:
+            pending = [self._pending[i] for i in
+                       self._pending.mask(calc_type, session).nonzero()[0][-limit:].tolist()] if limit else []
+            where, params = self._where(calc_type, session=session)
+            stored = self._conn.execute(
+                f"SELECT id, ts, calc_type, result, session FROM calculations{where} "
+                "ORDER BY ts DESC, id DESC LIMIT ?",
+                (*params, limit - len(pending)),
+            ).fetchall() if len(pending) < limit else []
+        return [_row(row) for row in reversed(stored)] + pending
+
+    def iter_columns(self, batch_size=65_536, calc_type=None, start=None, end=None, session=None):
+        """Oldest-first ``(ids, ts, calc_types, results, sessions)`` column tuples, ``batch_size`` rows each.
+
+        For exports: rows go straight from the cursor into columns, and the
+        store is only locked while each batch is fetched.
+        """
+        after = None
+        while True:
+            with self._lock:
+                self.flush()
+                where, params = self._where(calc_type, start, end, session, after=after)
+                rows = self._conn.execute(
+                    f"SELECT id, ts, calc_type, result, session FROM calculations{where} "
+                    "ORDER BY ts, id LIMIT ?",
+                    (*params, batch_size),
+                ).fetchall()
+            if not rows:
+                return
+            columns = tuple(zip(*rows))
+            yield columns
+            if len(rows) < batch_size:
+                return
+            after = (columns[1][-1], columns[0][-1])
+
+    def iter_records(self, batch_size=65_536, calc_type=None, start=None, end=None, session=None):
+        """Oldest-first :class:`RecordBuffer` batches; they share category tables, so codes agree across batches."""
+        buffer = RecordBuffer(1)
+        for columns in self.iter_columns(batch_size, calc_type, start, end, session):
+            buffer = buffer.sibling(len(columns[0]))
+            buffer.extend(*columns)
+            yield buffer
+
+    def rows_after(self, after_id=0, limit=50_000):
+        """Raw ``(id, ts, calc_type, result)`` tuples with ``id > after_id``, in insertion order.
+
+        Lets consumers that keep their own aggregates catch up on new rows
+        without rescanning what they have already seen.
+        """
+        with self._lock:
+            self.flush()
+            return self._conn.execute(
+                "SELECT id, ts, calc_type, result FROM calculations WHERE id > ? ORDER BY id LIMIT ?",
+                (after_id, limit),
+            ).fetchall()
+
+    def count(self, calc_type=None, start=None, end=None, session=None):
+        with self._lock:
+            self.flush()
+            where, params = self._where(calc_type, start, end, session)
+            return self._conn.execute(f"SELECT COUNT(*) FROM calculations{where}", params).fetchone()[0]
+
+
+_default = None
+_default_lock = threading.Lock()
+
+
+def get_store(path=None):
+    """Process-wide store, created on first use and flushed at exit."""
+    global _default
+    with _default_lock:
+        if _default is None:
+            _default = HistoryStore(path or DEFAULT_PATH)
+            atexit.register(_default.close)
+        return _default
@@ -0,0 +1,152 @@
+"""Chunked CSV/Parquet ingestion for bulk productivity scoring.
+
+Files are read and scored in fixed-size chunks, so memory stays flat no
+matter how large the shift log is. Only the columns mapped to calculator
+inputs are read from disk.
+"""
+import os
+import time
+
+import pandas as pd
+
+from productivity import engine
+
+DEFAULT_CHUNK_SIZE = 100_000
+
+
+def _name(source):
+    return source if isinstance(source, (str, os.PathLike)) else getattr(source, "name", "")
+
+
+def is_parquet(source):
+    return str(_name(source)).lower().endswith((".parquet", ".pq"))
+
+
+def _rewind(source):
+    if hasattr(source, "seek"):
+        source.seek(0)
+
+
+def read_columns(source):
+    """Return the column names of a CSV or Parquet file without loading its rows."""
+    if is_parquet(source):
+        import pyarrow.parquet as pq
+
+        names = pq.ParquetFile(source).schema_arrow.names
+    else:
+        names = list(pd.read_csv(source, nrows=0).columns)
+    _rewind(source)
+    return names
+
+
+def iter_chunks(source, chunk_size=DEFAULT_CHUNK_SIZE, columns=None):
+    """Yield DataFrames of at most ``chunk_size`` rows from a CSV or Parquet file.
+
+    ``source`` may be a path or a file-like object (such as a Streamlit upload).
+    """
+    if is_parquet(source):
+        import pyarrow.parquet as pq
+
+        parquet = pq.ParquetFile(source)
+        for batch in parquet.iter_batches(batch_size=chunk_size, columns=columns):
+            yield batch.to_pandas()
+    else:
+        with pd.read_csv(source, chunksize=chunk_size, usecols=columns) as reader:
+            yield from reader
+
+
+def score_file(source, calc_type, columns=None, chunk_size=DEFAULT_CHUNK_SIZE, extra=None):
+    """Score ``calc_type`` over a file chunk by chunk.
+
+    ``columns`` maps calculator input names to file column names; ``extra``
+    names further columns to read along with them (e.g. an entity). Yields
+    ``(chunk, result, progress)`` for each chunk, where ``progress`` holds
+    running totals: rows scored, elapsed seconds, rows/sec and the
+    approximate fraction of the file consumed (``None`` if unknown).
+    """
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, "rb") as handle:
+            yield from score_file(handle, calc_type, columns, chunk_size, extra)
+        return
+
+    columns = columns or {}
+    _, inputs = engine.CALCULATORS[calc_type]
+    usecols = list(dict.fromkeys([*(columns.get(name, name) for name in inputs), *(extra or ())]))
+    total_rows = _parquet_rows(source)
+    total_bytes = _size(source)
+
+    rows = 0
+    started = time.perf_counter()
+    for chunk in iter_chunks(source, chunk_size, usecols):
+        result = engine.compute(calc_type, chunk, columns)
+        rows += len(chunk)
+        elapsed = time.perf_counter() - started
+        yield chunk, result, {
+            "rows": rows,
+            "elapsed": elapsed,
+            "rows_per_sec": rows / elapsed if elapsed > 0 else 0.0,
+            "fraction": min(rows / total_rows, 1.0) if total_rows else _fraction(source, total_bytes),
+        }
+
+
+def _parquet_rows(source):
+    if not is_parquet(source):
+        return None
+    import pyarrow.parquet as pq
+
+    rows = pq.ParquetFile(source).metadata.num_rows
+    _rewind(source)
+    return rows
+
+
+def _size(source):
+    size = getattr(source, "size", None)
+    if size is None and hasattr(source, "fileno"):
+        try:
+            size = os.fstat(source.fileno()).st_size
+        except (OSError, ValueError):
+            size = None
+    return size
+
+
+def _fraction(source, total_bytes):
+    # Readers buffer ahead of the rows they hand back, so this is an estimate.
+    if not total_bytes:
+        return None
+    try:
+        return min(source.tell() / total_bytes, 1.0)
+    except (AttributeError, OSError, ValueError):
+        return None
+
+
+class RunningSummary:
+    """Constant-memory summary of a result column scored chunk by chunk."""
+
+    def __init__(self):
+        self.count = 0
+        self.zero_count = 0
+        self.total = 0.0
+        self.minimum = float("inf")
+        self.maximum = float("-inf")
+
+    def update(self, result):
+        if len(result) == 0:
+            return
+        self.count += len(result)
+        self.zero_count += int((result == 0).sum())
+        self.total += float(result.sum())
+        self.minimum = min(self.minimum, float(result.min()))
+        self.maximum = max(self.maximum, float(result.max()))
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+    def as_dict(self):
+        return {
+            "rows": self.count,
+            "mean": self.mean,
+            "min": self.minimum if self.count else 0.0,
+            "max": self.maximum if self.count else 0.0,
+            "zero_results": self.zero_count,
+        }
@@ -0,0 +1,559 @@
+"""Live machine productivity from a local counter feed.
+
+Machines (or a collector in front of them) emit one line per reading,
+either JSON or CSV::
+
+    {"machine": "press-07", "ts": 1700000000.25, "output": 12, "machine_input": 0.5}
+    press-07,1700000000.25,12,0.5
+
+``output`` and ``machine_input`` are the increments since the machine's
+previous reading; ``ts`` (epoch seconds) is optional and defaults to the
+arrival time. An event stamped more than ``MAX_CLOCK_SKEW`` seconds ahead of
+this host's clock counts as a bad line. A :class:`Feed` reads lines in a background thread from
+
+* ``tcp://host:port`` - connects to a line server (and reconnects);
+* ``udp://host:port`` - binds and receives datagrams of one or more lines;
+* a file path - follows the file like ``tail -F`` (from the start again
+  once it is truncated or replaced); a named pipe works too;
+
+and folds them, in small vectorized batches, into a :class:`LiveBoard`: per
+machine, a ring buffer of per-second sums covering the window, so memory is
+fixed by the number of machines (capped) and the window length, however
+long the feed runs. Windowed machine productivity is the ratio of the
+window's sums.
+
+``python -m productivity.live`` is the matching replay tool: it serves a
+recorded JSONL/CSV file, or synthetic machines, to any of those sources.
+"""
+import argparse
+import json
+import math
+import os
+import random
+import socket
+import sys
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+from productivity import engine
+
+DEFAULT_WINDOW = 60.0
+DEFAULT_RESOLUTION = 1.0
+DEFAULT_MAX_MACHINES = 4096
+DEFAULT_FPS = 2.0
+TREND_POINTS = 600
+BATCH_INTERVAL = 0.05
+BATCH_LINES = 10_000
+RETRY_MAX = 30.0  # longest wait before reopening a source that failed
+FEED_IDLE = 300.0  # a feed no session has read for this long stops
+MAX_CLOCK_SKEW = 5.0  # seconds an event may be stamped ahead of this host's clock
+MAX_FEEDS = 16
+
+
+def parse_line(line):
+    """``(machine, ts, output, machine_input)`` from one JSON or CSV line; ``None`` for a blank line.
+
+    Raises ``ValueError`` for a malformed one. ``ts`` is ``nan`` when absent.
+    """
+    line = line.strip()
+    if not line:
+        return None
+    if line.startswith("{"):
+        try:
+            event = json.loads(line)
+            return (str(event["machine"]), float(event.get("ts", math.nan)),
+                    float(event.get("output", 0.0)), float(event.get("machine_input", 0.0)))
+        except (json.JSONDecodeError, KeyError, TypeError) as exc:
+            raise ValueError(f"bad event {line[:80]!r}: {exc}") from None
+    parts = line.split(",")
+    if len(parts) != 4:
+        raise ValueError(f"bad event {line[:80]!r}: expected machine,ts,output,machine_input")
+    return parts[0], float(parts[1] or "nan"), float(parts[2]), float(parts[3])
+
+
+class LiveBoard:
+    """Windowed per-machine sums in fixed-size ring buffers of time buckets.
+
+    Time is taken from the events themselves, so a replay at any speed gives
+    the same windows as the original run.
+    """
+
+    def __init__(self, window=DEFAULT_WINDOW, resolution=DEFAULT_RESOLUTION,
+                 max_machines=DEFAULT_MAX_MACHINES, trend_points=TREND_POINTS):
+        self.window = window
+        self.resolution = resolution
+        self.slots = max(1, math.ceil(window / resolution))
+        self.max_machines = max_machines
+        self.machines = []
+        self._index = {}
+        self._outputs = np.zeros((16, self.slots))
+        self._inputs = np.zeros((16, self.slots))
+        self._last_seen = np.zeros(16)
+        self._slot_bucket = np.full(self.slots, -1, dtype=np.int64)
+        self._counts = np.zeros(self.slots, dtype=np.int64)
+        self._newest = -1
+        self._first = None
+        self._lock = threading.Lock()
+        self.trend = deque(maxlen=trend_points)
+        self._closed = deque(maxlen=self.slots)
+        self.events = 0
+        self.dropped = 0
+        self.late = 0
+
+    def _rows(self, machines):
+        rows = np.empty(len(machines), dtype=np.int64)
+        for i, machine in enumerate(machines):
+            row = self._index.get(machine)
+            if row is None:
+                if len(self.machines) >= self.max_machines:
+                    rows[i] = -1
+                    continue
+                row = self._index[machine] = len(self.machines)
+                self.machines.append(machine)
+                if row >= len(self._outputs):
+                    grow = min(2 * len(self._outputs), self.max_machines) - len(self._outputs)
+                    self._outputs = np.vstack([self._outputs, np.zeros((grow, self.slots))])
+                    self._inputs = np.vstack([self._inputs, np.zeros((grow, self.slots))])
+                    self._last_seen = np.concatenate([self._last_seen, np.zeros(grow)])
+            rows[i] = row
+        return rows
+
+    def _advance(self, bucket):
+        # Recycle the slots of buckets that fall out of the window
+        if bucket <= self._newest:
+            return
+        if self._first is None:
+            self._first = bucket
+        if self._newest >= 0:
+            self.trend.append((self._newest * self.resolution, self._plant_ratio()))
+            slot = self._newest % self.slots
+            n = len(self.machines)
+            active = np.flatnonzero(self._inputs[:n, slot] > 0)
+            self._closed.append((self._newest * self.resolution, active,
+                                 self._outputs[active, slot], self._inputs[active, slot]))
+        first = max(self._newest + 1, bucket - self.slots + 1)
+        for b in range(first, bucket + 1):
+            slot = b % self.slots
+            self._outputs[:, slot] = 0.0
+            self._inputs[:, slot] = 0.0
+            self._counts[slot] = 0
+            self._slot_bucket[slot] = b
+        self._newest = bucket
+
+    def _plant_ratio(self):
+        return float(engine.machine_productivity(self._outputs.sum(), self._inputs.sum()))
+
+    def ingest(self, machines, ts, outputs, inputs):
+        """Fold in a batch of events (sequences of equal length); ``nan`` timestamps mean now."""
+        ts = np.asarray(ts, dtype=np.float64)
+        ts = np.where(np.isnan(ts), time.time(), ts)
+        buckets = np.floor(ts / self.resolution).astype(np.int64)
+        with self._lock:
+            self._advance(int(buckets.max()))
+            rows = self._rows(machines)
+            keep = (rows >= 0) & (buckets > self._newest - self.slots)
+            self.dropped += int((rows < 0).sum())
+            self.late += int(((rows >= 0) & ~keep).sum())
+            rows, buckets, ts = rows[keep], buckets[keep], ts[keep]
+            slots = buckets % self.slots
+            np.add.at(self._outputs, (rows, slots), np.asarray(outputs, dtype=np.float64)[keep])
+            np.add.at(self._inputs, (rows, slots), np.asarray(inputs, dtype=np.float64)[keep])
+            np.maximum.at(self._last_seen, rows, ts)
+            self._counts += np.bincount(slots, minlength=self.slots)
+            self.events += len(rows)
+
+    def _rate(self):
+        # Events per second over the full buckets still in the window (the
+        # first one seen and the current one are partial)
+        if self._first is None:
+            return 0.0
+        complete = (self._slot_bucket > self._first) & (self._slot_bucket < self._newest)
+        seconds = complete.sum() * self.resolution
+        return float(self._counts[complete].sum() / seconds) if seconds else 0.0
+
+    def pop_closed(self):
+        """``(ts, machines, productivity)`` for each one-bucket period completed since the last call."""
+        with self._lock:
+            closed, self._closed = list(self._closed), deque(maxlen=self.slots)
+            return [(ts, [self.machines[row] for row in rows], engine.machine_productivity(output, machine_input))
+                    for ts, rows, output, machine_input in closed]
+
+    def snapshot(self):
+        """Windowed sums and productivity per machine, plus the plant-wide trend."""
+        with self._lock:
+            n = len(self.machines)
+            output = self._outputs[:n].sum(axis=1)
+            machine_input = self._inputs[:n].sum(axis=1)
+            return {
+                "machines": list(self.machines),
+                "output": output,
+                "machine_input": machine_input,
+                "productivity": engine.machine_productivity(output, machine_input),
+                "last_seen": self._last_seen[:n].copy(),
+                "plant": float(engine.machine_productivity(output.sum(), machine_input.sum())),
+                "trend": list(self.trend),
+                "newest": self._newest * self.resolution if self._newest >= 0 else None,
+                "events": self.events,
+                "events_per_s": self._rate(),
+                "dropped": self.dropped,
+                "late": self.late,
+            }
+
+    @property
+    def nbytes(self):
+        return (self._outputs.nbytes + self._inputs.nbytes + self._last_seen.nbytes
+                + self._slot_bucket.nbytes + self._counts.nbytes)
+
+
+def _split_address(spec):
+    host, _, port = spec.rpartition(":")
+    return host or "127.0.0.1", int(port)
+
+
+def iter_lines(source, stop, poll=0.5):
+    """Lines from ``source`` until ``stop`` (a ``threading.Event``) is set; reconnects and reopens as needed.
+
+    An empty string is yielded whenever the source has been idle for ``poll``
+    seconds, so the caller can flush what it has batched. A source that
+    cannot be opened or read raises ``OSError`` (``ValueError`` for a bad
+    address); :class:`Feed` retries it.
+    """
+    if source.startswith("tcp://"):
+        address = _split_address(source[len("tcp://"):])
+        while not stop.is_set():
+            with socket.create_connection(address, timeout=poll) as conn:
+                pending = b""
+                while not stop.is_set():
+                    try:
+                        data = conn.recv(1 << 16)
+                    except socket.timeout:
+                        yield ""
+                        continue
+                    if not data:
+                        break
+                    *lines, pending = (pending + data).split(b"\n")
+                    for line in lines:
+                        yield line.decode("utf-8", "replace")
+    elif source.startswith("udp://"):
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 22)
+            sock.bind(_split_address(source[len("udp://"):]))
+            sock.settimeout(poll)
+            while not stop.is_set():
+                try:
+                    data = sock.recv(1 << 16)
+                except socket.timeout:
+                    yield ""
+                    continue
+                yield from data.decode("utf-8", "replace").splitlines()
+    else:
+        path = source[len("file://"):] if source.startswith("file://") else source
+        from_end = True
+        while not stop.is_set():
+            if not os.path.exists(path):
+                from_end = False  # whatever file appears there next is all new
+                yield ""
+                stop.wait(poll)
+                continue
+            # A regular file is followed from its current end (the first time); a pipe from its start
+            with open(path, encoding="utf-8", errors="replace") as f:
+                if from_end and os.path.isfile(path):
+                    f.seek(0, os.SEEK_END)
+                from_end = False
+                pending = ""
+                while not stop.is_set():
+                    chunk = f.readline()
+                    if not chunk:
+                        if not os.path.isfile(path):
+                            yield ""
+                            break  # writer closed the pipe: reopen (blocks until the next writer)
+                        try:
+                            info = os.stat(path)
+                        except FileNotFoundError:
+                            continue  # removed: the check above sees it
+                        if info.st_ino != os.fstat(f.fileno()).st_ino:
+                            break  # rotated: this one is read to its end, follow the new file from its start
+                        if info.st_size < f.tell():
+                            f.seek(0)  # truncated in place: read again from the start
+                            pending = ""
+                        yield ""
+                        stop.wait(BATCH_INTERVAL)
+                        continue
+                    pending += chunk
+                    if pending.endswith("\n"):
+                        yield pending
+                        pending = ""
+
+
+class Feed:
+    """Background reader that batches a source's events into a :class:`LiveBoard`.
+
+    With a ``monitor`` (:class:`productivity.alerts.Monitor`), each machine's
+    productivity over every completed bucket is checked for alerts. A source
+    that cannot be opened (a port in use, a bad address) is retried with
+    backoff and its error kept in ``source_error``. With ``idle_timeout``,
+    the feed stops once nobody has called :meth:`snapshot` for that long.
+    """
+
+    def __init__(self, source, board=None, monitor=None, idle_timeout=None):
+        self.source = source
+        self.board = board or LiveBoard()
+        self.monitor = monitor
+        self.idle_timeout = idle_timeout
+        self.lines = 0
+        self.bad_lines = 0
+        self.last_error = None
+        self.source_error = None
+        self.last_read = time.monotonic()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name=f"live-feed {self.source}", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout=2.0):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    @property
+    def idle(self):
+        return self.idle_timeout is not None and time.monotonic() - self.last_read > self.idle_timeout
+
+    def snapshot(self):
+        """The board's :meth:`LiveBoard.snapshot`; reading it keeps the feed alive."""
+        self.last_read = time.monotonic()
+        return self.board.snapshot()
+
+    def _run(self):
+        retry = 0.5
+        while not self._stop.is_set() and not self.idle:
+            try:
+                self._read()
+            except (OSError, ValueError) as exc:
+                self.source_error = f"{type(exc).__name__}: {exc}"
+                self._stop.wait(retry)
+                retry = min(retry * 2, RETRY_MAX)
+            else:
+                retry = 0.5
+
+    def _read(self):
+        batch = ([], [], [], [])
+        flushed = time.monotonic()
+        for line in iter_lines(self.source, self._stop):
+            if line:
+                self.lines += 1
+                self.source_error = None
+            elif self.idle:
+                break
+            try:
+                event = parse_line(line)
+                if event is not None and event[1] > time.time() + MAX_CLOCK_SKEW:
+                    # Would move the board's window past every real event that follows
+                    raise ValueError(f"bad event {line.strip()[:80]!r}: ts is more than {MAX_CLOCK_SKEW:g} s in the future")
+            except ValueError as exc:
+                self.bad_lines += 1
+                self.last_error = str(exc)
+                continue
+            if event is not None:
+                for column, value in zip(batch, event):
+                    column.append(value)
+            now = time.monotonic()
+            if batch[0] and (not line or len(batch[0]) >= BATCH_LINES or now - flushed >= BATCH_INTERVAL):
+                self.board.ingest(*batch)
+                self._check()
+                batch = ([], [], [], [])
+                flushed = now
+        if batch[0]:
+            self.board.ingest(*batch)
+            self._check()
+
+    def _check(self):
+        if self.monitor is not None:
+            for ts, machines, productivity in self.board.pop_closed():
+                self.monitor.observe_batch("Machine Productivity", productivity, machines, ts)
+
+    def stats(self):
+        return {
+            "source": self.source,
+            "running": self.running,
+            "lines": self.lines,
+            "bad_lines": self.bad_lines,
+            "machines": len(self.board.machines),
+            "board_bytes": self.board.nbytes,
+            "last_error": self.last_error,
+            "source_error": self.source_error,
+        }
+
+
+_feeds = {}
+_feeds_lock = threading.Lock()
+
+
+def get_feed(source, window=DEFAULT_WINDOW):
+    """Process-wide feed for ``source``: every session watching it shares one reader, one board and the alert monitor.
+
+    Feeds nobody has read for ``FEED_IDLE`` seconds stop and are dropped; at
+    most ``MAX_FEEDS`` run at once (``RuntimeError`` beyond that).
+    """
+    from productivity import alerts
+
+    key = (source, window)
+    with _feeds_lock:
+        for other in [other for other, feed in _feeds.items() if feed.idle or not feed.running]:
+            _feeds.pop(other)._stop.set()
+        feed = _feeds.get(key)
+        if feed is None:
+            if len(_feeds) >= MAX_FEEDS:
+                raise RuntimeError(f"already following {MAX_FEEDS} live feeds; try again once one is unused")
+            feed = _feeds[key] = Feed(source, LiveBoard(window), alerts.get_monitor(), FEED_IDLE).start()
+        feed.last_read = time.monotonic()
+        return feed
+
+
+# Replay tool
+def _recorded(path, speed, rate):
+    """Events from a recorded file, re-timed to now: original spacing / ``speed``, or a fixed ``rate``."""
+    first = None
+    start = time.time()
+    with open(path, encoding="utf-8") as f:
+        events = (event for event in map(parse_line, f) if event is not None)
+        for i, (machine, ts, output, machine_input) in enumerate(events):
+            if rate:
+                offset = i / rate
+            elif math.isnan(ts):
+                offset = 0.0
+            else:
+                first = ts if first is None else first
+                offset = (ts - first) / speed
+            yield start + offset, machine, output, machine_input
+
+
+def _synthetic(machines, rate, seed=0):
+    """Endless events from ``machines`` simulated machines at ``rate`` events per second in total."""
+    rng = random.Random(seed)
+    names = [f"machine-{i:03d}" for i in range(machines)]
+    speed = [rng.uniform(5.0, 25.0) for _ in names]  # units per machine-hour
+    start = time.time()
+    for i in range(sys.maxsize):
+        m = rng.randrange(machines)
+        hours = rng.uniform(0.5, 1.5) / 3600
+        yield start + i / rate, names[m], max(0.0, rng.gauss(speed[m] * hours, speed[m] * hours * 0.2)), hours
+
+
+class _Broadcaster:
+    """Line server for ``tcp://``: every connected subscriber receives every line."""
+
+    def __init__(self, address, log):
+        self.server = socket.create_server(address)
+        # Nothing is sent (or timed) until the first subscriber connects
+        log.write(f"waiting for a subscriber on tcp://{address[0]}:{address[1]}\n")
+        self.clients = [self.server.accept()[0]]
+        self.server.setblocking(False)
+
+    def send(self, data):
+        try:
+            while True:
+                conn, _ = self.server.accept()
+                conn.setblocking(True)
+                self.clients.append(conn)
+        except BlockingIOError:
+            pass
+        for conn in list(self.clients):
+            try:
+                conn.sendall(data)
+            except OSError:
+                self.clients.remove(conn)
+                conn.close()
+
+
+def replay(events, target, batch_interval=0.01, limit=None, log=sys.stderr):
+    """Send ``(ts, machine, output, machine_input)`` events to ``target`` as JSON lines, in real time."""
+    if target.startswith("tcp://"):
+        broadcaster = _Broadcaster(_split_address(target[len("tcp://"):]), log)
+        send = broadcaster.send
+    elif target.startswith("udp://"):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        address = _split_address(target[len("udp://"):])
+        send = lambda data: [sock.sendto(chunk, address) for chunk in _line_chunks(data, 60_000)]
+    elif target == "-":
+        send = lambda data: (sys.stdout.buffer.write(data), sys.stdout.flush())
+    else:
+        out = open(target, "ab", buffering=0)  # a file being tailed, or a named pipe
+        send = out.write
+    sent = 0
+    reported = time.monotonic()
+    pending = []
+    for ts, machine, output, machine_input in events:
+        delay = ts - time.time()
+        if delay > batch_interval or len(pending) >= BATCH_LINES:
+            if pending:
+                send("".join(pending).encode())
+                pending = []
+            if delay > 0:
+                time.sleep(delay)
+        pending.append(json.dumps({"machine": machine, "ts": round(ts, 6), "output": output,
+                                   "machine_input": machine_input}) + "\n")
+        sent += 1
+        if time.monotonic() - reported >= 5:
+            log.write(f"{sent:,} events sent\n")
+            reported = time.monotonic()
+        if limit and sent >= limit:
+            break
+    if pending:
+        send("".join(pending).encode())
+    return sent
+
+
+def _line_chunks(data, size):
+    # Datagrams of whole lines, so no event is split across two
+    start = 0
+    while start < len(data):
+        end = len(data) if start + size >= len(data) else data.rfind(b"\n", start, start + size) + 1
+        if end <= start:
+            end = start + size
+        yield data[start:end]
+        start = end
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m productivity.live",
+        description="Replay a recorded machine-counter feed, or simulate one, for the live dashboard.",
+    )
+    parser.add_argument("file", nargs="?", help="recorded JSONL/CSV events (omit with --simulate)")
+    parser.add_argument("--to", default="tcp://127.0.0.1:9600",
+                        help="tcp://host:port (serve), udp://host:port, a file/pipe path, or - (default: %(default)s)")
+    parser.add_argument("--simulate", type=int, metavar="MACHINES", help="generate events for this many machines")
+    parser.add_argument("--rate", type=float, help="events per second (default: recorded timing, or 1000 simulated)")
+    parser.add_argument("--speed", type=float, default=1.0, help="replay speed-up of the recorded timing")
+    parser.add_argument("--limit", type=int, help="stop after this many events")
+    args = parser.parse_args(argv)
+    if args.simulate:
+        events = _synthetic(args.simulate, args.rate or 1000.0)
+    elif args.file:
+        events = _recorded(args.file, args.speed, args.rate)
+    else:
+        parser.error("give a recorded FILE or --simulate MACHINES")
+    try:
+        sent = replay(events, args.to, limit=args.limit)
+    except KeyboardInterrupt:
+        return 0
+    except OSError as exc:
+        parser.exit(1, f"replay: error: {exc}\n")
+    sys.stderr.write(f"{sent:,} events sent\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,314 @@
+"""Load test: simulated browser sessions against the app, over Streamlit's websocket protocol.
+
+Each session connects to ``/_stcore/stream`` as a browser tab does and then
+loops over three steps, each timed from sending the widget change to the
+server's "script finished" message:
+
+* select - pick one of the nine calculators in the sidebar;
+* calculate - set that calculator's inputs and press its Calculate button;
+* edit - change one input again (the result and the chart follow it).
+
+Inputs are drawn from ``--distinct`` values each, so sessions repeat each
+other's inputs, as people working on one plant do, and cached results and
+figures get used. ``--think`` adds a pause between steps; without it every
+session sends its next step as soon as the last one finished, which
+measures the most the deployment can serve::
+
+    python -m productivity.loadtest --url http://127.0.0.1:8501 --sessions 32 --duration 30
+    python -m productivity.loadtest --workers 1 2 4 --sessions 32 --duration 30
+
+``--workers`` starts a deployment (:mod:`productivity.deploy`) for each count
+in turn, with its own history database and shared cache, and prints one
+line per count: reruns per second, latency percentiles, errors, and how the
+sessions were spread across the workers. More workers than CPUs cannot add
+throughput.
+
+The messages are Streamlit's own protobufs (``BackMsg``/``ForwardMsg``), as
+sent by the frontend of Streamlit 1.45 and later, where a selectbox reports
+its option rather than its index; it was written against 1.65. Install the
+websocket client with ``pip install -r requirements-dev.txt``.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+from collections import namedtuple
+
+import numpy as np
+import websockets
+from streamlit.proto.BackMsg_pb2 import BackMsg
+from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+
+from productivity import deploy, engine
+
+CALCULATOR_WIDGET = "Choose calculation type:"
+MODE_WIDGET = "Input mode:"
+STEPS = ("load", "select", "calculate", "edit")
+DEFAULT_SESSIONS = 16
+DEFAULT_DURATION = 30.0
+DEFAULT_WARMUP = 5.0
+DEFAULT_DISTINCT = 5
+DEFAULT_PORT = 8751
+RUN_TIMEOUT = 60.0
+START_TIMEOUT = 120.0
+
+Widget = namedtuple("Widget", "kind id label default")
+
+
+class SessionError(Exception):
+    pass
+
+
+class Session:
+    """One simulated browser tab: its websocket and the widget values it would send."""
+
+    def __init__(self, ws):
+        self.ws = ws
+        self.values = {}
+
+    async def rerun(self, changes=None, trigger=None):
+        """Apply ``changes`` (``{widget id: (state field, value)}``), optionally press ``trigger``, and wait for the run.
+
+        Returns the widgets of the new page, in script order.
+        """
+        self.values.update(changes or {})
+        message = BackMsg()
+        message.rerun_script.query_string = ""
+        message.rerun_script.page_script_hash = ""
+        for widget_id, (field, value) in self.values.items():
+            state = message.rerun_script.widget_states.widgets.add()
+            state.id = widget_id
+            setattr(state, field, value)
+        if trigger:
+            state = message.rerun_script.widget_states.widgets.add()
+            state.id = trigger
+            state.trigger_value = True
+        await self.ws.send(message.SerializeToString())
+        widgets = []
+        while True:
+            forward = ForwardMsg()
+            forward.ParseFromString(await asyncio.wait_for(self.ws.recv(), RUN_TIMEOUT))
+            kind = forward.WhichOneof("type")
+            if kind == "delta" and forward.delta.WhichOneof("type") == "new_element":
+                element = forward.delta.new_element
+                element_kind = element.WhichOneof("type")
+                if element_kind == "exception":
+                    raise SessionError(f"app raised {element.exception.type}: {element.exception.message}")
+                proto = getattr(element, element_kind)
+                if getattr(proto, "id", ""):
+                    widgets.append(Widget(element_kind, proto.id, getattr(proto, "label", ""),
+                                          getattr(proto, "default", None)))
+            elif kind == "script_finished":
+                if forward.script_finished != ForwardMsg.FINISHED_SUCCESSFULLY:
+                    raise SessionError(f"script finished with {ForwardMsg.ScriptFinishedStatus.Name(forward.script_finished)}")
+                break
+        present = {widget.id for widget in widgets}
+        self.values = {widget_id: value for widget_id, value in self.values.items() if widget_id in present}
+        return widgets
+
+
+def _find(widgets, kind, label):
+    for widget in widgets:
+        if widget.kind == kind and widget.label == label:
+            return widget
+    raise SessionError(f"no {kind} {label!r} on the page")
+
+
+def _calculator_widgets(widgets):
+    """The manual inputs and the Calculate button: the number inputs between the mode radio and that button."""
+    start = widgets.index(_find(widgets, "radio", MODE_WIDGET))
+    for end in range(start + 1, len(widgets)):
+        if widgets[end].kind == "button" and widgets[end].label.startswith("Calculate"):
+            inputs = [widget for widget in widgets[start + 1:end] if widget.kind == "number_input"]
+            return inputs, widgets[end]
+    raise SessionError("no Calculate button on the page")
+
+
+class Recorder:
+    """Step latencies and errors, counted only once the warm-up is over."""
+
+    def __init__(self, measure_from):
+        self.measure_from = measure_from
+        self.latencies = {step: [] for step in STEPS}
+        self.errors = 0
+        self.last_error = None
+
+    async def time(self, step, run):
+        started = time.monotonic()
+        result = await run
+        if started >= self.measure_from:
+            self.latencies[step].append(time.monotonic() - started)
+        return result
+
+    def failed(self, exc):
+        if time.monotonic() >= self.measure_from:
+            self.errors += 1
+        self.last_error = f"{type(exc).__name__}: {exc}"
+
+
+async def run_session(url, deadline, recorder, rng, distinct=DEFAULT_DISTINCT, think=0.0):
+    factors = np.linspace(0.5, 1.5, distinct) if distinct > 1 else np.ones(1)
+    stream = url.replace("http", "ws", 1).rstrip("/") + "/_stcore/stream"
+    while time.monotonic() < deadline:
+        try:
+            async with websockets.connect(stream, subprotocols=["streamlit"], max_size=None,
+                                          open_timeout=RUN_TIMEOUT) as ws:
+                session = Session(ws)
+                widgets = await recorder.time("load", session.rerun())
+                while time.monotonic() < deadline:
+                    calc_type = rng.choice(list(engine.CALCULATORS))
+                    selector = _find(widgets, "selectbox", CALCULATOR_WIDGET)
+                    widgets = await recorder.time("select", session.rerun({selector.id: ("string_value", calc_type)}))
+                    inputs, button = _calculator_widgets(widgets)
+                    changes = {widget.id: ("double_value", widget.default * rng.choice(factors)) for widget in inputs}
+                    await asyncio.sleep(think)
+                    widgets = await recorder.time("calculate", session.rerun(changes, trigger=button.id))
+                    edited = rng.choice(inputs)
+                    await asyncio.sleep(think)
+                    widgets = await recorder.time(
+                        "edit", session.rerun({edited.id: ("double_value", edited.default * rng.choice(factors))})
+                    )
+                    await asyncio.sleep(think)
+        except (SessionError, OSError, asyncio.TimeoutError, websockets.WebSocketException) as exc:
+            recorder.failed(exc)
+            await asyncio.sleep(0.5)
+
+
+async def load(url, sessions=DEFAULT_SESSIONS, duration=DEFAULT_DURATION, warmup=DEFAULT_WARMUP,
+               distinct=DEFAULT_DISTINCT, think=0.0, seed=0):
+    """Run ``sessions`` concurrent sessions against ``url`` for ``warmup + duration`` seconds; returns the summary."""
+    started = time.monotonic()
+    recorder = Recorder(started + warmup)
+    deadline = started + warmup + duration
+    await asyncio.gather(*(
+        run_session(url, deadline, recorder, random.Random(seed + i), distinct, think) for i in range(sessions)
+    ))
+    return summarize(recorder, time.monotonic() - recorder.measure_from, sessions)
+
+
+def summarize(recorder, elapsed, sessions):
+    steps = [value for step in STEPS if step != "load" for value in recorder.latencies[step]]
+    latencies = np.array(steps) * 1000 if steps else np.full(1, np.nan)
+    calculate = np.array(recorder.latencies["calculate"] or [np.nan]) * 1000
+    return {
+        "sessions": sessions,
+        "reruns": len(steps),
+        "reruns_per_s": len(steps) / elapsed if elapsed > 0 else 0.0,
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p95_ms": float(np.percentile(latencies, 95)),
+        "p99_ms": float(np.percentile(latencies, 99)),
+        "calculate_p95_ms": float(np.percentile(calculate, 95)),
+        "errors": recorder.errors,
+        "last_error": recorder.last_error,
+    }
+
+
+def _get_json(url):
+    with urllib.request.urlopen(url, timeout=5) as response:
+        return json.load(response)
+
+
+def start_deployment(workers, port, directory, log=subprocess.DEVNULL):
+    """Start ``python -m productivity.deploy`` on ``port`` and wait until every worker is healthy."""
+    env = dict(os.environ, PRODUCTIVITY_HISTORY_DB=os.path.join(directory, f"history-{workers}.db"),
+               PRODUCTIVITY_EOQ_GRID_DIR=os.environ.get("PRODUCTIVITY_EOQ_GRID_DIR", os.path.join(directory, "eoq-grid")))
+    process = subprocess.Popen(
+        [sys.executable, "-m", "productivity.deploy", "--workers", str(workers), "--host", "127.0.0.1",
+         "--port", str(port), "--shared-cache", os.path.join(directory, f"cache-{workers}.db")],
+        env=env, stdout=log, stderr=log,
+    )
+    deadline = time.monotonic() + START_TIMEOUT
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"deployment exited with code {process.returncode}")
+        try:
+            if all(worker["healthy"] for worker in _get_json(f"http://127.0.0.1:{port}/_balancer/stats")["workers"]):
+                return process
+        except (OSError, urllib.error.URLError, ValueError):
+            pass
+        time.sleep(0.5)
+    stop_deployment(process)
+    raise RuntimeError(f"{workers} workers were not healthy after {START_TIMEOUT:.0f}s")
+
+
+def stop_deployment(process):
+    process.terminate()
+    try:
+        process.wait(deploy.STOP_TIMEOUT + 5)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+
+def _line(label, summary, spread=""):
+    return (f"{label:>8} {summary['sessions']:>8} {summary['reruns']:>8,} {summary['reruns_per_s']:>9.1f} "
+            f"{summary['p50_ms']:>8.0f} {summary['p95_ms']:>8.0f} {summary['p99_ms']:>8.0f} "
+            f"{summary['calculate_p95_ms']:>10.0f} {summary['errors']:>7}  {spread}")
+
+
+HEADER = (f"{'workers':>8} {'sessions':>8} {'reruns':>8} {'reruns/s':>9} {'p50 ms':>8} {'p95 ms':>8} "
+          f"{'p99 ms':>8} {'calc p95':>10} {'errors':>7}  sessions per worker")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m productivity.loadtest", description=__doc__.split("\n\n")[0])
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--url", help="a running app or deployment, e.g. http://127.0.0.1:8501")
+    target.add_argument("--workers", type=int, nargs="+", metavar="N", help="start a deployment with N workers for each N")
+    parser.add_argument("--sessions", type=int, default=DEFAULT_SESSIONS, help="concurrent sessions (default: %(default)s)")
+    parser.add_argument("--duration", type=float, default=DEFAULT_DURATION, help="measured seconds (default: %(default)s)")
+    parser.add_argument("--warmup", type=float, default=DEFAULT_WARMUP, help="unmeasured seconds first (default: %(default)s)")
+    parser.add_argument("--distinct", type=int, default=DEFAULT_DISTINCT, help="values drawn per input (default: %(default)s)")
+    parser.add_argument("--think", type=float, default=0.0, help="seconds between a session's steps (default: %(default)s)")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="balancer port for --workers (default: %(default)s)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", action="store_true", help="print the summaries as JSON")
+    args = parser.parse_args(argv)
+
+    def run(url):
+        return asyncio.run(load(url, args.sessions, args.duration, args.warmup, args.distinct, args.think, args.seed))
+
+    summaries = []
+    try:
+        if args.url:
+            summaries.append(("-", run(args.url), ""))
+        else:
+            sys.stderr.write(f"{os.cpu_count()} CPUs here\n")
+            if not args.json:
+                print(HEADER, flush=True)
+            with tempfile.TemporaryDirectory(prefix="productivity-loadtest-") as directory:
+                for workers in args.workers:
+                    process = start_deployment(workers, args.port, directory)
+                    try:
+                        summary = run(f"http://127.0.0.1:{args.port}")
+                        stats = _get_json(f"http://127.0.0.1:{args.port}/_balancer/stats")
+                    finally:
+                        stop_deployment(process)
+                    spread = " ".join(str(worker["connections"]) for worker in stats["workers"])
+                    summaries.append((str(workers), summary, spread))
+                    if not args.json:
+                        print(_line(str(workers), summary, spread), flush=True)
+    except KeyboardInterrupt:
+        return 1
+    except RuntimeError as exc:
+        parser.exit(1, f"loadtest: error: {exc}\n")
+    if args.json:
+        print(json.dumps([dict(summary, workers=label, spread=spread) for label, summary, spread in summaries], indent=2))
+    elif args.url:
+        print(HEADER)
+        print(_line("-", summaries[0][1]))
+    for _, summary, _ in summaries:
+        if summary["last_error"]:
+            sys.stderr.write(f"last error: {summary['last_error']}\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
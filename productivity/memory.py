@@ -0,0 +1,285 @@
+"""Per-session memory budgets, a shared store for immutable values, and spill to disk.
+
+Streamlit keeps one ``session_state`` per browser tab, for as long as the
+tab is connected, inside the server process. Anything large kept there is
+multiplied by the number of operators. Three pieces keep that bounded:
+
+* :class:`ValueStore` - named values with a byte budget; once over it, the
+  least recently used values are pickled to a spill directory and read
+  back on demand.
+* :func:`get_session` - one :class:`SessionMemory` (a ``ValueStore`` with the
+  per-session budget) per session, registered process-wide so that
+  :func:`report` can list live memory per session. Spill files go away
+  with the session.
+* :func:`get_shared` - a process-wide ``ValueStore`` for immutable values that
+  many sessions may ask for (e.g. an export of all history): kept once,
+  under its own budget, and keyed by what determines the content.
+
+Calculation history itself lives in SQLite (see :mod:`productivity.history`),
+so it is already on disk rather than in any session.
+
+Budgets come from ``PRODUCTIVITY_SESSION_BUDGET_MB`` (default 64) and
+``PRODUCTIVITY_SHARED_BUDGET_MB`` (default 256); spill files go to
+``PRODUCTIVITY_SPILL_DIR`` (default: a per-process temporary directory).
+"""
+import atexit
+import itertools
+import os
+import pickle
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import weakref
+from collections import OrderedDict
+
+import numpy as np
+
+MB = 1024 * 1024
+DEFAULT_SESSION_BUDGET = int(float(os.environ.get("PRODUCTIVITY_SESSION_BUDGET_MB", 64)) * MB)
+DEFAULT_SHARED_BUDGET = int(float(os.environ.get("PRODUCTIVITY_SHARED_BUDGET_MB", 256)) * MB)
+
+
+def sizeof(obj):
+    """Approximate deep size of ``obj`` in bytes.
+
+    Walks built-in containers and this package's own objects; anything with
+    an ``nbytes`` (NumPy and Arrow arrays, ``RecordBuffer``) counts that.
+    Other objects (Plotly figures from the shared figure cache, functions,
+    modules) count only their own header, since they are not held per
+    session.
+    """
+    seen = set()
+    total = 0
+    stack = [obj]
+    while stack:
+        item = stack.pop()
+        if id(item) in seen:
+            continue
+        seen.add(id(item))
+        if isinstance(item, np.ndarray):
+            total += sys.getsizeof(item) + (item.nbytes if item.base is not None else 0)
+            continue
+        nbytes = getattr(item, "nbytes", None)
+        if isinstance(nbytes, int):
+            total += nbytes
+            continue
+        total += sys.getsizeof(item)
+        if isinstance(item, dict):
+            stack.extend(item.keys())
+            stack.extend(item.values())
+        elif isinstance(item, (list, tuple, set, frozenset)):
+            stack.extend(item)
+        elif type(item).__module__.startswith("productivity."):
+            if hasattr(item, "__dict__"):
+                stack.append(vars(item))
+            for cls in type(item).__mro__:
+                stack.extend(getattr(item, slot) for slot in getattr(cls, "__slots__", ()) if hasattr(item, slot))
+    return total
+
+
+class _Spilled:
+    __slots__ = ("path", "nbytes")
+
+    def __init__(self, path, nbytes):
+        self.path = path
+        self.nbytes = nbytes
+
+
+_counter = itertools.count()
+
+
+class ValueStore:
+    """Named values under a byte budget; the least recently used are spilled to disk beyond it."""
+
+    def __init__(self, budget, spill_dir=None, name="store"):
+        self.budget = budget
+        self.name = name
+        if spill_dir is None:
+            base = os.environ.get("PRODUCTIVITY_SPILL_DIR") or tempfile.gettempdir()
+            spill_dir = os.path.join(base, f"productivity-spill-{os.getpid()}", name)
+        self._spill_dir = spill_dir
+        self._resident = OrderedDict()  # key -> (value, nbytes), least recently used first
+        self._spilled = {}
+        self._lock = threading.RLock()
+        self.resident_bytes = 0
+        self.spills = 0
+        self.loads = 0
+
+    @property
+    def spill_dir(self):
+        os.makedirs(self._spill_dir, exist_ok=True)  # only once something is spilled
+        return self._spill_dir
+
+    def __contains__(self, key):
+        return key in self._resident or key in self._spilled
+
+    def __len__(self):
+        return len(self._resident) + len(self._spilled)
+
+    @property
+    def spilled_bytes(self):
+        return sum(entry.nbytes for entry in self._spilled.values())
+
+    def put(self, key, value, nbytes=None):
+        nbytes = sizeof(value) if nbytes is None else nbytes
+        with self._lock:
+            self._discard(key)
+            self._resident[key] = (value, nbytes)
+            self.resident_bytes += nbytes
+            self._enforce()
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key in self._resident:
+                self._resident.move_to_end(key)
+                return self._resident[key][0]
+            entry = self._spilled.get(key)
+            if entry is None:
+                return default
+            with open(entry.path, "rb") as f:
+                value = pickle.load(f)
+            self.loads += 1
+            return value
+
+    def get_or_put(self, key, compute):
+        """Cached value for ``key``, computing and storing it on a miss."""
+        with self._lock:
+            if key in self:
+                return self.get(key)
+        value = compute()
+        self.put(key, value)
+        return value
+
+    def pop(self, key):
+        with self._lock:
+            value = self.get(key)
+            self._discard(key)
+            return value
+
+    def _discard(self, key):
+        if key in self._resident:
+            self.resident_bytes -= self._resident.pop(key)[1]
+        entry = self._spilled.pop(key, None)
+        if entry is not None:
+            _remove(entry.path)
+
+    def _enforce(self):
+        # Spill least recently used values first; a single value larger than
+        # the whole budget goes straight to disk too.
+        for key in list(self._resident):
+            if self.resident_bytes <= self.budget:
+                break
+            value, nbytes = self._resident.pop(key)
+            self.resident_bytes -= nbytes
+            path = os.path.join(self.spill_dir, f"{next(_counter)}.pkl")
+            with open(path, "wb") as f:
+                pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+            self._spilled[key] = _Spilled(path, nbytes)
+            self.spills += 1
+
+    def clear(self):
+        with self._lock:
+            for key in list(self):
+                self._discard(key)
+
+    def __iter__(self):
+        return iter(list(self._resident) + list(self._spilled))
+
+    def stats(self):
+        return {
+            "items": len(self),
+            "resident_bytes": self.resident_bytes,
+            "spilled_bytes": self.spilled_bytes,
+            "budget_bytes": self.budget,
+            "spills": self.spills,
+            "loads": self.loads,
+        }
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+class SessionMemory(ValueStore):
+    """One session's budgeted values plus the last measured size of its other state."""
+
+    def __init__(self, session_id, budget=DEFAULT_SESSION_BUDGET, spill_dir=None):
+        super().__init__(budget, spill_dir, name=f"session-{session_id}")
+        self.session_id = session_id
+        self.state_bytes = 0
+        self.created = self.last_seen = time.time()
+        # Spill files go when Streamlit drops the session's state
+        weakref.finalize(self, shutil.rmtree, self._spill_dir, True)
+
+    def measure(self, state):
+        """Record the size of the session's other state (``session_state`` minus this store)."""
+        self.state_bytes = sizeof({key: value for key, value in state.items() if value is not self})
+        self.last_seen = time.time()
+        return self.state_bytes
+
+    @property
+    def total_bytes(self):
+        return self.state_bytes + self.resident_bytes
+
+    def stats(self):
+        return {
+            "session": self.session_id,
+            "state_bytes": self.state_bytes,
+            "total_bytes": self.total_bytes,
+            "idle_s": time.time() - self.last_seen,
+            **super().stats(),
+        }
+
+
+_sessions = weakref.WeakValueDictionary()
+_sessions_lock = threading.Lock()
+_shared = None
+
+
+def get_session(state, session_id, budget=None):
+    """The :class:`SessionMemory` kept in ``state`` (a ``session_state``), created on first use."""
+    memory = state.get("_memory")
+    if memory is None:
+        memory = SessionMemory(session_id, DEFAULT_SESSION_BUDGET if budget is None else budget)
+        state["_memory"] = memory
+        with _sessions_lock:
+            _sessions[session_id] = memory
+    return memory
+
+
+def get_shared():
+    """Process-wide store for immutable values shared between sessions."""
+    global _shared
+    with _sessions_lock:
+        if _shared is None:
+            _shared = ValueStore(DEFAULT_SHARED_BUDGET, name="shared")
+            atexit.register(shutil.rmtree, os.path.dirname(_shared._spill_dir), True)
+        return _shared
+
+
+def process_rss():
+    """Resident set size of this process in bytes (``None`` where /proc is unavailable)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def report():
+    """Live memory use: the process, the shared store and every connected session, largest first."""
+    with _sessions_lock:
+        sessions = [memory.stats() for memory in list(_sessions.values())]
+    sessions.sort(key=lambda s: s["total_bytes"], reverse=True)
+    return {
+        "rss_bytes": process_rss(),
+        "shared": get_shared().stats(),
+        "sessions": sessions,
+        "session_bytes": sum(s["total_bytes"] for s in sessions),
+        "spilled_bytes": sum(s["spilled_bytes"] for s in sessions) + get_shared().spilled_bytes,
+    }
@@ -0,0 +1,161 @@
+"""Monte Carlo uncertainty propagation through the calculators.
+
+Each input is either a fixed number or a distribution, e.g.
+``{"demand": ("normal", 12_000, 1_500), "ordering_cost": 50.0,
+"holding_cost": ("triangular", 1.5, 2.0, 3.0)}``. Draws are sampled and
+evaluated in fixed-size vectorized chunks and folded into a
+:class:`Simulation`: running moments over every draw, plus the draws
+themselves up to ``SAMPLE_SIZE``. Beyond that an even share of every
+chunk is kept, a uniform sample (the draws are independent), so memory
+stays bounded whatever the number of draws. Intervals and the histogram
+are computed from the kept draws. The same seed and chunk size always
+give the same result.
+"""
+import math
+from statistics import NormalDist
+
+import numpy as np
+
+from productivity import engine
+
+DEFAULT_DRAWS = 1_000_000
+DEFAULT_CHUNK_SIZE = 100_000
+SAMPLE_SIZE = 250_000  # draws kept for intervals and the histogram
+
+# Distribution name -> parameter names, in order
+DISTRIBUTIONS = {
+    "fixed": ("value",),
+    "normal": ("mean", "sd"),
+    "lognormal": ("mean", "sd"),
+    "uniform": ("low", "high"),
+    "triangular": ("low", "mode", "high"),
+}
+
+
+def _sampler(spec):
+    if isinstance(spec, (int, float)):
+        spec = ("fixed", spec)
+    kind, *params = spec
+    if kind not in DISTRIBUTIONS or len(params) != len(DISTRIBUTIONS[kind]):
+        raise ValueError(f"expected one of {sorted(DISTRIBUTIONS)} with its parameters, got {spec!r}")
+    if kind == "fixed":
+        return lambda rng, n: np.full(n, float(params[0]))
+    if kind == "normal":
+        return lambda rng, n: rng.normal(params[0], params[1], n)
+    if kind == "lognormal":
+        # Parameterised by the mean and sd of the values themselves
+        mean, sd = params
+        sigma = math.sqrt(math.log1p((sd / mean) ** 2)) if mean > 0 else 0.0
+        mu = math.log(mean) - sigma ** 2 / 2 if mean > 0 else -math.inf
+        return lambda rng, n: rng.lognormal(mu, sigma, n)
+    if kind == "uniform":
+        return lambda rng, n: rng.uniform(params[0], params[1], n)
+    return lambda rng, n: rng.triangular(params[0], params[1], params[2], n)
+
+
+class Simulation:
+    """Running summary of simulated results: moments, extremes and a sample of the draws.
+
+    With ``draws`` (the number that will be added), each chunk keeps its
+    share of ``sample_size`` draws; without it every draw is kept.
+    """
+
+    def __init__(self, calc_type, draws=None, sample_size=SAMPLE_SIZE):
+        self.calc_type = calc_type
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+        self.minimum = math.inf
+        self.maximum = -math.inf
+        self.fraction = min(1.0, sample_size / draws) if draws else 1.0
+        self._kept = []
+
+    def add(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        n = len(values)
+        if not n:
+            return
+        # Chan et al. pairwise update of the mean and sum of squared deviations
+        mean = float(values.mean())
+        m2 = float(((values - mean) ** 2).sum())
+        total = self.count + n
+        delta = mean - self.mean
+        self.mean += delta * n / total
+        self._m2 += m2 + delta ** 2 * self.count * n / total
+        self.count = total
+        self.minimum = min(self.minimum, float(values.min()))
+        self.maximum = max(self.maximum, float(values.max()))
+        self._kept.append(values[:math.ceil(n * self.fraction)].copy())
+
+    @property
+    def sample(self):
+        """The kept draws, as one array."""
+        if len(self._kept) != 1:
+            self._kept = [np.concatenate(self._kept) if self._kept else np.zeros(0)]
+        return self._kept[0]
+
+    @property
+    def std(self):
+        return math.sqrt(self._m2 / (self.count - 1)) if self.count > 1 else 0.0
+
+    def interval(self, level=0.90):
+        """Central interval holding ``level`` of the simulated results."""
+        if not self.count:
+            return 0.0, 0.0
+        tail = (1 - level) / 2
+        low, high = np.quantile(self.sample, (tail, 1 - tail))
+        return float(low), float(high)
+
+    def mean_interval(self, level=0.95):
+        """Normal-approximation confidence interval for the mean result."""
+        half = NormalDist().inv_cdf((1 + level) / 2) * self.std / math.sqrt(max(self.count, 1))
+        return self.mean - half, self.mean + half
+
+    def histogram(self, bins=60):
+        """``(counts, edges)`` over the simulated range: equal-width bins of the kept draws, scaled to all draws."""
+        if not self.count or self.maximum <= self.minimum:
+            low = self.minimum if self.count else 0.0
+            return np.array([self.count]), np.array([low, low + 1.0])
+        counts, edges = np.histogram(self.sample, bins=bins, range=(self.minimum, self.maximum))
+        return counts * (self.count / len(self.sample)), edges
+
+    def as_dict(self, levels=(0.90, 0.95)):
+        summary = {
+            "draws": self.count,
+            "mean": self.mean,
+            "std": self.std,
+            "min": self.minimum,
+            "max": self.maximum,
+            "mean_ci_95": self.mean_interval(0.95),
+        }
+        for level in levels:
+            summary[f"interval_{level * 100:g}"] = self.interval(level)
+        return summary
+
+
+def simulate(calc_type, spec, draws=DEFAULT_DRAWS, seed=0, chunk_size=DEFAULT_CHUNK_SIZE,
+             clip_negative=True, progress=None):
+    """Propagate input uncertainty through ``calc_type`` over ``draws`` samples.
+
+    ``spec`` maps each input name to a number or a distribution tuple (see
+    :data:`DISTRIBUTIONS`). Negative draws are clipped to 0 by default, as
+    none of the inputs can be negative. ``progress(simulation)`` is called
+    after every chunk. Returns the :class:`Simulation`.
+    """
+    func, inputs = engine.CALCULATORS[calc_type]
+    missing = [name for name in inputs if name not in spec]
+    if missing:
+        raise ValueError(f"missing inputs for {calc_type}: {', '.join(missing)}")
+    samplers = [_sampler(spec[name]) for name in inputs]
+    rng = np.random.default_rng(seed)
+    simulation = Simulation(calc_type, draws)
+    for start in range(0, draws, chunk_size):
+        n = min(chunk_size, draws - start)
+        args = [sample(rng, n) for sample in samplers]
+        if clip_negative:
+            for arg in args:
+                np.maximum(arg, 0.0, out=arg)
+        simulation.add(func(*args))
+        if progress:
+            progress(simulation)
+    return simulation
@@ -0,0 +1,166 @@
+"""Opt-in per-rerun instrumentation for the Streamlit app.
+
+A :class:`RerunProfiler` is created at the top of every script run. Code
+marks the end of each top-level phase with :meth:`~RerunProfiler.lap` and
+wraps interesting sub-steps (computation, figure build, figure render) in
+:meth:`~RerunProfiler.phase`. When the run finishes the timings are folded
+into per-session totals and emitted as one JSON log record on the
+``productivity.profiling`` logger.
+
+Profiling is off unless enabled (``PRODUCTIVITY_PROFILE=1`` or the
+``?profile=1`` query parameter); a disabled profiler's methods do nothing.
+The one exception is cold start: the first finished run in a process always
+records its time to first paint (see :func:`first_paint`), and writes it to
+stderr when the logger is not set up to emit INFO records (no
+``PRODUCTIVITY_PROFILE_LOG``).
+"""
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+logger = logging.getLogger("productivity.profiling")
+
+ENV_FLAG = "PRODUCTIVITY_PROFILE"
+ENV_LOG = "PRODUCTIVITY_PROFILE_LOG"
+_STATS_KEY = "_profiling_stats"
+
+_IMPORTED = time.perf_counter()
+_first_paint = None
+_first_paint_lock = threading.Lock()
+
+
+def enabled_by_env():
+    return os.environ.get(ENV_FLAG, "").lower() in ("1", "true", "yes")
+
+
+def configure_log_file(path=None):
+    """Also append profiling records as JSON lines to ``path`` (or ``$PRODUCTIVITY_PROFILE_LOG``)."""
+    path = path or os.environ.get(ENV_LOG)
+    if not path or any(getattr(h, "baseFilename", None) == os.path.abspath(path) for h in logger.handlers):
+        return
+    handler = logging.FileHandler(path)
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+
+
+def process_uptime():
+    """Seconds since this process started (since this module loaded where /proc is unavailable)."""
+    try:
+        with open("/proc/self/stat") as f:
+            # Field 22, counted after the parenthesised command name
+            started = int(f.read().rsplit(")", 1)[1].split()[19]) / os.sysconf("SC_CLK_TCK")
+        with open("/proc/uptime") as f:
+            return float(f.read().split()[0]) - started
+    except (OSError, ValueError, IndexError, AttributeError):
+        return time.perf_counter() - _IMPORTED
+
+
+def first_paint():
+    """Cold-start record of the first script run in this process, or ``None`` before it ends."""
+    return _first_paint
+
+
+def _record_first_paint(run_seconds):
+    # ``first_run_started_s`` separates server start-up (and any wait for the
+    # first visitor) from the cost of the first script run itself.
+    global _first_paint
+    with _first_paint_lock:
+        if _first_paint is not None:
+            return
+        uptime = process_uptime()
+        _first_paint = {
+            "event": "first_paint",
+            "pid": os.getpid(),
+            "first_paint_s": uptime,
+            "first_run_started_s": uptime - run_seconds,
+            "first_run_s": run_seconds,
+        }
+    if logger.isEnabledFor(logging.INFO) and logger.hasHandlers():
+        logger.info(json.dumps(_first_paint))
+    else:
+        sys.stderr.write(json.dumps(_first_paint) + "\n")  # an unconfigured logger would drop it
+
+
+class RerunProfiler:
+    """Collects phase timings for one script run."""
+
+    def __init__(self, enabled=False, session=None, state=None):
+        self.enabled = enabled
+        self.session = session
+        self.tags = {}
+        self.laps = {}
+        self.phases = {}
+        self._state = state if state is not None else {}
+        self._started = self._last = time.perf_counter()
+
+    def lap(self, name):
+        """Attribute the time since the previous lap (or start) to ``name``."""
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        self.laps[name] = self.laps.get(name, 0.0) + now - self._last
+        self._last = now
+
+    def phase(self, name):
+        """Context manager timing a sub-step; nested inside the current lap."""
+        if not self.enabled:
+            return nullcontext()
+        return self._timed(name)
+
+    @contextmanager
+    def _timed(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0.0) + time.perf_counter() - started
+
+    def tag(self, **tags):
+        if self.enabled:
+            self.tags.update(tags)
+
+    def elapsed(self):
+        return time.perf_counter() - self._started
+
+    def session_stats(self):
+        """Totals over this session's finished reruns."""
+        return self._state.get(_STATS_KEY, {"reruns": 0, "total": 0.0, "laps": {}, "phases": {}})
+
+    def finish(self):
+        """Close the run: update session totals and log one structured record."""
+        total = self.elapsed()
+        _record_first_paint(total)
+        if not self.enabled:
+            return None
+        stats = self.session_stats()
+        stats = {
+            "reruns": stats["reruns"] + 1,
+            "total": stats["total"] + total,
+            "laps": _add(stats["laps"], self.laps),
+            "phases": _add(stats["phases"], self.phases),
+        }
+        self._state[_STATS_KEY] = stats
+        record = {
+            "event": "rerun",
+            "session": self.session,
+            "rerun": stats["reruns"],
+            "total_s": total,
+            "laps_s": self.laps,
+            "phases_s": self.phases,
+            "cumulative_s": stats["total"],
+            **self.tags,
+        }
+        logger.info(json.dumps(record, default=str))
+        return record
+
+
+def _add(totals, new):
+    merged = dict(totals)
+    for name, seconds in new.items():
+        merged[name] = merged.get(name, 0.0) + seconds
+    return merged
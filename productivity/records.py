@@ -0,0 +1,264 @@
+"""Compact representations of calculation results.
+
+Two shapes, one for each way results are handled:
+
+* :class:`Record` - one result as a slotted Python object, with the
+  calculator as a :class:`CalcType` member (a shared singleton, not a
+  string copy) and the timestamp as integer epoch microseconds; the
+  ``datetime`` is only built when asked for.
+* :class:`RecordBuffer` - many results as a struct of NumPy arrays:
+  int64 ids and timestamps, float64 results, and calculator types and
+  sessions as small integer codes into append-only category tables
+  (~30 bytes a row, against several hundred for a dict with a
+  ``datetime``). Its columns go to SQLite and Arrow without per-row
+  objects.
+"""
+import enum
+from datetime import datetime, timezone
+
+import numpy as np
+
+from productivity import engine
+
+
+class CalcType(enum.Enum):
+    """Calculator types; the value is the label used throughout the app and in history."""
+
+    TOTAL = "Total Productivity"
+    LABOUR = "Labour Productivity"
+    MATERIAL = "Material Productivity"
+    CAPITAL = "Capital Productivity"
+    MACHINE = "Machine Productivity"
+    MISC = "Miscellaneous Productivity"
+    MULTIFACTOR = "Multifactor Productivity"
+    TFP = "Total Factor Productivity"
+    EOQ = "Economic Order Quantity (EOQ)"
+
+    @property
+    def label(self):
+        return self.value
+
+    @property
+    def short(self):
+        """CLI/API short name (``engine.SHORT_NAMES``)."""
+        return self.name.lower()
+
+    @property
+    def inputs(self):
+        return engine.CALCULATORS[self.value][1]
+
+    @classmethod
+    def from_short(cls, short):
+        return cls(engine.SHORT_NAMES[short])
+
+    @classmethod
+    def parse(cls, calc_type):
+        """Member for a label (or member); labels this version does not know come back unchanged."""
+        if isinstance(calc_type, cls):
+            return calc_type
+        try:
+            return cls(calc_type)
+        except ValueError:
+            return calc_type
+
+
+def _label(calc_type):
+    return calc_type.value if isinstance(calc_type, CalcType) else calc_type
+
+
+class Record:
+    """One calculation result. ``id`` is ``None`` until the row is stored."""
+
+    __slots__ = ("id", "ts", "calc_type", "result", "session")
+
+    def __init__(self, id, ts, calc_type, result, session=None):
+        self.id = id
+        self.ts = ts
+        self.calc_type = CalcType.parse(calc_type)
+        self.result = result
+        self.session = session
+
+    @property
+    def label(self):
+        """Calculator label, as shown in the app."""
+        return _label(self.calc_type)
+
+    @property
+    def timestamp(self):
+        """Local-time ``datetime`` of ``ts`` (epoch microseconds)."""
+        return datetime.fromtimestamp(self.ts / 1_000_000, tz=timezone.utc).astimezone()
+
+    def __eq__(self, other):
+        if not isinstance(other, Record):
+            return NotImplemented
+        return all(getattr(self, name) == getattr(other, name) for name in self.__slots__)
+
+    def __repr__(self):
+        return (f"Record(id={self.id!r}, ts={self.ts!r}, calc_type={self.label!r}, "
+                f"result={self.result!r}, session={self.session!r})")
+
+
+class _Categories:
+    """Append-only value -> code table; codes never change once handed out."""
+
+    __slots__ = ("values", "codes")
+
+    def __init__(self, values=()):
+        self.values = list(values)
+        self.codes = {value: code for code, value in enumerate(self.values)}
+
+    def encode(self, values, dtype):
+        for value in set(values).difference(self.codes):
+            self.codes[value] = len(self.values)
+            self.values.append(value)
+        return np.fromiter(map(self.codes.__getitem__, values), dtype=dtype, count=len(values))
+
+
+def _calc_type_categories():
+    categories = _Categories(member.value for member in CalcType)
+    # Members encode to the same code as their label
+    categories.codes.update((member, code) for code, member in enumerate(CalcType))
+    return categories
+
+
+def _session_categories():
+    categories = _Categories()
+    categories.codes[None] = -1
+    return categories
+
+
+class RecordBuffer:
+    """Growable struct-of-arrays of results.
+
+    Columns (``ids``, ``ts``, ``type_codes``, ``results``, ``session_codes``)
+    are NumPy views of the filled part. ``type_codes`` index
+    ``calc_types`` (the first codes are the :class:`CalcType` members, in
+    order) and ``session_codes`` index ``sessions``, with -1 for no session.
+    Unstored rows have id -1.
+    """
+
+    _DTYPES = (("ids", np.int64), ("ts", np.int64), ("type_codes", np.int16),
+               ("results", np.float64), ("session_codes", np.int32))
+
+    def __init__(self, capacity=1024, _types=None, _sessions=None):
+        self._types = _types or _calc_type_categories()
+        self._sessions = _sessions or _session_categories()
+        self._size = 0
+        self._arrays = [np.empty(max(capacity, 1), dtype=dtype) for _, dtype in self._DTYPES]
+
+    def sibling(self, capacity=1024):
+        """An empty buffer sharing this one's category tables, so codes stay comparable."""
+        return RecordBuffer(capacity, self._types, self._sessions)
+
+    def clear(self):
+        """Drop every row and start new category tables, keeping the arrays' capacity.
+
+        For a buffer that is filled and emptied over and over (history's
+        pending writes), so its session table does not grow forever.
+        Siblings keep the old tables; their codes no longer compare with these.
+        """
+        self._size = 0
+        self._types = _calc_type_categories()
+        self._sessions = _session_categories()
+
+    @property
+    def calc_types(self):
+        """Category table for ``type_codes`` (labels; only ever appended to)."""
+        return self._types.values
+
+    @property
+    def sessions(self):
+        """Category table for ``session_codes`` (only ever appended to)."""
+        return self._sessions.values
+
+    ids = property(lambda self: self._arrays[0][:self._size])
+    ts = property(lambda self: self._arrays[1][:self._size])
+    type_codes = property(lambda self: self._arrays[2][:self._size])
+    results = property(lambda self: self._arrays[3][:self._size])
+    session_codes = property(lambda self: self._arrays[4][:self._size])
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def nbytes(self):
+        return sum(array.nbytes for array in self._arrays)
+
+    def _reserve(self, extra):
+        needed = self._size + extra
+        capacity = len(self._arrays[0])
+        if needed > capacity:
+            capacity = max(needed, 2 * capacity)
+            for i, array in enumerate(self._arrays):
+                grown = np.empty(capacity, dtype=array.dtype)
+                grown[:self._size] = array[:self._size]
+                self._arrays[i] = grown
+
+    def append(self, ts, calc_type, result, session=None, id=-1):
+        """Add one row (``calc_type`` a label or :class:`CalcType`)."""
+        self._reserve(1)
+        i = self._size
+        ids, stamps, types, results, sessions = self._arrays
+        ids[i] = id
+        stamps[i] = ts
+        types[i] = self._types.encode((calc_type,), np.int16)[0]
+        results[i] = result
+        sessions[i] = self._sessions.encode((session,), np.int32)[0]
+        self._size += 1
+
+    def extend(self, ids, ts, calc_types, results, sessions):
+        """Add columns of rows, e.g. one batch from ``HistoryStore.iter_columns``; ``ids`` may be ``None``."""
+        n = len(ts)
+        self._reserve(n)
+        rows = slice(self._size, self._size + n)
+        columns = (
+            -1 if ids is None else np.asarray(ids, dtype=np.int64),
+            np.asarray(ts, dtype=np.int64),
+            self._types.encode(calc_types, np.int16),
+            np.asarray(results, dtype=np.float64),
+            self._sessions.encode(sessions, np.int32),
+        )
+        for array, column in zip(self._arrays, columns):
+            array[rows] = column
+        self._size += n
+
+    def extend_records(self, records):
+        records = list(records)
+        self.extend(
+            [r.id if r.id is not None else -1 for r in records], [r.ts for r in records],
+            [r.calc_type for r in records], [r.result for r in records], [r.session for r in records],
+        )
+
+    def mask(self, calc_type=None, session=None):
+        """Boolean row mask for a calculator type and/or session."""
+        keep = np.ones(self._size, dtype=bool)
+        if calc_type is not None:
+            keep &= self.type_codes == self._types.codes.get(calc_type, -1)
+        if session is not None:
+            keep &= self.session_codes == self._sessions.codes.get(session, -2)
+        return keep
+
+    def __getitem__(self, i):
+        if not -self._size <= i < self._size:
+            raise IndexError("record index out of range")
+        i %= self._size
+        ids, stamps, types, results, sessions = (array[i].item() for array in self._arrays)
+        return Record(
+            ids if ids >= 0 else None, stamps, self._types.values[types], results,
+            self._sessions.values[sessions] if sessions >= 0 else None,
+        )
+
+    def __iter__(self):
+        return (self[i] for i in range(self._size))
+
+    def rows(self, indices=None):
+        """``(ts, label, result, session)`` tuples, the column order of a history insert."""
+        indices = range(self._size) if indices is None else indices
+        labels, sessions = self._types.values, self._sessions.values
+        stamps, types, results, codes = (
+            self.ts.tolist(), self.type_codes.tolist(), self.results.tolist(), self.session_codes.tolist(),
+        )
+        return [
+            (stamps[i], labels[types[i]], results[i], sessions[codes[i]] if codes[i] >= 0 else None)
+            for i in indices
+        ]
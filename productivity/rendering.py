@@ -0,0 +1,179 @@
+"""Server-side downsampling and WebGL switching for large charts.
+
+Plotly's SVG traces slow the browser down past a few thousand points, and
+every point is serialized into the page. Traces built here are reduced on
+the server to at most ``max_points`` before serialization, and switch to
+``Scattergl`` once the input is larger than ``WEBGL_THRESHOLD``:
+
+* lines use LTTB (largest triangle three buckets), which keeps the visual
+  shape of a series, or min/max binning, which keeps every extreme;
+* scatter clouds are thinned to one point per cell of a fixed grid, which
+  keeps the cloud's outline and outliers.
+
+Small inputs, and categorical x values, pass through untouched.
+"""
+import numpy as np
+import plotly.graph_objects as go
+
+WEBGL_THRESHOLD = 2_000
+MAX_POINTS = 4_000
+GRID_CELLS = 64
+
+
+def _numeric(values):
+    array = np.asarray(values)
+    return array.dtype.kind in "biuf"
+
+
+def _sorted_by_x(x, y):
+    if len(x) > 1 and np.any(np.diff(x) < 0):
+        order = np.argsort(x, kind="stable")
+        return x[order], y[order]
+    return x, y
+
+
+def minmax_bins(x, y, max_points=MAX_POINTS):
+    """Keep the min and max ``y`` of each of ``max_points // 2`` equal-count bins, in x order."""
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    n = len(x)
+    bins = max(max_points // 2, 1)
+    if n <= max_points:
+        return x, y
+    x, y = _sorted_by_x(x, y)
+    edges = np.linspace(0, n, bins + 1).astype(np.int64)
+    lo = np.minimum.reduceat(y, edges[:-1])
+    hi = np.maximum.reduceat(y, edges[:-1])
+    # Index of each bin's min and max, so the kept points stay in x order
+    bin_of = np.repeat(np.arange(bins), np.diff(edges))
+    is_lo = y == lo[bin_of]
+    is_hi = y == hi[bin_of]
+    first_lo = edges[:-1] + _first_true(is_lo, edges)
+    first_hi = edges[:-1] + _first_true(is_hi, edges)
+    keep = np.unique(np.concatenate([first_lo, first_hi]))
+    return x[keep], y[keep]
+
+
+def _first_true(mask, edges):
+    # Offset of the first True in each [edges[i], edges[i+1]) segment
+    positions = np.flatnonzero(mask)
+    starts = np.searchsorted(positions, edges[:-1])
+    return positions[starts] - edges[:-1]
+
+
+def lttb(x, y, max_points=MAX_POINTS):
+    """Largest-Triangle-Three-Buckets downsampling of an x-sorted series."""
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    n = len(x)
+    if n <= max_points or max_points < 3:
+        return x, y
+    x, y = _sorted_by_x(x, y)
+    edges = np.linspace(1, n - 1, max_points - 1).astype(np.int64)
+    # Mean of every bucket, used as the third vertex for the bucket before it
+    counts = np.diff(edges)
+    mean_x = np.add.reduceat(x[1:n - 1], edges[:-1] - 1) / counts
+    mean_y = np.add.reduceat(y[1:n - 1], edges[:-1] - 1) / counts
+
+    keep = np.empty(max_points, dtype=np.int64)
+    keep[0], keep[-1] = 0, n - 1
+    a = 0
+    for i in range(max_points - 2):
+        lo, hi = edges[i], edges[i + 1]
+        if i + 1 < max_points - 2:
+            cx, cy = mean_x[i + 1], mean_y[i + 1]
+        else:
+            cx, cy = x[n - 1], y[n - 1]
+        ax, ay = x[a], y[a]
+        area = np.abs((ax - cx) * (y[lo:hi] - ay) - (ax - x[lo:hi]) * (cy - ay))
+        a = lo + int(np.argmax(area))
+        keep[i + 1] = a
+    return x[keep], y[keep]
+
+
+def grid_thin(x, y, cells=GRID_CELLS):
+    """Keep one point per occupied cell of a ``cells`` x ``cells`` grid."""
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    if len(x) <= cells:
+        return x, y
+
+    def cell(values):
+        lo, hi = values.min(), values.max()
+        scale = (cells - 1) / (hi - lo) if hi > lo else 0.0
+        return ((values - lo) * scale).astype(np.int64)
+
+    # First point (in input order) landing in each cell
+    first = np.full(cells * cells, len(x), dtype=np.int64)
+    np.minimum.at(first, cell(x) * cells + cell(y), np.arange(len(x)))
+    keep = np.sort(first[first < len(x)])
+    return x[keep], y[keep]
+
+
+def reduce_points(x, y, max_points=MAX_POINTS, method="lttb"):
+    """Downsample a series with ``method`` ("lttb", "minmax" or "grid").
+
+    Non-finite points are dropped first; they cannot be drawn anyway.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    finite = np.isfinite(x) & np.isfinite(y)
+    if not finite.all():
+        x, y = x[finite], y[finite]
+    if method == "grid":
+        return grid_thin(x, y, max(int(np.sqrt(max_points)), 2))
+    if method == "minmax":
+        return minmax_bins(x, y, max_points)
+    return lttb(x, y, max_points)
+
+
+def _trace(x, y, max_points, method, **kwargs):
+    n = len(y)
+    if n > max_points and _numeric(x) and _numeric(y):
+        x, y = reduce_points(x, y, max_points, method)
+    trace = go.Scattergl if n > WEBGL_THRESHOLD else go.Scatter
+    return trace(x=x, y=y, **kwargs)
+
+
+def line_trace(x, y, max_points=MAX_POINTS, method="lttb", **kwargs):
+    """A line trace for ``x``/``y`` of any length; kwargs go to the trace."""
+    return _trace(x, y, max_points, method, **kwargs)
+
+
+def scatter_trace(x, y, max_points=MAX_POINTS, **kwargs):
+    """A marker trace for a point cloud of any size; kwargs go to the trace."""
+    kwargs.setdefault("mode", "markers")
+    return _trace(x, y, max_points, "grid", **kwargs)
+
+
+class DownsampleBuffer:
+    """Bounded accumulator of downsampled points from a chunked stream.
+
+    Each chunk is reduced as it arrives; once the buffer holds more than
+    twice ``max_points`` it is reduced again, so memory stays bounded no
+    matter how many rows stream through.
+    """
+
+    def __init__(self, max_points=MAX_POINTS, method="minmax"):
+        self.max_points = max_points
+        self.method = method
+        self.rows = 0
+        self._x = []
+        self._y = []
+        self._size = 0
+
+    def add(self, x, y):
+        self.rows += len(y)
+        x, y = reduce_points(x, y, self.max_points, self.method)
+        self._x.append(np.asarray(x, dtype=np.float64))
+        self._y.append(np.asarray(y, dtype=np.float64))
+        self._size += len(y)
+        if self._size > 2 * self.max_points:
+            x, y = self.points()
+            self._x, self._y = [x], [y]
+            self._size = len(y)
+
+    def points(self):
+        if not self._x:
+            return np.empty(0), np.empty(0)
+        return reduce_points(np.concatenate(self._x), np.concatenate(self._y), self.max_points, self.method)
@@ -0,0 +1,235 @@
+"""Hierarchical roll-up of productivity (site -> line -> cell -> machine).
+
+A :class:`Rollup` takes a flat table with one row per entity reading (any
+number of rows per machine) and keeps, for every node at every level of
+the hierarchy, the row count and the sum of each input column. Every
+productivity ratio at a node is then the calculator applied to those
+sums: a line's labour productivity is its total output over its total
+labour input, never the mean of its machines' ratios. Each calculator
+sums only the rows where all of its inputs are present, so a blank
+machine input leaves that row out of machine productivity (and a node
+with no such rows gets NaN) without dropping it from the others.
+
+Raw rows are grouped once, by the full hierarchy key; coarser levels are
+built from those per-machine sums, not by grouping the rows again. Updates
+are incremental: :meth:`Rollup.add` folds in new rows and
+:meth:`Rollup.replace` swaps one machine's data for new figures; either
+way only the changed machines' ancestors have their sums adjusted (by the
+difference), and ratios are recomputed lazily, only for the nodes that
+changed.
+
+EOQ is not a ratio and is not rolled up.
+"""
+import numpy as np
+import pandas as pd
+
+from productivity import engine
+
+DEFAULT_LEVELS = ("site", "line", "cell", "machine")
+
+# Calculators that roll up as ratio of sums (EOQ is not one)
+CALCULATORS = tuple(calc_type for calc_type in engine.CALCULATORS if calc_type != "Economic Order Quantity (EOQ)")
+INPUTS = tuple(dict.fromkeys(name for calc_type in CALCULATORS for name in engine.CALCULATORS[calc_type][1]))
+
+
+class _Level:
+    """Sums for one level: one row per node, plus ratios cached until the node changes."""
+
+    def __init__(self, depth, width):
+        self.depth = depth
+        self.index = {}
+        self.keys = []
+        self.counts = np.zeros(0, dtype=np.int64)
+        self.sums = np.zeros((0, width))
+        self.dirty = np.zeros(0, dtype=bool)
+        self.ratios = None
+
+    def rows_for(self, keys):
+        """Row numbers of ``keys``, adding nodes not seen before."""
+        new = [key for key in dict.fromkeys(keys) if key not in self.index]
+        if new:
+            start = len(self.keys)
+            for i, key in enumerate(new):
+                self.index[key] = start + i
+            self.keys.extend(new)
+            grow = len(new)
+            self.counts = np.concatenate([self.counts, np.zeros(grow, dtype=np.int64)])
+            self.sums = np.vstack([self.sums, np.zeros((grow, self.sums.shape[1]))])
+            self.dirty = np.concatenate([self.dirty, np.ones(grow, dtype=bool)])
+        return np.fromiter((self.index[key] for key in keys), dtype=np.int64, count=len(keys))
+
+    def apply(self, keys, counts, sums):
+        rows = self.rows_for(keys)
+        np.add.at(self.counts, rows, counts)
+        np.add.at(self.sums, rows, sums)
+        self.dirty[rows] = True
+
+
+class Rollup:
+    """Incrementally maintained sums and ratios at every level of a hierarchy."""
+
+    def __init__(self, levels=DEFAULT_LEVELS, inputs=None):
+        if not levels:
+            raise ValueError("need at least one hierarchy level")
+        self.levels = tuple(levels)
+        self.inputs = tuple(inputs) if inputs is not None else None
+        self.calculators = ()
+        self._levels = None
+
+    @classmethod
+    def from_table(cls, table, levels=DEFAULT_LEVELS, inputs=None):
+        rollup = cls(levels, inputs)
+        rollup.add(table)
+        return rollup
+
+    @classmethod
+    def from_file(cls, source, levels=DEFAULT_LEVELS, inputs=None, chunk_size=None):
+        """Roll up a CSV/Parquet file chunk by chunk, reading only the hierarchy and input columns."""
+        from productivity import ingest
+
+        if inputs is None:
+            names = ingest.read_columns(source)
+            inputs = tuple(name for name in INPUTS if name in names)
+        rollup = cls(levels, inputs)
+        for chunk in ingest.iter_chunks(source, chunk_size or ingest.DEFAULT_CHUNK_SIZE, [*levels, *inputs]):
+            rollup.add(chunk)
+        return rollup
+
+    def _start(self, table):
+        if self.inputs is None:
+            self.inputs = tuple(name for name in INPUTS if name in table.columns)
+        missing = [name for name in (*self.levels, *self.inputs) if name not in table.columns]
+        if missing:
+            raise ValueError(f"missing columns {missing}")
+        self.calculators = tuple(
+            calc_type for calc_type in CALCULATORS
+            if all(name in self.inputs for name in engine.CALCULATORS[calc_type][1])
+        )
+        if not self.calculators:
+            raise ValueError(f"no calculator can be computed from {list(self.inputs)}")
+        # Sum columns: each input over the rows that have it, then per
+        # calculator its inputs over the rows that have all of them, and
+        # the number of those rows
+        self._columns = {}
+        for name in self.inputs:
+            self._columns[None, name] = len(self._columns)
+        for calc_type in self.calculators:
+            for name in (*engine.CALCULATORS[calc_type][1], None):
+                self._columns[calc_type, name] = len(self._columns)
+        self._levels = [_Level(depth, len(self._columns)) for depth in range(len(self.levels))]
+
+    def _leaf_sums(self, table):
+        # The only pass over raw rows: group by the full hierarchy key
+        frame = {name: table[name] for name in self.levels}
+        values = {name: table[name] for name in self.inputs}
+        for (calc_type, name), column in self._columns.items():
+            if calc_type is None:
+                frame[column] = values[name]
+                continue
+            valid = pd.concat([values[n].notna() for n in engine.CALCULATORS[calc_type][1]], axis=1).all(axis=1)
+            frame[column] = valid.astype(np.float64) if name is None else values[name].where(valid)
+        frame = pd.DataFrame(frame)
+        grouped = frame.groupby(list(self.levels), sort=False, observed=True, dropna=False)
+        sums = grouped[list(self._columns.values())].sum()
+        counts = grouped.size().reindex(sums.index)
+        return sums, counts
+
+    def _apply(self, sums, counts):
+        """Add per-leaf deltas (a frame indexed by the full key) to the leaves and all their ancestors."""
+        for depth in range(len(self.levels) - 1, -1, -1):
+            if depth < len(self.levels) - 1:
+                by_parent = sums.groupby(level=list(range(depth + 1)), sort=False)
+                sums, counts = by_parent.sum(), counts.groupby(level=list(range(depth + 1)), sort=False).sum()
+            keys = [key if isinstance(key, tuple) else (key,) for key in sums.index]
+            self._levels[depth].apply(keys, counts.to_numpy(), sums.to_numpy(dtype=np.float64))
+
+    def add(self, table):
+        """Fold in more rows (e.g. the next chunk of a file); returns the number of machines touched."""
+        if self._levels is None:
+            self._start(table)
+        sums, counts = self._leaf_sums(table)
+        self._apply(sums, counts)
+        return len(sums)
+
+    def replace(self, table):
+        """Replace the data of every leaf present in ``table`` with the rows given there."""
+        if self._levels is None:
+            return self.add(table)
+        sums, counts = self._leaf_sums(table)
+        leaves = self._levels[-1]
+        keys = [key if isinstance(key, tuple) else (key,) for key in sums.index]
+        known = [leaves.index.get(key) for key in keys]
+        old_sums = np.array([leaves.sums[row] if row is not None else np.zeros(len(self._columns)) for row in known])
+        old_counts = np.array([leaves.counts[row] if row is not None else 0 for row in known], dtype=np.int64)
+        delta = sums - old_sums.reshape(sums.shape)
+        self._apply(delta, counts - old_counts)
+        return len(sums)
+
+    def remove(self, *key):
+        """Drop one leaf's data (its ancestors lose its sums; the empty node stays, with zero rows)."""
+        leaves = self._levels[-1]
+        row = leaves.index[key]
+        index = pd.MultiIndex.from_tuples([key], names=self.levels) if len(key) > 1 else pd.Index([key[0]])
+        sums = pd.DataFrame(-leaves.sums[row:row + 1], index=index)
+        self._apply(sums, pd.Series([-leaves.counts[row]], index=index))
+
+    def _ratios(self, level):
+        # Only nodes that changed since the last call are recomputed
+        if level.ratios is None or len(level.ratios) < len(level.keys):
+            grown = np.full((len(level.keys), len(self.calculators)), np.nan)
+            if level.ratios is not None:
+                grown[:len(level.ratios)] = level.ratios
+            level.ratios = grown
+        rows = np.flatnonzero(level.dirty)
+        if len(rows):
+            for j, calc_type in enumerate(self.calculators):
+                columns = {name: level.sums[rows, self._columns[calc_type, name]]
+                           for name in engine.CALCULATORS[calc_type][1]}
+                valid = level.sums[rows, self._columns[calc_type, None]] > 0
+                level.ratios[rows, j] = np.where(valid, engine.compute(calc_type, columns), np.nan)
+            level.dirty[rows] = False
+        return level.ratios
+
+    def _depth(self, level):
+        if level not in self.levels:
+            raise KeyError(f"unknown level {level!r}; levels are {list(self.levels)}")
+        return self.levels.index(level)
+
+    def level(self, level):
+        """One row per node of ``level`` (in order of first appearance): row count, input sums and one column per calculator."""
+        state = self._levels[self._depth(level)]
+        ratios = self._ratios(state)
+        names = list(self.levels[:state.depth + 1])
+        index = pd.MultiIndex.from_tuples(state.keys, names=names) if len(names) > 1 \
+            else pd.Index([key[0] for key in state.keys], name=names[0])
+        frame = pd.DataFrame(state.sums[:, :len(self.inputs)], index=index, columns=list(self.inputs))
+        frame.insert(0, "rows", state.counts)
+        for j, calc_type in enumerate(self.calculators):
+            frame[calc_type] = ratios[:, j]
+        return frame
+
+    def node(self, *key):
+        """Row count, sums and ratios of one node, e.g. ``node("North", "Line 2")``."""
+        state = self._levels[len(key) - 1]
+        row = state.index[key]
+        ratios = self._ratios(state)[row]
+        return {
+            "rows": int(state.counts[row]),
+            **{name: float(value) for name, value in zip(self.inputs, state.sums[row, :len(self.inputs)])},
+            **{calc_type: float(value) for calc_type, value in zip(self.calculators, ratios)},
+        }
+
+    def all_levels(self):
+        """Every level's frame, concatenated, with a ``level`` column (handy for export).
+
+        The hierarchy columns come first; a coarser level's rows leave the
+        finer ones empty.
+        """
+        frames = []
+        for level in self.levels:
+            frame = self.level(level).reset_index()
+            frame.insert(0, "level", level)
+            # object keeps integer keys integers once shorter rows add gaps
+            frames.append(frame.astype({name: object for name in self.levels if name in frame}))
+        columns = ["level", *self.levels, "rows", *self.inputs, *self.calculators]
+        return pd.concat(frames, ignore_index=True)[columns]
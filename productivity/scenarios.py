@@ -0,0 +1,251 @@
+"""Parallel what-if sweeps of the calculators across many sites.
+
+A sweep applies every scenario - a set of relative changes to some inputs,
+e.g. ``{"human": -0.10, "energy": +0.05}`` - to every site's baseline inputs
+and evaluates a calculator on the result. Scenarios come from a grid
+(:func:`grid_scenarios`, the cartesian product of per-input changes) or
+from sampled distributions (:func:`sample_scenarios`).
+
+The scenario axis is split into blocks that run on a process pool; each
+block is one vectorized ``(scenarios, sites)`` evaluation, and blocks are
+yielded as they finish so callers can show partial results. The assembled
+output is a :class:`SweepResult` cube of shape ``(scenarios, sites)``.
+"""
+import atexit
+import itertools
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, as_completed, wait
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from productivity import engine
+
+DEFAULT_BLOCK_SIZE = 256
+
+
+def grid_scenarios(changes):
+    """Cartesian product of per-input relative changes.
+
+    ``changes`` maps input names to sequences of changes, e.g.
+    ``{"human": [-0.1, 0.0], "energy": [0.0, 0.05]}``. Returns
+    ``(factor_names, array of shape (scenarios, factors))``.
+    """
+    names = list(changes)
+    grid = np.array(list(itertools.product(*(changes[n] for n in names))), dtype=np.float64)
+    return names, grid.reshape(-1, len(names))
+
+
+def sample_scenarios(distributions, count, seed=0):
+    """Draw ``count`` scenarios from per-input change distributions.
+
+    ``distributions`` maps input names to ``(kind, a, b)``: ``("normal",
+    mean, sd)`` or ``("uniform", low, high)``.
+    """
+    rng = np.random.default_rng(seed)
+    names = list(distributions)
+    columns = []
+    for name in names:
+        kind, a, b = distributions[name]
+        if kind == "normal":
+            columns.append(rng.normal(a, b, count))
+        elif kind == "uniform":
+            columns.append(rng.uniform(a, b, count))
+        else:
+            raise ValueError(f"unknown distribution {kind!r} for {name}")
+    return names, np.column_stack(columns) if columns else np.empty((count, 0))
+
+
+class SweepResult:
+    """Result cube ``values[scenario, site]`` with the scenarios that produced it."""
+
+    def __init__(self, calc_type, factor_names, scenarios, values, sites=None):
+        self.calc_type = calc_type
+        self.factor_names = list(factor_names)
+        self.scenarios = scenarios
+        self.values = values
+        self.sites = np.arange(values.shape[1]) if sites is None else np.asarray(sites)
+
+    def take(self, rows):
+        """Sub-cube of the scenarios selected by ``rows`` (a mask or indices)."""
+        return SweepResult(self.calc_type, self.factor_names, self.scenarios[rows], self.values[rows], self.sites)
+
+    def select(self, **changes):
+        """Scenarios whose factors equal the given changes, e.g. ``select(human=-0.1)``."""
+        mask = np.ones(len(self.scenarios), dtype=bool)
+        for name, value in changes.items():
+            mask &= np.isclose(self.scenarios[:, self.factor_names.index(name)], value)
+        return self.take(mask)
+
+    def site(self, site):
+        """Results of every scenario for one site label."""
+        return self.values[:, np.flatnonzero(self.sites == site)[0]]
+
+    def summary(self):
+        """Per-scenario mean/min/max across sites as a dict of columns."""
+        columns = {name: self.scenarios[:, i] for i, name in enumerate(self.factor_names)}
+        columns.update(mean=self.values.mean(axis=1), min=self.values.min(axis=1), max=self.values.max(axis=1))
+        return columns
+
+    def to_frame(self):
+        """Long-format DataFrame: one row per (scenario, site)."""
+        import pandas as pd
+
+        n_scenarios, n_sites = self.values.shape
+        frame = pd.DataFrame({
+            "scenario": np.repeat(np.arange(n_scenarios), n_sites),
+            "site": np.tile(self.sites, n_scenarios),
+        })
+        for i, name in enumerate(self.factor_names):
+            frame[name] = np.repeat(self.scenarios[:, i], n_sites)
+        frame["result"] = self.values.ravel()
+        return frame
+
+
+def evaluate_block(calc_type, base, factor_names, scenarios):
+    """Evaluate ``scenarios`` (rows of relative changes) over all sites at once."""
+    func, inputs = engine.CALCULATORS[calc_type]
+    args = []
+    for name in inputs:
+        column = np.asarray(base[name], dtype=np.float64)[np.newaxis, :]
+        if name in factor_names:
+            change = scenarios[:, factor_names.index(name)][:, np.newaxis]
+            column = column * (1 + change)
+        args.append(column)
+    return np.broadcast_to(func(*args), (len(scenarios), args[0].shape[1]))
+
+
+def _evaluate_in_worker(calc_type, base, factor_names, start, scenarios, shm_name, shape):
+    # Results go straight into the caller's shared output array, so only
+    # block offsets travel back over the pipe.
+    memory = shared_memory.SharedMemory(name=shm_name)
+    try:
+        out = np.ndarray(shape, dtype=np.float64, buffer=memory.buf)
+        out[start:start + len(scenarios)] = evaluate_block(calc_type, base, factor_names, scenarios)
+        del out
+    finally:
+        memory.close()
+    return start, len(scenarios)
+
+
+_pool = None
+_pool_workers = 0
+_pool_lock = threading.RLock()
+
+
+def get_pool(workers):
+    """Process-wide worker pool, started once and reused by every sweep.
+
+    Workers are spawned rather than forked (the app process is threaded),
+    which makes starting them the expensive part of a small sweep. There is
+    one pool: asking for another size replaces it, and the old one exits
+    once the blocks already given to it are done.
+    """
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is None or _pool_workers != workers:
+            if _pool is None:
+                atexit.register(_shutdown_pool)
+            else:
+                _pool.shutdown(wait=False)
+            _pool = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn"))
+            _pool_workers = workers
+        return _pool
+
+
+def _submit(workers, calls):
+    # Under the lock, so another size asked for meanwhile cannot shut the pool down mid-way
+    with _pool_lock:
+        pool = get_pool(workers)
+        return [pool.submit(*call) for call in calls]
+
+
+def _shutdown_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(cancel_futures=True)
+            _pool = None
+
+
+def iter_sweep(calc_type, base, factor_names, scenarios, workers=None,
+               block_size=DEFAULT_BLOCK_SIZE):
+    """Yield ``(start, block)`` as each block of scenarios finishes.
+
+    ``block`` holds results for ``scenarios[start:start + len(block)]``.
+    ``base`` maps input names to per-site arrays. ``workers=1`` evaluates in
+    this process; otherwise a process pool of ``workers`` (default: CPU
+    count) is used and blocks arrive in completion order.
+    """
+    _, inputs = engine.CALCULATORS[calc_type]
+    unknown = [name for name in factor_names if name not in inputs]
+    if unknown:
+        raise ValueError(f"{calc_type} has no inputs named {unknown}")
+    base = {name: np.asarray(base[name], dtype=np.float64) for name in inputs}
+    starts = range(0, len(scenarios), block_size)
+    workers = workers or os.cpu_count() or 1
+
+    if workers == 1 or len(starts) == 1:
+        for start in starts:
+            yield start, evaluate_block(calc_type, base, factor_names, scenarios[start:start + block_size])
+        return
+
+    shape = (len(scenarios), len(base[inputs[0]]))
+    memory = shared_memory.SharedMemory(create=True, size=max(shape[0] * shape[1] * 8, 1))
+    out = np.ndarray(shape, dtype=np.float64, buffer=memory.buf)
+    futures = []
+    try:
+        futures = _submit(workers, [
+            (_evaluate_in_worker, calc_type, base, factor_names, start,
+             scenarios[start:start + block_size], memory.name, shape)
+            for start in starts
+        ])
+        for future in as_completed(futures):
+            start, count = future.result()
+            yield start, out[start:start + count].copy()
+    finally:
+        # Workers must be done with the array before it is unlinked.
+        for future in futures:
+            future.cancel()
+        wait(futures)
+        del out
+        memory.close()
+        memory.unlink()
+
+
+def run_sweep(calc_type, base, factor_names, scenarios, workers=None,
+              block_size=DEFAULT_BLOCK_SIZE, sites=None, on_block=None):
+    """Run a whole sweep and assemble the :class:`SweepResult` cube.
+
+    ``on_block(result, finished)`` is called as each block lands, with the
+    cube filled so far and a mask of its finished scenarios
+    (``result.take(finished)`` is the partial cube).
+    """
+    n_sites = len(np.asarray(base[engine.CALCULATORS[calc_type][1][0]]))
+    result = SweepResult(calc_type, factor_names, scenarios, np.full((len(scenarios), n_sites), np.nan), sites)
+    finished = np.zeros(len(scenarios), dtype=bool)
+    for start, block in iter_sweep(calc_type, base, factor_names, scenarios, workers, block_size):
+        result.values[start:start + len(block)] = block
+        finished[start:start + len(block)] = True
+        if on_block:
+            on_block(result, finished)
+    return result
+
+
+def load_sites(source, columns, site_column=None):
+    """Read per-site baseline inputs from a CSV or Parquet file.
+
+    ``columns`` maps input names to file columns. Returns ``(base, sites)``:
+    arrays keyed by input name, and the site labels (row numbers when no
+    ``site_column`` is given).
+    """
+    import pandas as pd
+
+    from productivity import ingest
+
+    wanted = list(dict.fromkeys(list(columns.values()) + ([site_column] if site_column else [])))
+    frame = pd.concat(list(ingest.iter_chunks(source, columns=wanted)), ignore_index=True)
+    sites = frame[site_column].to_numpy() if site_column else np.arange(len(frame))
+    return {name: frame[column].to_numpy(dtype=np.float64) for name, column in columns.items()}, sites
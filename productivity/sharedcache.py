@@ -0,0 +1,198 @@
+"""Cross-process cache for multi-worker deployments.
+
+Every app worker (see :mod:`productivity.deploy`) is a separate Python
+process with its own :mod:`productivity.cache`. A :class:`SharedCache`
+lets them reuse each other's work: a key-value table in a local SQLite
+file (WAL mode, so readers never wait for a writer) holding pickled
+values under a byte budget. Once over the budget, the least recently used
+entries are deleted. Every worker opens the file named by
+``PRODUCTIVITY_SHARED_CACHE`` (budget ``PRODUCTIVITY_SHARED_CACHE_MB``,
+default 256); without it there is no shared cache and each process caches
+on its own.
+
+Only values that cost more to build than to fetch belong here, so
+:mod:`productivity.cache` keeps scalar results (microseconds to compute)
+per process and shares figures and Monte Carlo simulations. A cache must
+never break the app: a lookup that fails (the file locked for too long, a
+full disk) counts as a miss.
+
+Values are unpickled, so whoever can write the file can run code in every
+worker: :class:`SharedCache` refuses a file (or its WAL) that belongs to
+another user or that others may write, and creates a new one private (0600).
+"""
+import atexit
+import os
+import pickle
+import sqlite3
+import stat
+import sys
+import threading
+import time
+
+MB = 1024 * 1024
+DEFAULT_MAX_BYTES = int(float(os.environ.get("PRODUCTIVITY_SHARED_CACHE_MB", 256)) * MB)
+TOUCH_INTERVAL = 60.0  # seconds before a hit refreshes an entry's last-used time
+TRIM_EVERY = 64  # writes between checks of the total size
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    used REAL NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS entries_used ON entries (used);
+"""
+
+_MISSING = object()
+
+
+def check_owner(path):
+    """Raise PermissionError unless the cache file (and its WAL files, where they exist) is only writable by us."""
+    for name in (path, path + "-wal", path + "-shm"):
+        try:
+            info = os.stat(name)
+        except FileNotFoundError:
+            continue
+        if hasattr(os, "getuid") and info.st_uid != os.getuid():
+            raise PermissionError(f"shared cache {name!r} belongs to another user; refusing to use it")
+        if info.st_mode & (stat.S_IWGRP | stat.S_IWOTH):
+            raise PermissionError(f"shared cache {name!r} is writable by other users; refusing to use it")
+
+
+class SharedCache:
+    """Pickled values in a SQLite file shared by every process that opens it, trimmed to ``max_bytes``."""
+
+    def __init__(self, path, max_bytes=DEFAULT_MAX_BYTES, timeout=5.0):
+        if max_bytes <= 0:
+            raise ValueError("max_bytes must be positive")
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.errors = 0
+        self.last_error = None
+        self._lock = threading.Lock()
+        try:
+            os.close(os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600))
+        except FileExistsError:
+            pass
+        check_owner(path)
+        self._conn = sqlite3.connect(path, timeout=timeout, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=OFF")  # losing the last writes on a crash only costs recomputation
+        self._conn.executescript(_SCHEMA)
+
+    @staticmethod
+    def _key(key):
+        return key if isinstance(key, str) else repr(key)
+
+    def _failed(self, exc):
+        self.errors += 1
+        self.last_error = str(exc)
+
+    def get(self, key, default=None):
+        key = self._key(key)
+        with self._lock:
+            try:
+                row = self._conn.execute("SELECT value, used FROM entries WHERE key = ?", (key,)).fetchone()
+                if row is not None and time.time() - row[1] > TOUCH_INTERVAL:
+                    self._conn.execute("UPDATE entries SET used = ? WHERE key = ?", (time.time(), key))
+            except sqlite3.Error as exc:
+                self._failed(exc)
+                row = None
+            if row is None:
+                self.misses += 1
+                return default
+            self.hits += 1
+        return pickle.loads(row[0])
+
+    def put(self, key, value):
+        blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        if len(blob) > self.max_bytes:
+            return
+        with self._lock:
+            try:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO entries (key, value, size, used) VALUES (?, ?, ?, ?)",
+                    (self._key(key), blob, len(blob), time.time()),
+                )
+                self.writes += 1
+                if self.writes % TRIM_EVERY == 0:
+                    self._trim()
+            except sqlite3.Error as exc:
+                self._failed(exc)
+
+    def _trim(self):
+        # Keep the most recently used entries that fit in the budget
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total > self.max_bytes:
+            self._conn.execute(
+                "DELETE FROM entries WHERE key IN (SELECT key FROM "
+                "(SELECT key, SUM(size) OVER (ORDER BY used DESC) AS running FROM entries) WHERE running > ?)",
+                (self.max_bytes,),
+            )
+
+    def get_or_compute(self, key, compute):
+        """Return the stored value for ``key``, calling ``compute()`` and storing its result on a miss.
+
+        As with :meth:`productivity.cache.LRUCache.get_or_compute`, two
+        workers missing on the same key at once may both compute it.
+        """
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = compute()
+            self.put(key, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM entries")
+            self.hits = self.misses = self.writes = self.errors = 0
+
+    def stats(self):
+        with self._lock:
+            try:
+                entries, size = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+            except sqlite3.Error as exc:
+                self._failed(exc)
+                entries = size = None
+        lookups = self.hits + self.misses
+        return {
+            "path": self.path,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "writes": self.writes,
+            "errors": self.errors,
+            "entries": entries,
+            "bytes": size,
+            "max_bytes": self.max_bytes,
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    """Process-wide handle on the cache file named by ``PRODUCTIVITY_SHARED_CACHE``, or None when unset or unusable."""
+    global _store
+    path = os.environ.get("PRODUCTIVITY_SHARED_CACHE")
+    if not path:
+        return None
+    with _store_lock:
+        if _store is None:
+            try:
+                _store = SharedCache(path)
+            except (OSError, sqlite3.Error) as exc:
+                sys.stderr.write(f"shared cache disabled: {exc}\n")
+                _store = False  # not retried: each process then caches on its own
+                return None
+            atexit.register(_store.close)
+        return _store or None
@@ -0,0 +1,248 @@
+"""Incremental time-bucketed trend analytics over calculation history.
+
+A :class:`TrendAggregator` keeps, for every calculator type and time bucket,
+a running count, sum, min, max and a small quantile sketch. New results are
+folded in as they arrive (or pulled from the history store past a
+watermark), so the trend view never rescans raw history: rolling means and
+period-over-period change are derived from the per-bucket aggregates.
+"""
+import bisect
+import math
+import threading
+from datetime import datetime, timezone
+
+import numpy as np
+
+BUCKETS = {
+    "Minute": 60,
+    "Hour": 3600,
+    "Day": 86400,
+    "Week": 7 * 86400,
+}
+
+
+SKETCH_ALPHA = 0.01
+_LOG_GAMMA = math.log((1 + SKETCH_ALPHA) / (1 - SKETCH_ALPHA))
+
+
+def _sketch_index(values):
+    return np.ceil(np.log(np.abs(values)) / _LOG_GAMMA).astype(np.int64)
+
+
+def _sketch_bins(groups, values, mask):
+    """Count values per (group, sketch bin) for the values selected by ``mask``.
+
+    Returns parallel lists of group ids, bin keys and counts.
+    """
+    if not mask.any():
+        return [], [], []
+    index = _sketch_index(values[mask])
+    low = int(index.min())
+    width = int(index.max()) - low + 1
+    pairs, counts = np.unique(groups[mask].astype(np.int64) * width + (index - low), return_counts=True)
+    return (pairs // width).tolist(), (pairs % width + low).tolist(), counts.tolist()
+
+
+class QuantileSketch:
+    """Log-bucketed histogram with bounded relative error.
+
+    Values land in bins of width ``SKETCH_ALPHA`` relative to their size
+    (DDSketch-style), so any percentile is answered within that
+    relative error using a few hundred counters at most, however many
+    values were added.
+    """
+
+    __slots__ = ("bins", "zeros", "negatives", "count")
+
+    def __init__(self):
+        self.bins = {}
+        self.zeros = 0
+        self.negatives = {}
+        self.count = 0
+
+    def add_many(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        self.count += len(values)
+        self.zeros += int((values == 0).sum())
+        no_groups = np.zeros(len(values), dtype=np.int64)
+        for store, mask in ((self.bins, values > 0), (self.negatives, values < 0)):
+            for _, key, n in zip(*_sketch_bins(no_groups, values, mask)):
+                store[key] = store.get(key, 0) + n
+
+    @staticmethod
+    def _value(key):
+        # Midpoint (in relative terms) of the bin's [gamma^(k-1), gamma^k] range
+        return 2 * math.exp(key * _LOG_GAMMA) / (1 + math.exp(_LOG_GAMMA))
+
+    def quantile(self, q):
+        if not self.count:
+            return 0.0
+        rank = q * (self.count - 1)
+        seen = 0
+        for key in sorted(self.negatives, reverse=True):
+            seen += self.negatives[key]
+            if seen > rank:
+                return -self._value(key)
+        seen += self.zeros
+        if seen > rank:
+            return 0.0
+        for key in sorted(self.bins):
+            seen += self.bins[key]
+            if seen > rank:
+                return self._value(key)
+        return self._value(max(self.bins)) if self.bins else 0.0
+
+
+class BucketStats:
+    __slots__ = ("count", "total", "minimum", "maximum", "sketch", "_quantiles")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.minimum = math.inf
+        self.maximum = -math.inf
+        self.sketch = QuantileSketch()
+        self._quantiles = {}
+
+    def merge(self, count, total, minimum, maximum, zeros):
+        self.count += count
+        self.total += total
+        self.minimum = min(self.minimum, minimum)
+        self.maximum = max(self.maximum, maximum)
+        self.sketch.count += count
+        self.sketch.zeros += zeros
+        self._quantiles.clear()
+
+    def quantile(self, q):
+        # Closed buckets never change, so their percentiles are computed once.
+        if q not in self._quantiles:
+            self._quantiles[q] = self.sketch.quantile(q)
+        return self._quantiles[q]
+
+
+class TrendAggregator:
+    """Per calculator type, per time bucket running aggregates."""
+
+    def __init__(self, bucket_seconds=3600):
+        self.bucket_micros = int(bucket_seconds * 1_000_000)
+        self.series = {}
+        self._keys = {}  # calc_type -> its bucket keys, kept sorted
+        self.watermark = 0
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+
+    def add(self, calc_type, ts_micros, value):
+        self.add_batch([calc_type], [ts_micros], [value])
+
+    def add_batch(self, calc_types, ts_micros, values):
+        """Fold a batch of results into their buckets with one grouping pass."""
+        values = np.asarray(values, dtype=np.float64)
+        if not len(values):
+            return
+        type_names, type_codes = np.unique(np.asarray(calc_types, dtype=object), return_inverse=True)
+        buckets = np.asarray(ts_micros, dtype=np.int64) // self.bucket_micros
+        first_bucket = int(buckets.min())
+        span = int(buckets.max()) - first_bucket + 1
+        groups, inverse = np.unique(type_codes.ravel() * span + (buckets - first_bucket), return_inverse=True)
+        inverse = inverse.ravel()
+
+        counts = np.bincount(inverse, minlength=len(groups))
+        totals = np.bincount(inverse, weights=values, minlength=len(groups))
+        minima = np.full(len(groups), np.inf)
+        maxima = np.full(len(groups), -np.inf)
+        np.minimum.at(minima, inverse, values)
+        np.maximum.at(maxima, inverse, values)
+        zeros = np.bincount(inverse[values == 0], minlength=len(groups))
+        bins = [_sketch_bins(inverse, values, values > 0), _sketch_bins(inverse, values, values < 0)]
+
+        with self._lock:
+            touched = []
+            for g, key in enumerate(groups.tolist()):
+                calc_type = type_names[key // span]
+                series = self.series.setdefault(calc_type, {})
+                bucket = first_bucket + key % span
+                stats = series.get(bucket)
+                if stats is None:
+                    stats = series[bucket] = BucketStats()
+                    keys = self._keys.setdefault(calc_type, [])
+                    if not keys or bucket > keys[-1]:
+                        keys.append(bucket)  # nearly always: history arrives in time order
+                    else:
+                        bisect.insort(keys, bucket)
+                stats.merge(int(counts[g]), float(totals[g]), float(minima[g]), float(maxima[g]), int(zeros[g]))
+                touched.append(stats)
+            for attr, (group_ids, keys, n) in zip(("bins", "negatives"), bins):
+                for g, key, count in zip(group_ids, keys, n):
+                    store = getattr(touched[g].sketch, attr)
+                    store[key] = store.get(key, 0) + count
+
+    def refresh(self, store, batch_size=50_000):
+        """Pull history rows added since the last refresh; returns how many."""
+        pulled = 0
+        with self._refresh_lock:
+            while True:
+                rows = store.rows_after(self.watermark, batch_size)
+                if not rows:
+                    return pulled
+                ids, ts, calc_types, results = zip(*rows)
+                self.add_batch(calc_types, ts, results)
+                self.watermark = ids[-1]
+                pulled += len(rows)
+                if len(rows) < batch_size:
+                    return pulled
+
+    def summary(self, calc_type, window=7, percentiles=(50, 90, 99), last=500):
+        """Rows for the latest ``last`` buckets of ``calc_type``, oldest first.
+
+        Each row has the bucket start, count, mean, min, max, the requested
+        percentiles, a count-weighted rolling mean over ``window`` buckets and
+        the percentage change in mean from the previous bucket.
+        """
+        # Everything read from the buckets is read under the lock: add_batch
+        # keeps updating the newest ones (and their sketches) meanwhile
+        with self._lock:
+            series = self.series.get(calc_type, {})
+            keys = self._keys.get(calc_type, [])[-(last + window):]
+            stats = [series[k] for k in keys]
+            counts = np.array([s.count for s in stats], dtype=np.float64)
+            totals = np.array([s.total for s in stats])
+            shown = range(max(len(stats) - last, 0), len(stats))
+            extremes = {i: (stats[i].minimum, stats[i].maximum) for i in shown}
+            quantiles = {i: [stats[i].quantile(p / 100) for p in percentiles] for i in shown}
+        if not stats:
+            return []
+        means = totals / counts
+        cum_counts = np.concatenate([[0.0], np.cumsum(counts)])
+        cum_totals = np.concatenate([[0.0], np.cumsum(totals)])
+        start = np.maximum(np.arange(len(stats)) + 1 - window, 0)
+        end = np.arange(1, len(stats) + 1)
+        rolling = (cum_totals[end] - cum_totals[start]) / (cum_counts[end] - cum_counts[start])
+
+        rows = []
+        for i in shown:
+            row = {
+                "bucket": datetime.fromtimestamp(keys[i] * self.bucket_micros / 1_000_000, tz=timezone.utc),
+                "count": int(counts[i]),
+                "mean": float(means[i]),
+                "min": extremes[i][0],
+                "max": extremes[i][1],
+            }
+            for p, value in zip(percentiles, quantiles[i]):
+                row[f"p{p}"] = value
+            row["rolling_mean"] = float(rolling[i])
+            previous = means[i - 1] if i else np.nan
+            row["change_pct"] = float((means[i] - previous) / abs(previous) * 100) if previous else np.nan
+            rows.append(row)
+        return rows
+
+
+_aggregators = {}
+_aggregators_lock = threading.Lock()
+
+
+def get_aggregator(bucket_seconds):
+    """Process-wide aggregator for a bucket size, shared across sessions."""
+    with _aggregators_lock:
+        if bucket_seconds not in _aggregators:
+            _aggregators[bucket_seconds] = TrendAggregator(bucket_seconds)
+        return _aggregators[bucket_seconds]
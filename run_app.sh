@@ -14,10 +14,14 @@ else
     source productivity_env/bin/activate
 fi
 
-# Run the Streamlit app
+# Run the Streamlit app (PRODUCTIVITY_WORKERS > 1: several app processes behind a local load balancer)
 echo "📊 Launching Productivity Calculator..."
 echo "🌐 The app will open in your browser at: http://localhost:8501"
 echo "⏹️  Press Ctrl+C to stop the app"
 echo ""
 
-streamlit run streamlit_app.py 
\ No newline at end of file
+if [ "${PRODUCTIVITY_WORKERS:-1}" -gt 1 ]; then
+    python -m productivity.deploy --workers "$PRODUCTIVITY_WORKERS" --port 8501
+else
+    streamlit run streamlit_app.py
+fi
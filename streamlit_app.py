@@ -1,10 +1,16 @@
 import streamlit as st
-import math
-import plotly.graph_objects as go
-import plotly.express as px
-import pandas as pd
+import os
+import time
+import tempfile
+import uuid
+from collections import deque
+import numpy as np
 from datetime import datetime
 
+# Chart and file-reading modules (Plotly, pandas) are imported where first used,
+# so a cold start only pays for the calculator the user actually opens.
+from productivity import alerts, assets, cache, dataflow, engine, eoqgrid, history, live, memory, montecarlo, profiling, scenarios, sharedcache, trends
+
 # Page configuration
 st.set_page_config(
     page_title="Productivity Calculator",
@@ -13,212 +19,569 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-# Clean, formal CSS styling
-st.markdown("""
-<style>
-    /* Import clean, professional font */
-    @import url('https://fonts.googleapis.com/css2?family=Inter:wght@300;400;500;600;700&display=swap');
-    
-    /* Global Styles */
-    * {
-        font-family: 'Inter', sans-serif;
-    }
-    
-    /* Main Header */
-    .main-header {
-        font-size: 2.5rem;
-        font-weight: 600;
-        text-align: center;
-        color: #2c3e50;
-        margin-bottom: 1.5rem;
-        border-bottom: 2px solid #ecf0f1;
-        padding-bottom: 1rem;
-    }
-    
-    /* Metric cards */
-    .metric-card {
-        background: #ffffff;
-        border: 1px solid #e9ecef;
-        padding: 1.5rem;
-        border-radius: 8px;
-        color: #2c3e50;
-        text-align: center;
-        margin: 1rem 0;
-        box-shadow: 0 2px 4px rgba(0,0,0,0.1);
-    }
-    
-    .metric-card h3 {
-        font-size: 1.2rem;
-        font-weight: 500;
-        margin-bottom: 0.5rem;
-        color: #6c757d;
-    }
-    
-    .metric-card h2 {
-        font-size: 2.5rem;
-        font-weight: 600;
-        margin: 0;
-        color: #2c3e50;
-    }
-    
-    /* Input sections */
-    .input-section {
-        background: #f8f9fa;
-        padding: 1.5rem;
-        border-radius: 8px;
-        margin: 1rem 0;
-        border: 1px solid #e9ecef;
-    }
-    
-    /* Buttons */
-    .stButton > button {
-        background: #007bff;
-        color: white;
-        border: none;
-        border-radius: 6px;
-        padding: 0.75rem 1.5rem;
-        font-weight: 500;
-        font-size: 1rem;
-        transition: background-color 0.2s ease;
-        margin: 1rem 0;
-    }
-    
-    .stButton > button:hover {
-        background: #0056b3;
-    }
-    
-    /* Section headers */
-    .section-header {
-        font-size: 1.8rem;
-        font-weight: 600;
-        color: #2c3e50;
-        margin-bottom: 1rem;
-        border-bottom: 1px solid #ecf0f1;
-        padding-bottom: 0.5rem;
-    }
-    
-    /* Stats cards */
-    .stats-card {
-        background: #ffffff;
-        border: 1px solid #e9ecef;
-        padding: 1rem;
-        border-radius: 6px;
-        color: #2c3e50;
-        margin: 0.5rem 0;
-        box-shadow: 0 1px 3px rgba(0,0,0,0.1);
-    }
-    
-    /* Tips section */
-    .tips-section {
-        background: #e3f2fd;
-        border: 1px solid #bbdefb;
-        padding: 1rem;
-        border-radius: 6px;
-        color: #1565c0;
-        margin: 0.5rem 0;
-    }
-    
-    /* Number input styling */
-    .stNumberInput > div > div > input {
-        border-radius: 4px;
-        border: 1px solid #ced4da;
-        padding: 0.5rem 0.75rem;
-        font-size: 1rem;
-    }
-    
-    .stNumberInput > div > div > input:focus {
-        border-color: #007bff;
-        box-shadow: 0 0 0 2px rgba(0,123,255,0.25);
-    }
-    
-    /* Selectbox styling */
-    .stSelectbox > div > div > div {
-        border-radius: 4px;
-        border: 1px solid #ced4da;
-    }
-    
-    /* Success message styling */
-    .stSuccess {
-        background: #d4edda;
-        border: 1px solid #c3e6cb;
-        border-radius: 4px;
-        padding: 0.75rem;
-        color: #155724;
-        margin: 1rem 0;
-    }
-    
-    /* Info message styling */
-    .stInfo {
-        background: #d1ecf1;
-        border: 1px solid #bee5eb;
-        border-radius: 4px;
-        padding: 0.75rem;
-        color: #0c5460;
-        margin: 1rem 0;
-    }
-    
-    /* Background */
-    .main .block-container {
-        background: #ffffff;
-        padding: 1rem;
-    }
-    
-    /* Chart containers */
-    .chart-container {
-        background: #ffffff;
-        border: 1px solid #e9ecef;
-        border-radius: 8px;
-        padding: 1rem;
-        margin: 1rem 0;
-        box-shadow: 0 1px 3px rgba(0,0,0,0.1);
-    }
-    
-    /* Remove extra spacing */
-    .stMarkdown {
-        margin-bottom: 0;
-    }
-    
-    /* Compact layout */
-    .element-container {
-        margin-bottom: 0.5rem;
-    }
-</style>
-""", unsafe_allow_html=True)
+# Opt-in rerun profiling (?profile=1 or PRODUCTIVITY_PROFILE=1)
+profiling.configure_log_file()
+profiler = profiling.RerunProfiler(
+    enabled=profiling.enabled_by_env() or st.query_params.get("profile") == "1",
+    state=st.session_state,
+)
+
+# Clean, formal CSS styling (static/app.css)
+static_css = st.get_option("server.enableStaticServing") and assets.serves_stylesheets(st.__version__)
+st.markdown(assets.stylesheet_tag(static_css), unsafe_allow_html=True)
+profiler.lap("css")
+
+# Bulk file scoring
+def render_bulk_ingest(calc_type):
+    from productivity import charts, ingest, rendering
+
+    st.markdown('<div class="input-section">', unsafe_allow_html=True)
+    uploaded = st.file_uploader("Upload CSV or Parquet", type=["csv", "parquet", "pq"])
+    path = st.text_input("...or path to a file on the server", value="")
+    st.markdown('</div>', unsafe_allow_html=True)
+
+    source = uploaded if uploaded is not None else path.strip()
+    if not source:
+        st.info("Upload a file or enter a path to score it in bulk.")
+        return
+
+    try:
+        file_columns = ingest.read_columns(source)
+    except (OSError, ValueError, ImportError) as exc:
+        st.error(f"Could not read file: {exc}")
+        return
+
+    _, inputs = engine.CALCULATORS[calc_type]
+    st.markdown("#### Column mapping")
+    columns = {}
+    for name in inputs:
+        default = file_columns.index(name) if name in file_columns else 0
+        columns[name] = st.selectbox(name, file_columns, index=default, key=f"map_{calc_type}_{name}")
+    entity_column = st.selectbox("Entity column (alerts are per entity)", ["(whole file)"] + file_columns, key="bulk_entity")
+    entity_column = None if entity_column == "(whole file)" else entity_column
+    chunk_size = st.number_input("Rows per chunk", min_value=1000, value=ingest.DEFAULT_CHUNK_SIZE, step=10000)
+    download = st.selectbox("Download scored rows as", ["(no download)", *EXPORT_FORMATS], key="bulk_download")
+
+    if st.button("Score File", key="calc_bulk"):
+        summary = ingest.RunningSummary()
+        progress = st.progress(0.0, text="Starting...")
+        preview = None
+        writer = None
+        if download in EXPORT_FORMATS:
+            from productivity import export
+            # Spooled to an anonymous temporary file as it is scored, so the
+            # output is only held in memory once, by the download itself
+            writer = export.BatchWriter(tempfile.TemporaryFile(), EXPORT_FORMATS[download][0])
+        # Downsampled per chunk, so chart memory stays bounded like the scoring itself
+        by_row = rendering.DownsampleBuffer(method="minmax")
+        cloud = rendering.DownsampleBuffer(method="grid") if len(inputs) == 2 else None
+        monitor = alerts.get_monitor()
+        entity = getattr(source, "name", source)
+        raised, alert_count = deque(maxlen=1000), 0
+        try:
+            for chunk, result, stats in ingest.score_file(source, calc_type, columns, int(chunk_size),
+                                                          extra=[entity_column] if entity_column else None):
+                new = monitor.observe_batch(
+                    calc_type, result, chunk[entity_column].astype(str).tolist() if entity_column else entity)
+                raised.extend(new)
+                alert_count += len(new)
+                by_row.add(np.arange(summary.count, summary.count + len(result)), result)
+                if cloud is not None:
+                    cloud.add(chunk[columns[inputs[1]]].to_numpy(), chunk[columns[inputs[0]]].to_numpy())
+                summary.update(result)
+                if preview is None:
+                    preview = chunk.head(20).assign(result=result[:20])
+                if writer is not None:
+                    writer.write(export.frame_batch(chunk, result))
+                fraction = stats["fraction"]
+                progress.progress(
+                    fraction if fraction is not None else 0.0,
+                    text=f"{stats['rows']:,} rows  |  {stats['rows_per_sec']:,.0f} rows/sec",
+                )
+        except (OSError, ValueError, KeyError) as exc:
+            st.error(f"Scoring failed: {exc}")
+            return
+        finally:
+            if writer is not None:
+                writer.close()
+        progress.progress(1.0, text=f"Done: {summary.count:,} rows  |  {stats['rows_per_sec']:,.0f} rows/sec" if summary.count else "Done: file is empty")
+
+        totals = summary.as_dict()
+        st.markdown(f'<div class="metric-card"><h3>Mean {calc_type}</h3><h2>{totals["mean"]:.8f}</h2></div>', unsafe_allow_html=True)
+        stat_cols = st.columns(4)
+        stat_cols[0].metric("Rows", f"{totals['rows']:,}")
+        stat_cols[1].metric("Min", f"{totals['min']:.6f}")
+        stat_cols[2].metric("Max", f"{totals['max']:.6f}")
+        stat_cols[3].metric("Zero results", f"{totals['zero_results']:,}")
+        if summary.count:
+            st.markdown('<div class="chart-container">', unsafe_allow_html=True)
+            st.plotly_chart(charts.bulk_result_chart(*by_row.points(), calc_type), use_container_width=True)
+            if cloud is not None:
+                st.plotly_chart(charts.bulk_scatter_chart(*cloud.points(), columns[inputs[1]], columns[inputs[0]]), use_container_width=True)
+            st.markdown('</div>', unsafe_allow_html=True)
+        if alert_count:
+            st.markdown(f"#### Alerts ({alert_count:,}, latest {len(raised):,} shown)")
+            st.dataframe([alert._asdict() for alert in raised], use_container_width=True)
+        if preview is not None:
+            st.dataframe(preview, use_container_width=True)
+        if writer is not None and summary.count:
+            fmt, mime = EXPORT_FORMATS[download]
+            name = f"{os.path.splitext(os.path.basename(str(entity)))[0] or 'scored'}_scored.{fmt}"
+            spool = writer.sink
+            spool.flush()
+            # "ignore": downloading must not rerun the page and lose these results
+            st.download_button(f"Download {name} ({spool.tell() / 1e6:,.1f} MB)", spool.raw, file_name=name,
+                               mime=mime, on_click="ignore")
+
+# Trend analytics
+def render_trends(calc_type):
+    from productivity import charts
+
+    st.markdown('<div class="input-section">', unsafe_allow_html=True)
+    bucket_name = st.selectbox("Period", list(trends.BUCKETS), index=1)
+    window = st.number_input("Rolling window (periods)", min_value=1, value=7, step=1)
+    last = st.number_input("Periods to show", min_value=1, value=100, step=10)
+    st.markdown('</div>', unsafe_allow_html=True)
+
+    aggregator = trends.get_aggregator(trends.BUCKETS[bucket_name])
+    aggregator.refresh(history.get_store())
+    rows = aggregator.summary(calc_type, window=int(window), last=int(last))
+    if not rows:
+        st.info("No history for this calculator yet. Run some calculations first.")
+        return
+
+    latest = rows[-1]
+    stat_cols = st.columns(4)
+    stat_cols[0].metric("Latest mean", f"{latest['mean']:.6f}",
+                        None if latest['change_pct'] != latest['change_pct'] else f"{latest['change_pct']:+.2f}%")
+    stat_cols[1].metric("Rolling mean", f"{latest['rolling_mean']:.6f}")
+    stat_cols[2].metric("p50 / p99", f"{latest['p50']:.4f} / {latest['p99']:.4f}")
+    stat_cols[3].metric("Results", f"{latest['count']:,}")
+
+    st.markdown('<div class="chart-container">', unsafe_allow_html=True)
+    st.plotly_chart(charts.trend_chart(rows, calc_type), use_container_width=True)
+    st.markdown('</div>', unsafe_allow_html=True)
+    st.dataframe(rows[::-1], use_container_width=True)
+
+# Scenario sweep
+def _parse_changes(text):
+    return [float(part) / 100 for part in text.replace(";", ",").split(",") if part.strip()]
+
+def render_scenarios(calc_type):
+    from productivity import charts, ingest
+
+    _, inputs = engine.CALCULATORS[calc_type]
+    st.markdown('<div class="input-section">', unsafe_allow_html=True)
+    uploaded = st.file_uploader("Sites file (CSV or Parquet, one row per site)", type=["csv", "parquet", "pq"], key="sweep_file")
+    path = st.text_input("...or path to a sites file on the server", value="", key="sweep_path")
+    st.markdown('</div>', unsafe_allow_html=True)
+
+    source = uploaded if uploaded is not None else path.strip()
+    if source:
+        try:
+            file_columns = ingest.read_columns(source)
+        except (OSError, ValueError, ImportError) as exc:
+            st.error(f"Could not read file: {exc}")
+            return
+        columns = {}
+        for name in inputs:
+            default = file_columns.index(name) if name in file_columns else 0
+            columns[name] = st.selectbox(name, file_columns, index=default, key=f"sweep_map_{calc_type}_{name}")
+        site_column = st.selectbox("Site label column", ["(row number)"] + file_columns, key="sweep_site")
+        site_column = None if site_column == "(row number)" else site_column
+    else:
+        st.caption("No sites file: sweeping a single site with these baseline inputs.")
+        base_cols = st.columns(3)
+        single = {
+            name: base_cols[i % 3].number_input(name, min_value=0.0, value=100.0, key=f"sweep_base_{calc_type}_{name}")
+            for i, name in enumerate(inputs)
+        }
+
+    st.markdown("#### Input changes")
+    mode = st.radio("Scenarios", ["Grid", "Sampled"], horizontal=True, key="sweep_mode")
+    change_cols = st.columns(3)
+    if mode == "Grid":
+        st.caption("Comma-separated % changes per input, e.g. -10, 0, 10. Leave blank to hold an input fixed.")
+        grid = {
+            name: change_cols[i % 3].text_input(f"{name} (%)", value="", key=f"sweep_grid_{calc_type}_{name}")
+            for i, name in enumerate(inputs)
+        }
+    else:
+        st.caption("Standard deviation (%) of a normal change per input; 0 holds an input fixed.")
+        spread = {
+            name: change_cols[i % 3].number_input(f"{name} sd (%)", min_value=0.0, value=0.0, key=f"sweep_sd_{calc_type}_{name}")
+            for i, name in enumerate(inputs)
+        }
+        count = st.number_input("Scenarios to draw", min_value=1, value=10_000, step=1000)
+        seed = st.number_input("Seed", min_value=0, value=0, step=1)
+    cores = os.cpu_count() or 1
+    workers = st.number_input("Worker processes", min_value=1, max_value=cores, value=cores, step=1)
+
+    if st.button("Run Sweep", key="calc_sweep"):
+        try:
+            if mode == "Grid":
+                names, grid_rows = scenarios.grid_scenarios(
+                    {name: _parse_changes(text) for name, text in grid.items() if text.strip()})
+            else:
+                names, grid_rows = scenarios.sample_scenarios(
+                    {name: ("normal", 0.0, sd / 100) for name, sd in spread.items() if sd > 0}, int(count), int(seed))
+        except ValueError as exc:
+            st.error(f"Could not read the changes: {exc}")
+            return
+        if not names:
+            st.warning("Vary at least one input.")
+            return
+        if source:
+            try:
+                base, sites = scenarios.load_sites(source, columns, site_column)
+            except (OSError, ValueError, KeyError, ImportError) as exc:
+                st.error(f"Could not load sites: {exc}")
+                return
+        else:
+            base, sites = {name: np.array([value]) for name, value in single.items()}, np.array(["baseline"])
+        if not len(grid_rows) or not len(sites):
+            st.warning("Nothing to sweep: no scenarios were given." if not len(grid_rows) else "The sites file has no rows.")
+            return
+
+        progress = st.progress(0.0, text="Starting workers...")
+        live_chart = st.empty()
+        started = time.perf_counter()
+        last_draw = [0.0]
+
+        def on_block(result, finished):
+            done = int(finished.sum())
+            elapsed = time.perf_counter() - started
+            progress.progress(done / len(grid_rows), text=f"{done:,} / {len(grid_rows):,} scenarios  |  {done * len(sites) / max(elapsed, 1e-9):,.0f} evaluations/sec")
+            # Redraw partial results at most twice a second
+            if elapsed - last_draw[0] > 0.5:
+                last_draw[0] = elapsed
+                live_chart.plotly_chart(charts.scenario_chart(result.take(finished)), use_container_width=True)
+
+        with profiler.phase("compute"):
+            sweep = scenarios.run_sweep(calc_type, base, names, grid_rows, workers=int(workers), sites=sites, on_block=on_block)
+        elapsed = time.perf_counter() - started
+        progress.progress(1.0, text=f"Done: {len(grid_rows):,} scenarios x {len(sites):,} sites in {elapsed:.2f}s")
+        live_chart.plotly_chart(charts.scenario_chart(sweep), use_container_width=True)
+
+        summary = sweep.summary()
+        stat_cols = st.columns(3)
+        stat_cols[0].metric("Scenarios x sites", f"{sweep.values.size:,}")
+        if np.isfinite(summary["mean"]).any():
+            # More output per input is better; a larger EOQ is neither better nor worse
+            labels = ("Highest mean", "Lowest mean") if calc_type == "Economic Order Quantity (EOQ)" else ("Best mean", "Worst mean")
+            stat_cols[1].metric(labels[0], f"{np.nanmax(summary['mean']):.6f}")
+            stat_cols[2].metric(labels[1], f"{np.nanmin(summary['mean']):.6f}")
+        st.dataframe({key: values[:1000] for key, values in summary.items()}, use_container_width=True)
 
-# Productivity calculation functions
-def total_productivity(output, total_input):
-    return output / total_input if total_input != 0 else 0
+# Monte Carlo uncertainty
+def _distribution(kind, value, spread):
+    if kind == "Fixed" or spread == 0:
+        return ("fixed", value)
+    if kind in ("Normal", "Lognormal"):
+        return (kind.lower(), value, value * spread)
+    if kind == "Uniform":
+        return ("uniform", value * (1 - spread), value * (1 + spread))
+    return ("triangular", value * (1 - spread), value, value * (1 + spread))
 
-def labour_productivity(output, labour_input):
-    return output / labour_input if labour_input != 0 else 0
+def render_montecarlo(calc_type):
+    from productivity import charts
 
-def material_productivity(output, material_input):
-    return output / material_input if material_input != 0 else 0
+    _, inputs = engine.CALCULATORS[calc_type]
+    st.markdown('<div class="input-section">', unsafe_allow_html=True)
+    st.caption("Each input is a central value with a spread: the sd for Normal/Lognormal, the half-width for Uniform/Triangular.")
+    spec = {}
+    for name in inputs:
+        cols = st.columns(3)
+        kind = cols[0].selectbox(name, ["Normal", "Lognormal", "Uniform", "Triangular", "Fixed"], key=f"mc_kind_{calc_type}_{name}")
+        value = cols[1].number_input("Value", min_value=0.0, value=100.0, key=f"mc_value_{calc_type}_{name}")
+        spread = cols[2].number_input("Spread (%)", min_value=0.0, value=10.0, key=f"mc_spread_{calc_type}_{name}")
+        spec[name] = _distribution(kind, value, spread / 100)
+    draw_cols = st.columns(3)
+    draws = draw_cols[0].number_input("Draws", min_value=1000, value=montecarlo.DEFAULT_DRAWS, step=100_000)
+    seed = draw_cols[1].number_input("Seed", min_value=0, value=0, step=1, key="mc_seed")
+    level = draw_cols[2].selectbox("Interval", [0.80, 0.90, 0.95, 0.99], index=1, format_func=lambda p: f"{p:.0%}")
+    st.markdown('</div>', unsafe_allow_html=True)
 
-def capital_productivity(output, capital_input):
-    return output / capital_input if capital_input != 0 else 0
+    if st.button("Run Simulation", key="calc_montecarlo"):
+        progress = st.progress(0.0, text="Sampling...")
+        started = time.perf_counter()
 
-def machine_productivity(output, machine_input):
-    return output / machine_input if machine_input != 0 else 0
+        def on_chunk(simulation):
+            progress.progress(simulation.count / int(draws), text=f"{simulation.count:,} draws")
 
-def miscellaneous_productivity(output, misc_input):
-    return output / misc_input if misc_input != 0 else 0
+        with profiler.phase("compute"):
+            simulation = cache.cached_simulation(calc_type, spec, int(draws), int(seed), progress=on_chunk)
+        progress.progress(1.0, text=f"Done: {simulation.count:,} draws in {time.perf_counter() - started:.2f}s")
 
-def multifactor_productivity(output, human, material, capital, energy, misc):
-    total_input = human + material + capital + energy + misc
-    return output / total_input if total_input != 0 else 0
+        low, high = simulation.interval(level)
+        mean_low, mean_high = simulation.mean_interval(0.95)
+        st.markdown(f'<div class="metric-card"><h3>Mean {calc_type}</h3><h2>{simulation.mean:,.6f}</h2></div>', unsafe_allow_html=True)
+        stat_cols = st.columns(3)
+        stat_cols[0].metric(f"{level:.0%} interval", f"{low:,.4f} – {high:,.4f}")
+        stat_cols[1].metric("Std deviation", f"{simulation.std:,.4f}")
+        stat_cols[2].metric("95% CI of mean", f"± {(mean_high - mean_low) / 2:,.4f}")
+        st.markdown('<div class="chart-container">', unsafe_allow_html=True)
+        st.plotly_chart(charts.montecarlo_chart(simulation, level), use_container_width=True)
+        st.markdown('</div>', unsafe_allow_html=True)
+
+# EOQ what-if explorer: closed-form values and surfaces over log-spaced axes
+# (see productivity.eoqgrid), in a fragment, so dragging a slider reruns only the explorer
+EOQ_LABELS = {"demand": "Annual Demand (D)", "ordering_cost": "Ordering Cost per Order (S)", "holding_cost": "Holding Cost per Unit per Year (H)"}
+
+@st.fragment
+def render_eoq_explorer(start):
+    from productivity import charts
+
+    with st.expander("Slider and surface ranges"):
+        range_cols = st.columns(3)
+        ranges = {}
+        for i, name in enumerate(eoqgrid.PARAMETERS):
+            low, high = getattr(eoqgrid.DEFAULT_SPEC, name)
+            ranges[name] = (
+                range_cols[i].number_input(f"{EOQ_LABELS[name]} from", min_value=1e-6, value=low, format="%g", key=f"eoq_grid_low_{name}"),
+                range_cols[i].number_input("to", min_value=1e-6, value=high, format="%g", key=f"eoq_grid_high_{name}"),
+            )
+        points = st.number_input("Surface points per axis", min_value=9, max_value=eoqgrid.MAX_INTERACTIVE_POINTS, value=eoqgrid.DEFAULT_SPEC.points, step=8, key="eoq_grid_points")
+    spec = eoqgrid.GridSpec(*ranges.values(), int(points))
+    try:
+        eoqgrid.surface(spec, "demand", "ordering_cost", holding_cost=1.0)  # checks the ranges
+    except ValueError as exc:
+        st.error(f"Invalid ranges: {exc}")
+        return
+
+    # Keyed sliders keep their values across reruns: start again from the
+    # calculator's inputs whenever those (or the ranges, and so the options) change
+    origin = (dict(start), spec)
+    if st.session_state.get("eoq_whatif_start") != origin:
+        for name in eoqgrid.PARAMETERS:
+            st.session_state.pop(f"eoq_whatif_{name}", None)
+        st.session_state.eoq_whatif_start = origin
+    values = {}
+    for name in eoqgrid.PARAMETERS:
+        low, high = getattr(spec, name)
+        default = float(np.clip(start[name], low, high))
+        options = sorted({float(f"{v:.4g}") for v in np.geomspace(low, high, 241)} | {default})
+        values[name] = st.select_slider(EOQ_LABELS[name], options=options, value=default, format_func=lambda v: f"{v:,.4g}", key=f"eoq_whatif_{name}")
+    eoq_value, min_cost = eoqgrid.lookup(**values)
+    stat_cols = st.columns(3)
+    stat_cols[0].metric("EOQ", f"{eoq_value:,.2f} units")
+    stat_cols[1].metric("Minimum total cost", f"{min_cost:,.2f}")
+    stat_cols[2].metric("Orders per year", f"{values['demand'] / eoq_value:,.2f}")
+
+    view_cols = st.columns(3)
+    x = view_cols[0].selectbox("Surface across", eoqgrid.PARAMETERS, format_func=EOQ_LABELS.get, key="eoq_whatif_x")
+    y = view_cols[1].selectbox("and", [name for name in eoqgrid.PARAMETERS if name != x], format_func=EOQ_LABELS.get, key="eoq_whatif_y")
+    quantity = view_cols[2].radio("Showing", eoqgrid.QUANTITIES, format_func={"eoq": "EOQ", "min_cost": "Minimum total cost"}.get, key="eoq_whatif_quantity")
+    three_d = st.toggle("3D surface", key="eoq_whatif_3d")
+    (z,) = set(eoqgrid.PARAMETERS) - {x, y}
+    surface = eoqgrid.surface(spec, x, y, **{z: values[z]})
+    st.plotly_chart(charts.eoq_surface_chart(surface, quantity, (values[x], values[y]), three_d), use_container_width=True, key="eoq_whatif_surface")
+    st.plotly_chart(cache.cached_figure("Economic Order Quantity (EOQ)", tuple(values.values()), eoq_value), use_container_width=True, key="eoq_whatif_curve")
+
+# Live machine feed: the panel is a fragment, so each frame reruns only the
+# panel, at most ``fps`` times a second, never the whole script
+LIVE_SOURCE = os.environ.get("PRODUCTIVITY_LIVE_SOURCE", "tcp://127.0.0.1:9600")
+
+def _live_panel(feed, top):
+    from productivity import charts
+
+    snapshot = feed.snapshot()
+    stats = feed.stats()
+    if stats["source_error"]:
+        st.error(f"Cannot read {feed.source}: {stats['source_error']} (retrying)")
+    if stats["last_error"]:
+        st.caption(f"{stats['bad_lines']:,} malformed lines skipped; last: {stats['last_error']}")
+    if not snapshot["machines"]:
+        if not stats["source_error"]:
+            st.info(f"Waiting for events from {feed.source}...")
+        return
+    stat_cols = st.columns(4)
+    stat_cols[0].metric("Plant productivity", f"{snapshot['plant']:.4f}")
+    stat_cols[1].metric("Machines", f"{len(snapshot['machines']):,}")
+    stat_cols[2].metric("Events / s", f"{snapshot['events_per_s']:,.0f}")
+    stat_cols[3].metric("Late / dropped", f"{snapshot['late']:,} / {snapshot['dropped']:,}")
+    st.plotly_chart(charts.live_chart(snapshot, top), use_container_width=True, key="live_chart")
+
+def render_live(calc_type):
+    st.markdown('<div class="input-section">', unsafe_allow_html=True)
+    source = st.text_input("Feed source", value=LIVE_SOURCE, key="live_source",
+                           help="tcp://host:port, udp://host:port, or the path of a file or named pipe to follow")
+    cols = st.columns(3)
+    window = cols[0].selectbox("Window", [10, 60, 300, 900], index=1, format_func=lambda s: f"{s} s", key="live_window")
+    fps = cols[1].number_input("Max updates per second", min_value=0.2, max_value=10.0, value=live.DEFAULT_FPS, step=0.5, key="live_fps")
+    top = cols[2].number_input("Machines shown", min_value=5, max_value=200, value=30, step=5, key="live_top")
+    st.markdown('</div>', unsafe_allow_html=True)
+    if calc_type != "Machine Productivity":
+        st.caption("The live feed reports Machine Productivity (output / machine input) per machine.")
+
+    if not st.toggle("Subscribe", key="live_on"):
+        st.info("Start a feed (e.g. `python -m productivity.live --simulate 200 --rate 5000`), then subscribe.")
+        return
+    try:
+        feed = live.get_feed(source.strip(), float(window))
+    except RuntimeError as exc:
+        st.error(str(exc))
+        return
+    st.fragment(_live_panel, run_every=1 / fps)(feed, int(top))
+
+# Profiling diagnostics
+def render_diagnostics(profiler):
+    stats = profiler.session_stats()
+    with st.expander("Diagnostics", expanded=True):
+        st.write(
+            f"**This rerun**: {profiler.elapsed() * 1000:.1f} ms  |  "
+            f"**Session**: {stats['reruns'] + 1} reruns, {stats['total'] * 1000:.0f} ms before this one"
+        )
+        rows = [
+            {"Step": name, "This rerun (ms)": seconds * 1000,
+             "Session total (ms)": (stats[kind].get(name, 0.0) + seconds) * 1000}
+            for kind, timings in (("laps", profiler.laps), ("phases", profiler.phases))
+            for name, seconds in timings.items()
+        ]
+        st.dataframe(rows, use_container_width=True, hide_index=True)
+        st.caption("Phases (compute, chart_build, chart_render, history) are included in their branch time.")
+        cold = profiling.first_paint()
+        if cold:
+            st.caption(
+                f"Cold start (pid {cold['pid']}): first paint {cold['first_paint_s']:.2f} s after process start, "
+                f"first run took {cold['first_run_s'] * 1000:.0f} ms."
+            )
+
+# History export
+EXPORT_FORMATS = {"Parquet": ("parquet", "application/vnd.apache.parquet"),
+                  "Arrow IPC": ("arrow", "application/vnd.apache.arrow.file"),
+                  "CSV (gzip)": ("csv.gz", "application/gzip")}
+
+def render_export():
+    with st.expander("Export results"):
+        label = st.selectbox("Format", list(EXPORT_FORMATS), key="export_format")
+        scope = st.radio("Rows", ["This session", "All history"], key="export_scope", horizontal=True)
+        fmt, mime = EXPORT_FORMATS[label]
+        session = st.session_state.history_session if scope == "This session" else None
+        if st.button("Prepare export", key="export_prepare"):
+            from productivity import export  # pyarrow, only once an export is asked for
+
+            # Streamed batch by batch from SQLite; only the encoded file is held in memory,
+            # in the session's budgeted store, or once for everyone when it covers all
+            # history (keyed by the newest row, so it is never stale)
+            store = history.get_store()
+            build = lambda: export.to_bytes(export.history_batches(store, session=session), fmt, export.HISTORY_SCHEMA).tobytes()
+            if session is None:
+                newest = store.page(1)
+                key = ("history_export", fmt, newest[0].id if newest else 0)
+                memory.get_shared().get_or_put(key, build)
+                st.session_state.export_file = ("shared", key, f"productivity_history.{fmt}", mime)
+            else:
+                memory.get_session(st.session_state, session).put("export_file", build())
+                st.session_state.export_file = ("session", "export_file", f"productivity_history.{fmt}", mime)
+        if st.session_state.get("export_file"):
+            where, key, name, mime = st.session_state.export_file
+            store = memory.get_shared() if where == "shared" else memory.get_session(st.session_state, st.session_state.history_session)
+            data = store.get(key)
+            if data is not None:
+                st.download_button(f"Download {name} ({len(data) / 1e6:,.1f} MB)", data, file_name=name, mime=mime)
+
+# Live memory report
+def render_memory(session_memory):
+    mb = lambda n: f"{(n or 0) / memory.MB:,.1f} MB"
+    stats = session_memory.stats()
+    st.write(
+        f"**This session**: {mb(stats['total_bytes'])} of {mb(stats['budget_bytes'])} "
+        f"(state {mb(stats['state_bytes'])}, stored {mb(stats['resident_bytes'])}, spilled to disk {mb(stats['spilled_bytes'])})"
+    )
+    report = memory.report()
+    shared = report["shared"]
+    st.write(
+        f"**Server**: {mb(report['rss_bytes'])} resident, {len(report['sessions'])} sessions using {mb(report['session_bytes'])}; "
+        f"shared store {mb(shared['resident_bytes'])} of {mb(shared['budget_bytes'])}, {mb(report['spilled_bytes'])} spilled in total"
+    )
+    rows = [
+        {"Session": s["session"][:8], "Memory (MB)": s["total_bytes"] / memory.MB,
+         "Spilled (MB)": s["spilled_bytes"] / memory.MB, "Idle (s)": round(s["idle_s"])}
+        for s in report["sessions"][:20]
+    ]
+    st.dataframe(rows, use_container_width=True, hide_index=True)
+
+# Recent alerts across all sessions, bulk files and live feeds
+def render_alerts(calc_type):
+    monitor = alerts.get_monitor()
+    stats = monitor.stats()
+    st.write(
+        f"**Watching** {stats['series']:,} series ({stats['observed']:,} results): "
+        f"{stats['threshold_alerts']:,} threshold and {stats['anomaly_alerts']:,} anomaly alerts"
+    )
+    if "webhook" in stats:
+        hook = stats["webhook"]
+        st.caption(f"Webhook {hook['url']}: {hook['sent']:,} sent, {hook['dropped']:,} dropped")
+    thresholds = monitor.thresholds_for(calc_type)
+    if thresholds is not None:
+        bounds = [f"{name.replace('_', ' ')} {getattr(thresholds, name):g}" for name in thresholds._fields[:4] if getattr(thresholds, name) is not None]
+        st.caption(", ".join(bounds) + (f" (after {thresholds.hold} in a row)" if thresholds.hold > 1 else ""))
+    only_this = st.checkbox(f"Only {calc_type}", key="alerts_only_this")
+    rows = [
+        {"Time": datetime.fromtimestamp(alert.ts).strftime("%H:%M:%S"), "Severity": alert.severity,
+         "Kind": alert.kind, "Calculator": alert.calc_type, "Entity": alert.entity, "Value": alert.value}
+        for alert in monitor.recent(50, calc_type if only_this else None)
+    ]
+    if rows:
+        st.dataframe(rows, use_container_width=True, hide_index=True)
 
-def total_factor_productivity(net_output, worker_input, machine_input):
-    total_input = worker_input + machine_input
-    return net_output / total_input if total_input != 0 else 0
+# Calculation history
+def record_calculation(calc_type, result):
+    """Store the result and check it against the alert thresholds and this session's series."""
+    session = st.session_state.history_session
+    history.get_store().append(calc_type, result, session=session)
+    return alerts.get_monitor().observe(calc_type, result, entity=f"session {session[:8]}")
 
-def calculate_eoq(demand, ordering_cost, holding_cost):
-    return math.sqrt((2 * demand * ordering_cost) / holding_cost) if holding_cost != 0 else 0
+def show_alerts(raised, limit=5):
+    for alert in raised[:limit]:
+        (st.error if alert.severity == "critical" else st.warning if alert.severity == "warning" else st.success)(alert.message)
+    if len(raised) > limit:
+        st.caption(f"...and {len(raised) - limit:,} more (see Alerts)")
+
+# Manual calculations: once calculated, the result and chart follow the inputs,
+# recomputing only the nodes whose inputs changed (see productivity.dataflow)
+def render_calculation(calc_type, inputs, clicked, title=None, number_format="{:.8f}"):
+    flows = st.session_state.setdefault("dataflows", {})
+    if calc_type not in flows:
+        flows[calc_type] = dataflow.Dataflow(dataflow.calculator_graph(calc_type))
+    flow = flows[calc_type]
+    flow.update(**inputs)
+    shown = st.session_state.setdefault("shown_calculations", set())
+    if clicked:
+        shown.add(calc_type)
+    elif calc_type not in shown:
+        return
+
+    with profiler.phase("compute"):
+        result = flow.get("result")
+    raised = []
+    if clicked:
+        with profiler.phase("history"):
+            raised = record_calculation(calc_type, result)
+    st.markdown(f'<div class="metric-card"><h3>{title or calc_type}</h3><h2>{number_format.format(result)}</h2></div>', unsafe_allow_html=True)
+    show_alerts(raised)
+    if "total_input" in flow.graph.nodes:
+        st.caption(f"Total input: {flow.get('total_input'):,.2f}")
+
+    st.markdown('<div class="chart-container">', unsafe_allow_html=True)
+    with profiler.phase("chart_build"):
+        fig = flow.get("chart")
+    with profiler.phase("chart_render"):
+        st.plotly_chart(fig, use_container_width=True)
+    st.markdown('</div>', unsafe_allow_html=True)
+    profiler.tag(recomputed=",".join(flow.recomputed) or "none")
 
 # Main app
 def main():
+    if 'history_session' not in st.session_state:
+        st.session_state.history_session = uuid.uuid4().hex
+    profiler.session = st.session_state.history_session
+    session_memory = memory.get_session(st.session_state, st.session_state.history_session)
+    
     # Clean Header
     st.markdown('<h1 class="main-header">Productivity Calculator</h1>', unsafe_allow_html=True)
+    profiler.lap("header")
     
     # Sidebar
     with st.sidebar:
@@ -237,6 +600,7 @@ def main():
                 "Economic Order Quantity (EOQ)"
             ]
         )
+        input_mode = st.radio("Input mode:", ["Manual entry", "Bulk file", "Trends", "Scenario sweep", "Monte Carlo", "Live feed"], horizontal=True)
         
         st.markdown("---")
         st.markdown("### Features")
@@ -245,11 +609,15 @@ def main():
         st.markdown("• Historical tracking")
         st.markdown("• Export results")
         st.markdown("• Real-time analytics")
+        render_export()
         
         st.markdown("---")
         st.markdown("### About")
         st.markdown("This calculator helps you measure various types of productivity metrics and optimize your operations with clear visualizations.")
     
+    profiler.lap("sidebar")
+    profiler.tag(calc_type=calc_type, mode=input_mode)
+    
     # Main content area
     col1, col2 = st.columns([2, 1])
     
@@ -257,51 +625,29 @@ def main():
         st.markdown(f'<h2 class="section-header">{calc_type}</h2>', unsafe_allow_html=True)
         
         # Input section based on calculation type
-        if calc_type == "Total Productivity":
+        if input_mode == "Bulk file":
+            render_bulk_ingest(calc_type)
+        
+        elif input_mode == "Trends":
+            render_trends(calc_type)
+        
+        elif input_mode == "Scenario sweep":
+            render_scenarios(calc_type)
+        
+        elif input_mode == "Monte Carlo":
+            render_montecarlo(calc_type)
+        
+        elif input_mode == "Live feed":
+            render_live(calc_type)
+        
+        elif calc_type == "Total Productivity":
             st.markdown('<div class="input-section">', unsafe_allow_html=True)
             output = st.number_input("Total Output", min_value=0.0, value=1000.0, step=0.000001, format="%.6f")
             total_input = st.number_input("Total Input", min_value=0.0, value=800.0, step=0.000001, format="%.6f")
             st.markdown('</div>', unsafe_allow_html=True)
             
-            if st.button("Calculate Total Productivity", key="calc_total"):
-                result = total_productivity(output, total_input)
-                st.markdown(f'<div class="metric-card"><h3>Total Productivity</h3><h2>{result:.8f}</h2></div>', unsafe_allow_html=True)
-                
-                # Visualization
-                st.markdown('<div class="chart-container">', unsafe_allow_html=True)
-                fig = go.Figure()
-                fig.add_trace(go.Indicator(
-                    mode="gauge+number+delta",
-                    value=result,
-                    domain={'x': [0, 1], 'y': [0, 1]},
-                    title={'text': "Productivity Value", 'font': {'size': 20}},
-                    delta={'reference': 1.0},
-                    gauge={
-                        'axis': {'range': [None, 2.0], 'tickwidth': 1, 'tickcolor': "#2c3e50"},
-                        'bar': {'color': "#007bff"},
-                        'bgcolor': "white",
-                        'borderwidth': 2,
-                        'bordercolor': "#2c3e50",
-                        'steps': [
-                            {'range': [0, 0.5], 'color': "#dc3545"},
-                            {'range': [0.5, 1.0], 'color': "#ffc107"},
-                            {'range': [1.0, 2.0], 'color': "#28a745"}
-                        ],
-                        'threshold': {
-                            'line': {'color': "red", 'width': 4},
-                            'thickness': 0.75,
-                            'value': 1.0
-                        }
-                    }
-                ))
-                fig.update_layout(
-                    height=400,
-                    paper_bgcolor='rgba(0,0,0,0)',
-                    plot_bgcolor='rgba(0,0,0,0)',
-                    font={'color': '#2c3e50'}
-                )
-                st.plotly_chart(fig, use_container_width=True)
-                st.markdown('</div>', unsafe_allow_html=True)
+            clicked = st.button("Calculate Total Productivity", key="calc_total")
+            render_calculation("Total Productivity", {"output": output, "total_input": total_input}, clicked)
         
         elif calc_type == "Labour Productivity":
             st.markdown('<div class="input-section">', unsafe_allow_html=True)
@@ -309,29 +655,8 @@ def main():
             labour = st.number_input("Labour Input", min_value=0.0, value=200.0, step=50.0)
             st.markdown('</div>', unsafe_allow_html=True)
             
-            if st.button("Calculate Labour Productivity", key="calc_labour"):
-                result = labour_productivity(output, labour)
-                st.markdown(f'<div class="metric-card"><h3>Labour Productivity</h3><h2>{result:.8f}</h2></div>', unsafe_allow_html=True)
-                
-                # Bar chart
-                st.markdown('<div class="chart-container">', unsafe_allow_html=True)
-                data = pd.DataFrame({
-                    'Metric': ['Output', 'Labour Input'],
-                    'Value': [output, labour]
-                })
-                fig = px.bar(data, x='Metric', y='Value', 
-                            title="Output vs Labour Input",
-                            color='Metric',
-                            color_discrete_map={'Output': '#007bff', 'Labour Input': '#6c757d'})
-                fig.update_layout(
-                    title_font_size=18,
-                    title_font_color='#2c3e50',
-                    paper_bgcolor='rgba(0,0,0,0)',
-                    plot_bgcolor='rgba(0,0,0,0)',
-                    font={'color': '#2c3e50'}
-                )
-                st.plotly_chart(fig, use_container_width=True)
-                st.markdown('</div>', unsafe_allow_html=True)
+            clicked = st.button("Calculate Labour Productivity", key="calc_labour")
+            render_calculation("Labour Productivity", {"output": output, "labour_input": labour}, clicked)
         
         elif calc_type == "Material Productivity":
             st.markdown('<div class="input-section">', unsafe_allow_html=True)
@@ -339,29 +664,8 @@ def main():
             material = st.number_input("Material Input", min_value=0.0, value=300.0, step=50.0)
             st.markdown('</div>', unsafe_allow_html=True)
             
-            if st.button("Calculate Material Productivity", key="calc_material"):
-                result = material_productivity(output, material)
-                st.markdown(f'<div class="metric-card"><h3>Material Productivity</h3><h2>{result:.8f}</h2></div>', unsafe_allow_html=True)
-                
-                # Pie chart
-                st.markdown('<div class="chart-container">', unsafe_allow_html=True)
-                fig = go.Figure(data=[go.Pie(
-                    labels=['Output', 'Material Input'], 
-                    values=[output, material],
-                    hole=0.4,
-                    marker_colors=['#007bff', '#6c757d'],
-                    textinfo='label+percent',
-                    textfont_size=14
-                )])
-                fig.update_layout(
-                    title="Output vs Material Input Distribution",
-                    title_font_size=18,
-                    title_font_color='#2c3e50',
-                    paper_bgcolor='rgba(0,0,0,0)',
-                    plot_bgcolor='rgba(0,0,0,0)'
-                )
-                st.plotly_chart(fig, use_container_width=True)
-                st.markdown('</div>', unsafe_allow_html=True)
+            clicked = st.button("Calculate Material Productivity", key="calc_material")
+            render_calculation("Material Productivity", {"output": output, "material_input": material}, clicked)
         
         elif calc_type == "Capital Productivity":
             st.markdown('<div class="input-section">', unsafe_allow_html=True)
@@ -369,31 +673,8 @@ def main():
             capital = st.number_input("Capital Input", min_value=0.0, value=250.0, step=50.0)
             st.markdown('</div>', unsafe_allow_html=True)
             
-            if st.button("Calculate Capital Productivity", key="calc_capital"):
-                result = capital_productivity(output, capital)
-                st.markdown(f'<div class="metric-card"><h3>Capital Productivity</h3><h2>{result:.8f}</h2></div>', unsafe_allow_html=True)
-                
-                # Line chart
-                st.markdown('<div class="chart-container">', unsafe_allow_html=True)
-                fig = go.Figure()
-                fig.add_trace(go.Scatter(
-                    x=['Capital Input', 'Output'], 
-                    y=[capital, output], 
-                    mode='lines+markers', 
-                    name='Productivity Flow',
-                    line=dict(color='#007bff', width=3),
-                    marker=dict(size=10, color='#6c757d')
-                ))
-                fig.update_layout(
-                    title="Capital Input to Output Flow",
-                    title_font_size=18,
-                    title_font_color='#2c3e50',
-                    paper_bgcolor='rgba(0,0,0,0)',
-                    plot_bgcolor='rgba(0,0,0,0)',
-                    font={'color': '#2c3e50'}
-                )
-                st.plotly_chart(fig, use_container_width=True)
-                st.markdown('</div>', unsafe_allow_html=True)
+            clicked = st.button("Calculate Capital Productivity", key="calc_capital")
+            render_calculation("Capital Productivity", {"output": output, "capital_input": capital}, clicked)
         
         elif calc_type == "Machine Productivity":
             st.markdown('<div class="input-section">', unsafe_allow_html=True)
@@ -401,35 +682,8 @@ def main():
             machine_input = st.number_input("Machine Input", min_value=0.0, value=150.0, step=25.0)
             st.markdown('</div>', unsafe_allow_html=True)
             
-            if st.button("Calculate Machine Productivity", key="calc_machine"):
-                result = machine_productivity(output, machine_input)
-                st.markdown(f'<div class="metric-card"><h3>Machine Productivity</h3><h2>{result:.8f}</h2></div>', unsafe_allow_html=True)
-                
-                # Scatter plot
-                st.markdown('<div class="chart-container">', unsafe_allow_html=True)
-                fig = px.scatter(
-                    x=[machine_input], 
-                    y=[output], 
-                    title="Machine Input vs Output",
-                    labels={'x': 'Machine Input', 'y': 'Output'},
-                    color_discrete_sequence=['#007bff']
-                )
-                fig.add_trace(go.Scatter(
-                    x=[0, machine_input*1.5], 
-                    y=[0, output*1.5], 
-                    mode='lines', 
-                    name='Efficiency Line',
-                    line=dict(color='#6c757d', width=2, dash='dash')
-                ))
-                fig.update_layout(
-                    title_font_size=18,
-                    title_font_color='#2c3e50',
-                    paper_bgcolor='rgba(0,0,0,0)',
-                    plot_bgcolor='rgba(0,0,0,0)',
-                    font={'color': '#2c3e50'}
-                )
-                st.plotly_chart(fig, use_container_width=True)
-                st.markdown('</div>', unsafe_allow_html=True)
+            clicked = st.button("Calculate Machine Productivity", key="calc_machine")
+            render_calculation("Machine Productivity", {"output": output, "machine_input": machine_input}, clicked)
         
         elif calc_type == "Miscellaneous Productivity":
             st.markdown('<div class="input-section">', unsafe_allow_html=True)
@@ -437,31 +691,8 @@ def main():
             misc = st.number_input("Miscellaneous Input", min_value=0.0, value=100.0, step=25.0)
             st.markdown('</div>', unsafe_allow_html=True)
             
-            if st.button("Calculate Miscellaneous Productivity", key="calc_misc"):
-                result = miscellaneous_productivity(output, misc)
-                st.markdown(f'<div class="metric-card"><h3>Miscellaneous Productivity</h3><h2>{result:.8f}</h2></div>', unsafe_allow_html=True)
-                
-                # Area chart
-                st.markdown('<div class="chart-container">', unsafe_allow_html=True)
-                fig = go.Figure()
-                fig.add_trace(go.Scatter(
-                    x=['Misc Input', 'Output'], 
-                    y=[misc, output], 
-                    fill='tonexty', 
-                    name='Productivity Area',
-                    fillcolor='rgba(0, 123, 255, 0.2)',
-                    line=dict(color='#007bff', width=2)
-                ))
-                fig.update_layout(
-                    title="Miscellaneous Input to Output",
-                    title_font_size=18,
-                    title_font_color='#2c3e50',
-                    paper_bgcolor='rgba(0,0,0,0)',
-                    plot_bgcolor='rgba(0,0,0,0)',
-                    font={'color': '#2c3e50'}
-                )
-                st.plotly_chart(fig, use_container_width=True)
-                st.markdown('</div>', unsafe_allow_html=True)
+            clicked = st.button("Calculate Miscellaneous Productivity", key="calc_misc")
+            render_calculation("Miscellaneous Productivity", {"output": output, "misc_input": misc}, clicked)
         
         elif calc_type == "Multifactor Productivity":
             st.markdown('<div class="input-section">', unsafe_allow_html=True)
@@ -473,34 +704,8 @@ def main():
             misc = st.number_input("Miscellaneous Input", min_value=0.0, value=100.0, step=25.0)
             st.markdown('</div>', unsafe_allow_html=True)
             
-            if st.button("Calculate Multifactor Productivity", key="calc_multifactor"):
-                result = multifactor_productivity(output, human, material, capital, energy, misc)
-                st.markdown(f'<div class="metric-card"><h3>Multifactor Productivity</h3><h2>{result:.8f}</h2></div>', unsafe_allow_html=True)
-                
-                # Stacked bar chart
-                st.markdown('<div class="chart-container">', unsafe_allow_html=True)
-                factors = ['Human', 'Material', 'Capital', 'Energy', 'Misc']
-                values = [human, material, capital, energy, misc]
-                
-                fig = go.Figure(data=[
-                    go.Bar(
-                        name='Input Factors', 
-                        x=factors, 
-                        y=values,
-                        marker_color=['#007bff', '#6c757d', '#28a745', '#ffc107', '#dc3545']
-                    )
-                ])
-                fig.update_layout(
-                    title="Input Factors Breakdown",
-                    title_font_size=18,
-                    title_font_color='#2c3e50',
-                    barmode='stack',
-                    paper_bgcolor='rgba(0,0,0,0)',
-                    plot_bgcolor='rgba(0,0,0,0)',
-                    font={'color': '#2c3e50'}
-                )
-                st.plotly_chart(fig, use_container_width=True)
-                st.markdown('</div>', unsafe_allow_html=True)
+            clicked = st.button("Calculate Multifactor Productivity", key="calc_multifactor")
+            render_calculation("Multifactor Productivity", {"output": output, "human": human, "material": material, "capital": capital, "energy": energy, "misc": misc}, clicked)
         
         elif calc_type == "Total Factor Productivity":
             st.markdown('<div class="input-section">', unsafe_allow_html=True)
@@ -509,29 +714,8 @@ def main():
             machine_input = st.number_input("Machine Input", min_value=0.0, value=150.0, step=25.0)
             st.markdown('</div>', unsafe_allow_html=True)
             
-            if st.button("Calculate Total Factor Productivity", key="calc_tfp"):
-                result = total_factor_productivity(net_output, worker_input, machine_input)
-                st.markdown(f'<div class="metric-card"><h3>Total Factor Productivity</h3><h2>{result:.8f}</h2></div>', unsafe_allow_html=True)
-                
-                # Donut chart
-                st.markdown('<div class="chart-container">', unsafe_allow_html=True)
-                fig = go.Figure(data=[go.Pie(
-                    labels=['Worker Input', 'Machine Input'], 
-                    values=[worker_input, machine_input],
-                    hole=0.6,
-                    marker_colors=['#007bff', '#6c757d'],
-                    textinfo='label+percent',
-                    textfont_size=14
-                )])
-                fig.update_layout(
-                    title="Input Distribution",
-                    title_font_size=18,
-                    title_font_color='#2c3e50',
-                    paper_bgcolor='rgba(0,0,0,0)',
-                    plot_bgcolor='rgba(0,0,0,0)'
-                )
-                st.plotly_chart(fig, use_container_width=True)
-                st.markdown('</div>', unsafe_allow_html=True)
+            clicked = st.button("Calculate Total Factor Productivity", key="calc_tfp")
+            render_calculation("Total Factor Productivity", {"net_output": net_output, "worker_input": worker_input, "machine_input": machine_input}, clicked)
         
         elif calc_type == "Economic Order Quantity (EOQ)":
             st.markdown('<div class="input-section">', unsafe_allow_html=True)
@@ -540,51 +724,13 @@ def main():
             holding_cost = st.number_input("Holding Cost per Unit per Year (H)", min_value=0.0, value=2.0, step=0.5)
             st.markdown('</div>', unsafe_allow_html=True)
             
-            if st.button("Calculate EOQ", key="calc_eoq"):
-                result = calculate_eoq(demand, ordering_cost, holding_cost)
-                st.markdown(f'<div class="metric-card"><h3>Economic Order Quantity</h3><h2>{result:.2f} units</h2></div>', unsafe_allow_html=True)
-                
-                # Cost analysis chart
-                st.markdown('<div class="chart-container">', unsafe_allow_html=True)
-                order_quantities = list(range(50, int(result*2), 50))
-                total_costs = []
-                
-                for q in order_quantities:
-                    if q > 0:
-                        ordering_costs = (demand / q) * ordering_cost
-                        holding_costs = (q / 2) * holding_cost
-                        total_costs.append(ordering_costs + holding_costs)
-                    else:
-                        total_costs.append(0)
-                
-                fig = go.Figure()
-                fig.add_trace(go.Scatter(
-                    x=order_quantities, 
-                    y=total_costs, 
-                    mode='lines+markers', 
-                    name='Total Cost',
-                    line=dict(color='#007bff', width=2),
-                    marker=dict(size=6, color='#6c757d')
-                ))
-                fig.add_vline(
-                    x=result, 
-                    line_dash="dash", 
-                    line_color="red", 
-                    annotation_text=f"EOQ = {result:.0f}",
-                    annotation_font_size=14
-                )
-                fig.update_layout(
-                    title="Total Cost vs Order Quantity", 
-                    xaxis_title="Order Quantity", 
-                    yaxis_title="Total Cost",
-                    title_font_size=18,
-                    title_font_color='#2c3e50',
-                    paper_bgcolor='rgba(0,0,0,0)',
-                    plot_bgcolor='rgba(0,0,0,0)',
-                    font={'color': '#2c3e50'}
-                )
-                st.plotly_chart(fig, use_container_width=True)
-                st.markdown('</div>', unsafe_allow_html=True)
+            clicked = st.button("Calculate EOQ", key="calc_eoq")
+            render_calculation("Economic Order Quantity (EOQ)", {"demand": demand, "ordering_cost": ordering_cost, "holding_cost": holding_cost}, clicked, title="Economic Order Quantity", number_format="{:.2f} units")
+            
+            st.markdown("#### What-if explorer")
+            render_eoq_explorer({"demand": demand, "ordering_cost": ordering_cost, "holding_cost": holding_cost})
+    
+    profiler.lap(f"branch:{calc_type}" if input_mode == "Manual entry" else f"mode:{input_mode}")
     
     # Right sidebar
     with col2:
@@ -593,25 +739,46 @@ def main():
         st.markdown('</div>', unsafe_allow_html=True)
         
         # Sample data for demonstration
-        if 'calculation_history' not in st.session_state:
-            st.session_state.calculation_history = []
-        
+        store = history.get_store()
         if st.button("Add Sample Data"):
-            sample_data = {
-                'timestamp': datetime.now(),
-                'type': calc_type,
-                'result': 0.85
-            }
-            st.session_state.calculation_history.append(sample_data)
+            store.append(calc_type, 0.85, timestamp=datetime.now(), session=st.session_state.history_session)
             st.success("Sample data added successfully!")
         
-        if st.session_state.calculation_history:
+        recent = store.recent(5, session=st.session_state.history_session)
+        if recent:
             st.markdown('<div class="stats-card">', unsafe_allow_html=True)
             st.markdown("#### Recent Calculations")
-            for i, calc in enumerate(st.session_state.calculation_history[-5:]):
-                st.write(f"**{calc['type']}**: {calc['result']:.8f}")
+            for calc in recent:
+                st.write(f"**{calc.label}**: {calc.result:.8f}")
             st.markdown('</div>', unsafe_allow_html=True)
         
+        with st.expander("Cache statistics"):
+            for name, stats in (("Results", cache.results.stats()), ("Figures", cache.figures.stats()),
+                                ("Simulations", cache.simulations.stats())):
+                st.write(
+                    f"**{name}**: {stats['hits']} hits / {stats['misses']} misses "
+                    f"({stats['hit_rate']:.0%}), {stats['size']}/{stats['maxsize']} entries"
+                )
+            shared = sharedcache.get_store()
+            if shared is not None:
+                stats = shared.stats()
+                st.write(
+                    f"**Shared** (all workers): {stats['hits']} hits / {stats['misses']} misses here "
+                    f"({stats['hit_rate']:.0%}), {stats['entries'] or 0:,} entries, "
+                    f"{(stats['bytes'] or 0) / memory.MB:.1f}/{stats['max_bytes'] / memory.MB:.0f} MB"
+                )
+                st.caption(f"Served by worker {os.environ.get('PRODUCTIVITY_WORKER', '?')} (pid {os.getpid()})")
+        
+        # Per-session memory: recomputable state goes first once over budget
+        if session_memory.measure(st.session_state) + session_memory.resident_bytes > session_memory.budget:
+            st.session_state.pop("dataflows", None)
+            session_memory.measure(st.session_state)
+        profiler.tag(session_bytes=session_memory.total_bytes)
+        with st.expander("Memory"):
+            render_memory(session_memory)
+        with st.expander("Alerts"):
+            render_alerts(calc_type)
+        
         st.markdown("---")
         st.markdown('<div class="tips-section">', unsafe_allow_html=True)
         st.markdown("### Tips")
@@ -626,6 +793,12 @@ def main():
         else:
             st.info("Use these metrics to identify areas for improvement and optimization.")
         st.markdown('</div>', unsafe_allow_html=True)
+    profiler.lap("quick_stats")
+    
+    if profiler.enabled:
+        with col2:
+            render_diagnostics(profiler)
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
+    profiler.finish() 
\ No newline at end of file